@@ -1,7 +1,10 @@
+-- Current schema. Existing tables are upgraded by `python -m models.schema_migrations bigquery`.
 CREATE TABLE `your_project_id.your_dataset_id.conversation_history` (
     id INT64,                           -- Unique ID for each entry
-    user_id INT64 NOT NULL,             -- ID of the user
+    user_id STRING NOT NULL,            -- ID of the user
     query STRING NOT NULL,              -- User's query
     response STRING NOT NULL,           -- AI model's response
-    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP()  -- Timestamp of the conversation
-);
\ No newline at end of file
+    timestamp TIMESTAMP NOT NULL        -- Timestamp of the conversation
+)
+PARTITION BY DATE(timestamp)            -- History reads within the time window only scan recent partitions
+CLUSTER BY user_id;                     -- and only the blocks holding the user's rows
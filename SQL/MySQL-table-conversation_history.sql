@@ -1,7 +1,9 @@
+-- Current schema. Existing tables are upgraded by `python -m models.schema_migrations mysql`.
 CREATE TABLE conversation_history (
-    id INT AUTO_INCREMENT PRIMARY KEY,  -- Unique ID for each entry
-    user_id INT NOT NULL,               -- ID of the user
-    query TEXT NOT NULL,                -- User's query
-    response TEXT NOT NULL,             -- AI model's response
-    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP  -- Timestamp of the conversation
-);
\ No newline at end of file
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,  -- Unique ID for each entry
+    user_id VARCHAR(128) NOT NULL,         -- ID of the user
+    query TEXT NOT NULL,                   -- User's query
+    response TEXT NOT NULL,                -- AI model's response
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,  -- Timestamp of the conversation
+    INDEX idx_history_user_timestamp (user_id, timestamp)    -- Serves the newest-first history reads per user
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,138 @@
+# benchmarks/bench_ann_index.py
+"""
+Recall@k vs. latency of the vector store index types on a synthetic corpus.
+
+Vectors are drawn around random topic centroids and normalized, like sentence embeddings.
+Exact inner-product search provides the ground truth. Each IVF/HNSW setting is swept over
+its search-time knob (nprobe / efSearch) so a point on the recall/latency curve can be picked.
+
+    python -m benchmarks.bench_ann_index --vectors 100000 --queries 500 --k 10
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import faiss
+import numpy as np
+from models.faiss_handler import build_index, search_parameters
+
+
+def synthetic_corpus(
+    vectors: int, queries: int, dimension: int, topics: int, intrinsic_dimension: int, seed: int = 0
+) -> tuple:
+    """
+    Return normalized (corpus, queries) arrays. Points are drawn around topic centroids in a
+    low-dimensional latent space and projected to `dimension`, since sentence embeddings occupy
+    far fewer effective dimensions than they have.
+    """
+    rng = np.random.default_rng(seed)
+    projection = rng.standard_normal((intrinsic_dimension, dimension)).astype("float32")
+    centroids = rng.standard_normal((topics, intrinsic_dimension)).astype("float32")
+
+    def sample(n: int) -> np.ndarray:
+        latent = centroids[rng.integers(0, topics, n)] + rng.standard_normal((n, intrinsic_dimension))
+        points = (latent.astype("float32") @ projection) + 0.5 * rng.standard_normal((n, dimension)).astype("float32")
+        faiss.normalize_L2(points)
+        return points
+
+    return sample(vectors), sample(queries)
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(row_found) & set(row_truth)) for row_found, row_truth in zip(found, truth))
+    return hits / truth.size
+
+
+def measure(index, params, queries: np.ndarray, k: int, truth: np.ndarray) -> dict:
+    # Single-query latency, as served by /query
+    latencies = []
+    found = np.empty((len(queries), k), dtype="int64")
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        _, ids = index.search(queries[i:i + 1], k, params=params)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found[i] = ids[0]
+    # Matrix search, as served by /query/batch
+    start = time.perf_counter()
+    index.search(queries, k, params=params)
+    batch_seconds = time.perf_counter() - start
+    return {
+        "recall_at_k": round(recall_at_k(found, truth), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        "batch_qps": round(len(queries) / batch_seconds, 1),
+    }
+
+
+def run(args) -> list:
+    corpus, queries = synthetic_corpus(args.vectors, args.queries, args.dimension, args.topics, args.intrinsic_dimension)
+    ids = np.arange(len(corpus), dtype="int64")
+
+    exact = build_index("flat_ip", args.dimension)
+    exact.add_with_ids(corpus, ids)
+    _, truth = exact.search(queries, args.k)
+
+    configs = [("flat_ip", {}, [None])]
+    configs += [("ivf_flat", {"nlist": args.nlist}, [("nprobe", n) for n in args.nprobe])]
+    configs += [
+        ("ivf_pq", {"nlist": args.nlist, "pq_m": args.pq_m, "pq_nbits": 8}, [("nprobe", n) for n in args.nprobe])
+    ]
+    configs += [("hnsw", {"hnsw_m": args.hnsw_m}, [("ef_search", e) for e in args.ef_search])]
+
+    results = []
+    for index_type, options, sweep in configs:
+        index = build_index(index_type, args.dimension, **options)
+        start = time.perf_counter()
+        if not index.is_trained:
+            index.train(corpus[: min(len(corpus), 39 * max(options.get("nlist", 0), 256))])
+        train_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        index.add_with_ids(corpus, ids)
+        add_seconds = time.perf_counter() - start
+        size_mb = len(faiss.serialize_index(index)) / 2 ** 20
+        for knob in sweep:
+            params = search_parameters(index, **({knob[0]: knob[1]} if knob else {}))
+            row = {
+                "index_type": index_type,
+                **options,
+                "knob": f"{knob[0]}={knob[1]}" if knob else "",
+                "train_s": round(train_seconds, 2),
+                "add_s": round(add_seconds, 2),
+                "size_mb": round(size_mb, 1),
+                **measure(index, params, queries, args.k, truth),
+            }
+            results.append(row)
+            print(
+                f"{index_type:9s} {row['knob']:14s} recall@{args.k}={row['recall_at_k']:.3f}  "
+                f"p50={row['p50_ms']:7.3f}ms  p95={row['p95_ms']:7.3f}ms  batch={row['batch_qps']:9.1f} q/s  "
+                f"size={row['size_mb']:7.1f}MB  build={row['train_s'] + row['add_s']:.1f}s"
+            )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--dimension", type=int, default=384, help="all-MiniLM-L6-v2 produces 384")
+    parser.add_argument("--topics", type=int, default=200, help="Centroids the synthetic vectors cluster around")
+    parser.add_argument("--intrinsic-dimension", type=int, default=32, help="Latent dimensions of the synthetic vectors")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--pq-m", type=int, default=48)
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128])
+    parser.add_argument("--threads", type=int, default=0, help="FAISS OpenMP threads, 0 keeps the default")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+    if args.threads:
+        faiss.omp_set_num_threads(args.threads)
+    results = run(args)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
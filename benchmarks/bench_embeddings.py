@@ -0,0 +1,112 @@
+# benchmarks/bench_embeddings.py
+"""
+CPU embedding throughput (sentences/sec) per backend, batch size and thread count, and a
+check that retrieval results stay equivalent to the float32 torch baseline.
+
+    python -m benchmarks.bench_embeddings --sentences 2000 --batch-sizes 1 16 64 --threads 1 4
+    python -m benchmarks.bench_embeddings --backends torch onnx --min-overlap 0.95
+
+The equivalence check embeds a corpus and queries with every candidate (float16 cache,
+ONNX int8), searches them with exact inner product and reports the overlap of the top-k
+with the baseline. The script exits with status 1 if any overlap is below --min-overlap.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import faiss
+import numpy as np
+from benchmarks.pdf_fixtures import random_text
+from config import EMBEDDING_CONFIG
+from models.embedding_encoder import CachedEncoder, load_sentence_transformer
+
+
+def make_sentences(count: int, words: int, seed: int) -> list:
+    rng = random.Random(seed)
+    return [random_text(rng.randint(words // 2, words), rng) for _ in range(count)]
+
+
+def throughput(model, sentences: list, batch_size: int) -> float:
+    model.encode(sentences[:batch_size], batch_size=batch_size)  # Warm up
+    start = time.perf_counter()
+    model.encode(sentences, batch_size=batch_size)
+    return len(sentences) / (time.perf_counter() - start)
+
+
+def _timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def top_k(model, corpus: list, queries: list, k: int) -> np.ndarray:
+    corpus_vectors = np.asarray(model.encode(corpus, normalize_embeddings=True), dtype="float32")
+    query_vectors = np.asarray(model.encode(queries, normalize_embeddings=True), dtype="float32")
+    index = faiss.IndexFlatIP(corpus_vectors.shape[1])
+    index.add(corpus_vectors)
+    return index.search(query_vectors, k)[1]
+
+
+def overlap(found: np.ndarray, baseline: np.ndarray) -> float:
+    return sum(len(set(a) & set(b)) for a, b in zip(found, baseline)) / baseline.size
+
+
+def run(args) -> bool:
+    sentences = make_sentences(args.sentences, args.words, seed=0)
+    models = {}
+    print(f"{'backend':>8} {'threads':>7} {'batch':>6} {'sentences/s':>12}")
+    for backend in args.backends:
+        for threads in args.threads:
+            try:
+                model = load_sentence_transformer(EMBEDDING_CONFIG["model_name"], backend, args.onnx_file, threads)
+            except ImportError as e:
+                print(f"{backend:>8} skipped: {e}")
+                break
+            models[backend] = model
+            for batch_size in args.batch_sizes:
+                rate = throughput(model, sentences, batch_size)
+                print(f"{backend:>8} {threads or 'default':>7} {batch_size:>6} {rate:>12.1f}")
+
+    if not models:
+        return False
+
+    # Re-embedding text that was seen before (e.g. reindexing a file whose chunks did not change)
+    baseline_model = models.get("torch") or next(iter(models.values()))
+    cached = CachedEncoder(baseline_model, batch_size=max(args.batch_sizes))
+    cold, warm = (len(sentences) / _timed(lambda: cached.encode(sentences)) for _ in range(2))
+    print(f"\ncache cold: {cold:.1f} sentences/s, warm: {warm:.1f} sentences/s ({warm / cold:.0f}x)")
+
+    # Retrieval equivalence against the float32 torch baseline
+    corpus = make_sentences(args.corpus, args.words, seed=1)
+    queries = make_sentences(args.queries, 12, seed=2)
+    baseline = top_k(baseline_model, corpus, queries, args.k)
+    candidates = {"float16 cache": CachedEncoder(baseline_model)}
+    if "onnx" in models:
+        candidates["onnx"] = models["onnx"]
+    equivalent = True
+    print(f"\ntop-{args.k} overlap with the float32 baseline ({args.queries} queries, {args.corpus} passages)")
+    for name, model in candidates.items():
+        score = overlap(top_k(model, corpus, queries, args.k), baseline)
+        equivalent = equivalent and score >= args.min_overlap
+        print(f"{name:>14}: {score:.4f} {'ok' if score >= args.min_overlap else 'BELOW THRESHOLD'}")
+    return equivalent
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["torch"], choices=["torch", "onnx"])
+    parser.add_argument("--onnx-file", default=EMBEDDING_CONFIG["onnx_file"])
+    parser.add_argument("--sentences", type=int, default=2000)
+    parser.add_argument("--words", type=int, default=120, help="Words per sentence, about one retrieval chunk")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--threads", type=int, nargs="+", default=[0], help="CPU threads, 0 keeps the default")
+    parser.add_argument("--corpus", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--min-overlap", type=float, default=0.95)
+    args = parser.parse_args()
+    sys.exit(0 if run(args) else 1)
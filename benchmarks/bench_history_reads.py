@@ -0,0 +1,337 @@
+# benchmarks/bench_history_reads.py
+"""
+History read latency and work per query before and after the schema migrations.
+
+Loads --rows synthetic history rows into a scratch database using the original schema
+(user_id INT, no index), with user activity skewed so a few users own long histories. It
+then times the original history query for --legacy-reads users, applies the migrations
+and times first pages and --pages deep keyset pages through DatabaseHandler.get_history_page
+for --reads users. On MySQL, rows examined (Handler_read_* counters) and InnoDB bytes read
+(buffer pool read requests x page size) are reported per query. These are server-wide
+counters, so run against an otherwise idle server. --bigquery also dry-runs the old and new
+queries against the configured dataset and reports the bytes each would bill. Clustering
+savings are applied at run time, so for clustered tables the dry run shows an upper bound.
+
+    python -m benchmarks.bench_history_reads --rows 10000000 --database omnisearch_bench
+    python -m benchmarks.bench_history_reads --backend sqlite --rows 1000000
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from config import DATABASE_CONFIG
+from models.database_handler import DatabaseHandler
+
+LEGACY_QUERY = """
+    SELECT query, response, timestamp
+    FROM conversation_history
+    WHERE user_id = {placeholder}
+    ORDER BY timestamp DESC
+    LIMIT {placeholder}
+"""
+
+LEGACY_TABLE = """
+    CREATE TABLE conversation_history (
+        id {id_type},
+        user_id {user_id_type} NOT NULL,
+        query TEXT NOT NULL,
+        response TEXT NOT NULL,
+        timestamp {timestamp_type}
+    )
+"""
+
+WORDS = "history query answer model index cache search vector token user context document page latency".split()
+
+
+def generate_rows(rows: int, users: int, days: float, timestamp_format: str, seed: int):
+    """
+    Yield (user_id, query, response, timestamp) rows. User ids are numeric strings so the
+    original INT column accepts them; activity follows a power law over users.
+    """
+    rng = random.Random(seed)
+    now = datetime.datetime.now()
+    for _ in range(rows):
+        user_id = str(int(users * rng.random() ** 3))
+        query = " ".join(rng.choices(WORDS, k=8))
+        response = " ".join(rng.choices(WORDS, k=30))
+        timestamp = now - datetime.timedelta(seconds=rng.random() * days * 86400)
+        yield user_id, query, response, timestamp.strftime(timestamp_format)
+
+
+def sample_users(users: int, count: int, seed: int) -> list:
+    # Reads follow the same skew as writes: active users ask more often
+    rng = random.Random(seed + 1)
+    return [str(int(users * rng.random() ** 3)) for _ in range(count)]
+
+
+class MySQLBench:
+    def __init__(self, database: str):
+        import mysql.connector
+        from models.mysql_pool import MySQLPool
+
+        config = DATABASE_CONFIG["mysql"]
+        admin = mysql.connector.connect(host=config["host"], user=config["user"], password=config["password"])
+        cursor = admin.cursor()
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{database}`")
+        cursor.close()
+        admin.close()
+        self.connection = mysql.connector.connect(
+            host=config["host"], user=config["user"], password=config["password"], database=database
+        )
+        self.cursor = self.connection.cursor()
+        self.cursor.execute("SELECT @@innodb_page_size")
+        self.page_size = self.cursor.fetchone()[0]
+        self.pool = MySQLPool(dict(config, database=database), pool_size=2, pool_name="history_bench")
+        self.placeholder = "%s"
+
+    def create_legacy_table(self) -> None:
+        # The schema of the original SQL/MySQL-table-conversation_history.sql
+        self.cursor.execute("DROP TABLE IF EXISTS conversation_history, schema_migrations")
+        self.cursor.execute(LEGACY_TABLE.format(
+            id_type="INT AUTO_INCREMENT PRIMARY KEY", user_id_type="INT",
+            timestamp_type="TIMESTAMP DEFAULT CURRENT_TIMESTAMP",
+        ))
+
+    def insert(self, rows: list) -> None:
+        self.cursor.executemany(
+            "INSERT INTO conversation_history (user_id, query, response, timestamp) VALUES (%s, %s, %s, %s)", rows
+        )
+        self.connection.commit()
+
+    def analyze(self) -> None:
+        self.cursor.execute("ANALYZE TABLE conversation_history")
+        self.cursor.fetchall()
+
+    def counters(self) -> dict:
+        self.cursor.execute(
+            "SHOW GLOBAL STATUS WHERE Variable_name LIKE 'Handler_read%%' "
+            "OR Variable_name = 'Innodb_buffer_pool_read_requests'"
+        )
+        values = dict(self.cursor.fetchall())
+        return {
+            "rows_examined": sum(int(value) for name, value in values.items() if name.startswith("Handler_read")),
+            "bytes_read": int(values["Innodb_buffer_pool_read_requests"]) * self.page_size,
+        }
+
+    def legacy_read(self, user_id: str, limit: int) -> None:
+        self.cursor.execute(LEGACY_QUERY.format(placeholder="%s"), (user_id, limit))
+        self.cursor.fetchall()
+
+    def explain(self, query: str, params: tuple) -> str:
+        self.cursor.execute("EXPLAIN " + query, params)
+        columns = [column[0] for column in self.cursor.description]
+        row = dict(zip(columns, self.cursor.fetchone()))
+        return f"type={row['type']} key={row['key']} rows={row['rows']} extra={row['Extra']}"
+
+    def handler(self, window_days: float) -> DatabaseHandler:
+        return DatabaseHandler(
+            "mysql", mysql_pool=self.pool, write_behind=False, history_cache=None,
+            auto_migrate=False, window_days=window_days,
+        )
+
+    def close(self) -> None:
+        self.cursor.close()
+        self.connection.close()
+        self.pool.close()
+
+
+class SQLiteBench:
+    def __init__(self, path: str):
+        import sqlite3
+
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.placeholder = "?"
+
+    def create_legacy_table(self) -> None:
+        self.connection.execute("DROP TABLE IF EXISTS conversation_history")
+        self.connection.execute("DROP TABLE IF EXISTS schema_migrations")
+        self.connection.execute(LEGACY_TABLE.format(
+            id_type="INTEGER PRIMARY KEY AUTOINCREMENT", user_id_type="TEXT", timestamp_type="TEXT NOT NULL"
+        ))
+
+    def insert(self, rows: list) -> None:
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO conversation_history (user_id, query, response, timestamp) VALUES (?, ?, ?, ?)", rows
+            )
+
+    def analyze(self) -> None:
+        self.connection.execute("ANALYZE")
+
+    def counters(self) -> dict:
+        return {}  # SQLite has no per-query work counters
+
+    def legacy_read(self, user_id: str, limit: int) -> None:
+        self.connection.execute(LEGACY_QUERY.format(placeholder="?"), (user_id, limit)).fetchall()
+
+    def explain(self, query: str, params: tuple) -> str:
+        return "; ".join(row[-1] for row in self.connection.execute("EXPLAIN QUERY PLAN " + query, params))
+
+    def handler(self, window_days: float) -> DatabaseHandler:
+        handler = DatabaseHandler("sqlite", write_behind=False, history_cache=None, auto_migrate=False, window_days=window_days)
+        handler.config = dict(handler.config, path=self.path)
+        return handler
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def measure(bench, read, calls: list) -> dict:
+    """
+    Time read(*args) for each args tuple, with the work counters of each call.
+    """
+    latencies, rows_examined, bytes_read = [], [], []
+    for args in calls:
+        before = bench.counters()
+        start = time.perf_counter()
+        read(*args)
+        latencies.append((time.perf_counter() - start) * 1000)
+        after = bench.counters()
+        if before:
+            rows_examined.append(after["rows_examined"] - before["rows_examined"])
+            bytes_read.append(after["bytes_read"] - before["bytes_read"])
+    summary = {
+        "reads": len(latencies),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+    }
+    if rows_examined:
+        summary["rows_examined_p50"] = int(np.percentile(rows_examined, 50))
+        summary["bytes_read_p50"] = int(np.percentile(bytes_read, 50))
+    return summary
+
+
+def bigquery_dry_run(user_id: str, page_size: int, window_days: float) -> dict:
+    from google.cloud import bigquery
+
+    client = bigquery.Client.from_service_account_json(DATABASE_CONFIG["bigquery"]["credentials_path"])
+    handler = DatabaseHandler(
+        "bigquery", bigquery_client=client, write_behind=False, history_cache=None,
+        auto_migrate=False, window_days=window_days,
+    )
+    table = f"{DATABASE_CONFIG['bigquery']['project_id']}.{DATABASE_CONFIG['bigquery']['dataset_id']}.conversation_history"
+    legacy_query = LEGACY_QUERY.format(placeholder="@x").replace("FROM conversation_history", f"FROM `{table}`")
+    legacy_query = legacy_query.replace("user_id = @x", "user_id = @user_id").replace("LIMIT @x", "LIMIT @limit")
+    new_query, new_params = handler._history_query_bigquery(user_id, page_size)
+    legacy_params = new_params[:2]
+
+    def billed_bytes(query: str, params: list) -> int:
+        job_config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False, query_parameters=params)
+        return client.query(query, job_config=job_config).total_bytes_processed
+
+    return {"legacy_bytes": billed_bytes(legacy_query, legacy_params), "new_bytes": billed_bytes(new_query, new_params)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["mysql", "sqlite"], default="mysql")
+    parser.add_argument("--database", default="omnisearch_bench", help="Scratch MySQL database (its history table is replaced)")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--days", type=float, default=90, help="Rows are spread over this many past days")
+    parser.add_argument("--window-days", type=float, default=30, help="History window of the migrated reads")
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=10, help="Keyset pages followed per user")
+    parser.add_argument("--reads", type=int, default=200)
+    parser.add_argument("--legacy-reads", type=int, default=20, help="Full-scan reads are slow, so fewer are timed")
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--bigquery", action="store_true", help="Also dry-run the old and new BigQuery history queries")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    directory = tempfile.TemporaryDirectory()
+    if args.backend == "mysql":
+        bench = MySQLBench(args.database)
+        timestamp_format = "%Y-%m-%d %H:%M:%S"
+    else:
+        bench = SQLiteBench(os.path.join(directory.name, "history.db"))
+        timestamp_format = "%Y-%m-%d %H:%M:%S.%f"
+
+    results = {"args": vars(args)}
+    try:
+        bench.create_legacy_table()
+        start = time.perf_counter()
+        batch = []
+        for row in generate_rows(args.rows, args.users, args.days, timestamp_format, args.seed):
+            batch.append(row)
+            if len(batch) >= args.batch_size:
+                bench.insert(batch)
+                batch = []
+        if batch:
+            bench.insert(batch)
+        bench.analyze()
+        results["load_seconds"] = round(time.perf_counter() - start, 1)
+        print(f"loaded {args.rows} rows in {results['load_seconds']}s")
+
+        users = sample_users(args.users, args.reads, args.seed)
+        legacy_query = LEGACY_QUERY.format(placeholder=bench.placeholder)
+        results["legacy_plan"] = bench.explain(legacy_query, (users[0], args.page_size))
+        results["legacy"] = measure(
+            bench, bench.legacy_read, [(user_id, args.page_size) for user_id in users[:args.legacy_reads]]
+        )
+
+        handler = bench.handler(args.window_days)
+        start = time.perf_counter()
+        applied = handler.migrate()
+        results["migration_seconds"] = round(time.perf_counter() - start, 1)
+        results["migrations"] = [migration.description for migration in applied]
+        bench.analyze()
+        print(f"applied {len(applied)} migrations in {results['migration_seconds']}s")
+
+        conditions, params = handler._history_conditions(None, bench.placeholder)
+        new_query = (
+            f"SELECT id, query, response, timestamp FROM conversation_history WHERE user_id = {bench.placeholder}"
+            f"{conditions} ORDER BY timestamp DESC, id DESC LIMIT {bench.placeholder}"
+        )
+        results["keyset_plan"] = bench.explain(new_query, (users[0], *params, args.page_size))
+        results["first_page"] = measure(
+            bench, handler.get_history_page, [(user_id, args.page_size) for user_id in users]
+        )
+
+        # Collect the cursors of the deep pages first, then time the deepest page of each user
+        deep_calls = []
+        for user_id in users:
+            cursor = None
+            for _ in range(args.pages - 1):
+                cursor = handler.get_history_page(user_id, args.page_size, cursor)["next_cursor"]
+                if cursor is None:
+                    break
+            if cursor is not None:
+                deep_calls.append((user_id, args.page_size, cursor))
+        if deep_calls:
+            results[f"page_{args.pages}"] = measure(bench, handler.get_history_page, deep_calls)
+        handler.close()
+    finally:
+        bench.close()
+        directory.cleanup()
+
+    if args.bigquery:
+        results["bigquery"] = bigquery_dry_run(sample_users(args.users, 1, args.seed)[0], args.page_size, args.window_days)
+
+    print(f"\nold query plan:    {results['legacy_plan']}")
+    print(f"keyset query plan: {results['keyset_plan']}")
+    print(f"\n{'read':>14} {'reads':>6} {'p50 ms':>9} {'p95 ms':>9} {'rows examined':>14} {'bytes read':>12}")
+    for name in ("legacy", "first_page", f"page_{args.pages}"):
+        if name not in results:
+            continue
+        summary = results[name]
+        print(
+            f"{name:>14} {summary['reads']:6d} {summary['p50_ms']:9.3f} {summary['p95_ms']:9.3f} "
+            f"{summary.get('rows_examined_p50', '-'):>14} {summary.get('bytes_read_p50', '-'):>12}"
+        )
+    if "bigquery" in results:
+        print(f"\nBigQuery bytes billed: old {results['bigquery']['legacy_bytes']}, new {results['bigquery']['new_bytes']}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
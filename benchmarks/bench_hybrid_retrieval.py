@@ -0,0 +1,156 @@
+# benchmarks/bench_hybrid_retrieval.py
+"""
+Retrieval quality and latency of dense, BM25 and hybrid (reciprocal rank fusion) search.
+
+A synthetic product catalog is ingested into a DocumentVectorStore, one file per product.
+Products have near-identical codes (SKU-48213, SKU-48231, ...) and descriptions drawn from a
+shared vocabulary. Two query sets target one product each: code lookups ("price of SKU-48213")
+and natural-language queries built from words of the product's description. For each mode
+recall@1/3/5, MRR@10 and the p50 single-query latency are reported. --rerank adds hybrid
+search with the cross-encoder reranker on top (downloads the model on first use).
+
+    python -m benchmarks.bench_hybrid_retrieval --products 1000 --queries 200
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from models.bucket_handler import BlobInfo
+from models.vector_store import DocumentVectorStore
+
+VOCABULARY = (
+    "battery charger cable adapter laptop tablet monitor keyboard mouse headset speaker camera lens "
+    "tripod router switch modem printer scanner projector drive memory card sensor thermostat lamp "
+    "bulb socket plug fan heater filter pump valve hose drill saw blade sander wrench hammer ladder "
+    "wireless portable compact rugged waterproof rechargeable adjustable ergonomic silent outdoor "
+    "indoor industrial premium budget professional lightweight heavy durable smart digital analog "
+    "black white silver steel aluminum plastic wooden glass rubber leather fabric red blue green"
+).split()
+CATEGORIES = ["electronics", "office", "tools", "home", "garden", "lighting", "audio", "networking"]
+
+
+def build_catalog(products: int, seed: int) -> list:
+    """
+    Return (code, text) per product. Codes share prefixes and digits so they are near-duplicates.
+    """
+    rng = random.Random(seed)
+    codes = set()
+    while len(codes) < products:
+        codes.add(f"SKU-{rng.randint(10000, 10000 + products * 5)}")
+    catalog = []
+    for code in sorted(codes):
+        words = rng.sample(VOCABULARY, 12)
+        text = (
+            f"Product {code} in {rng.choice(CATEGORIES)}. {' '.join(words[:6]).capitalize()}. "
+            f"Features: {', '.join(words[6:])}. Price {rng.randint(5, 900)} USD, stock {rng.randint(0, 500)} units."
+        )
+        catalog.append((code, text))
+    return catalog
+
+
+def build_queries(catalog: list, queries: int, seed: int) -> list:
+    """
+    Return (kind, query, target index) triples, half code lookups and half natural language.
+    """
+    rng = random.Random(seed + 1)
+    result = []
+    for i in range(queries):
+        target = rng.randrange(len(catalog))
+        code, text = catalog[target]
+        if i % 2 == 0:
+            template = rng.choice(["what is the price of {}", "is {} in stock", "{} specifications"])
+            result.append(("code", template.format(code), target))
+        else:
+            words = [word for word in text.lower().replace(",", " ").replace(".", " ").split() if word in VOCABULARY]
+            result.append(("natural", "looking for a " + " ".join(rng.sample(words, min(5, len(words)))), target))
+    return result
+
+
+def evaluate(search, file_names: list, queries: list) -> dict:
+    """
+    :param search: Function returning the file names of the top 10 chunks of a query, best first.
+    """
+    ranks = {"code": [], "natural": []}
+    latencies = []
+    for kind, query, target in queries:
+        start = time.perf_counter()
+        found = search(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ranks[kind].append(found.index(file_names[target]) + 1 if file_names[target] in found else None)
+
+    def summarize(values: list) -> dict:
+        return {
+            "recall@1": round(sum(1 for rank in values if rank and rank <= 1) / len(values), 3),
+            "recall@3": round(sum(1 for rank in values if rank and rank <= 3) / len(values), 3),
+            "recall@5": round(sum(1 for rank in values if rank and rank <= 5) / len(values), 3),
+            "mrr@10": round(sum(1 / rank for rank in values if rank) / len(values), 3),
+        }
+
+    return {
+        "all": summarize(ranks["code"] + ranks["natural"]),
+        "code": summarize(ranks["code"]),
+        "natural": summarize(ranks["natural"]),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rerank", action="store_true", help="Also measure hybrid search with the cross-encoder reranker")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    catalog = build_catalog(args.products, args.seed)
+    queries = build_queries(catalog, args.queries, args.seed)
+    file_names = [f"{code}.pdf" for code, _ in catalog]
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = DocumentVectorStore(directory)
+        start = time.perf_counter()
+        for file_name, (_, text) in zip(file_names, catalog):
+            store.upsert_file(BlobInfo(file_name, "1"), [text])
+        print(f"ingested {len(catalog)} products in {time.perf_counter() - start:.1f}s")
+
+        def store_search(query: str) -> list:
+            return [chunk["file_name"] for chunk in store.search(query, file_names, k=10)]
+
+        def bm25_search(query: str) -> list:
+            # Same allowed-id restriction as the store applies before fusion
+            allowed_ids = store._allowed_ids(file_names)
+            ranked = [i for i, _ in store.bm25.search(query, 10, allowed_ids)]
+            entries = store.chunks(ranked)
+            return [entries[i]["file_name"] for i in ranked]
+
+        modes = [("dense", "dense", None, store_search), ("bm25", None, None, bm25_search), ("hybrid", "hybrid", None, store_search)]
+        if args.rerank:
+            from models.reranker import CrossEncoderReranker
+            modes.append(("hybrid+rerank", "hybrid", CrossEncoderReranker(), store_search))
+        results = {}
+        for name, mode, reranker, search in modes:
+            store.mode, store.reranker = mode or store.mode, reranker
+            results[name] = evaluate(search, file_names, queries)
+        store.close()
+
+    print(f"\n{'mode':>14} {'queries':>8} {'R@1':>6} {'R@3':>6} {'R@5':>6} {'MRR':>6} {'p50 ms':>8}")
+    for name, result in results.items():
+        for kind in ("all", "code", "natural"):
+            scores = result[kind]
+            latency = f"{result['p50_ms']:8.3f}" if kind == "all" else ""
+            print(
+                f"{name if kind == 'all' else '':>14} {kind:>8} {scores['recall@1']:6.3f} {scores['recall@3']:6.3f} "
+                f"{scores['recall@5']:6.3f} {scores['mrr@10']:6.3f} {latency}"
+            )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
@@ -0,0 +1,128 @@
+# benchmarks/bench_metrics_overhead.py
+"""
+Overhead of the metrics layer on the /query hot path.
+
+Part 1 times the instrumentation primitives (a labelled histogram observation through
+timer(), a counter increment) with metrics enabled and disabled. Part 2 serves the same
+/query requests in two fresh processes, with METRICS_ENABLED=true and false, using the
+offline fake model and a temporary SQLite history, and compares their latencies. The two
+modes alternate for --rounds rounds and the fastest round of each is reported, to damp noise
+from other load on the machine.
+
+    python -m benchmarks.bench_metrics_overhead --requests 500
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+
+def time_primitives(iterations: int) -> dict:
+    import prometheus_client
+    from models import metrics
+
+    registry = prometheus_client.CollectorRegistry()
+    histogram = prometheus_client.Histogram(
+        "bench_seconds", "", ["stage", "outcome"], buckets=metrics.LATENCY_BUCKETS, registry=registry
+    )
+    counter = prometheus_client.Counter("bench", "", registry=registry)
+    noop = metrics._NoopMetric()
+
+    def per_call_ns(func) -> float:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        return (time.perf_counter() - start) / iterations * 1e9
+
+    def observe(target):
+        with metrics.timer(target, stage="history"):
+            pass
+
+    baseline = per_call_ns(lambda: None)
+    return {
+        "timer_enabled_ns": round(per_call_ns(lambda: observe(histogram)) - baseline, 1),
+        "timer_disabled_ns": round(per_call_ns(lambda: observe(noop)) - baseline, 1),
+        "counter_inc_ns": round(per_call_ns(lambda: counter.inc()) - baseline, 1),
+    }
+
+
+def serve_queries(requests: int) -> list:
+    """
+    Worker: serve /query requests in this process and return their latencies in ms.
+    """
+    from fastapi.testclient import TestClient
+    import main
+
+    body = {"query": "", "model_name": "fake", "storage_type": "sqlite", "user_id": "bench", "use_cache": False}
+    latencies = []
+    with TestClient(main.app) as client:
+        for i in range(requests + 20):
+            start = time.perf_counter()
+            response = client.post("/query", json=dict(body, query=f"benchmark question {i}"))
+            if response.status_code != 200:
+                raise RuntimeError(response.text)
+            if i >= 20:  # Warm-up requests are not measured
+                latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def run_worker(metrics_enabled: bool, requests: int, directory: str) -> list:
+    env = dict(
+        os.environ,
+        METRICS_ENABLED=str(metrics_enabled).lower(),
+        FAKE_MODEL_ENABLED="true",
+        SQLITE_PATH=os.path.join(directory, f"history_{metrics_enabled}.db"),
+        VECTOR_STORE_PATH=os.path.join(directory, f"vector_store_{metrics_enabled}"),
+        GCS_BACKEND="local",
+        GCS_LOCAL_PATH=directory,
+    )
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", "--requests", str(requests)],
+        env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(latencies: list) -> dict:
+    return {
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        "mean_ms": round(float(np.mean(latencies)), 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--iterations", type=int, default=200000, help="Calls per primitive")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(serve_queries(args.requests)))
+        sys.exit(0)
+
+    print("instrumentation primitives (per call):")
+    for name, value in time_primitives(args.iterations).items():
+        print(f"  {name:>18}: {value:8.1f} ns")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for _ in range(args.rounds):
+            for enabled in (False, True):
+                summary = summarize(run_worker(enabled, args.requests, directory))
+                if enabled not in results or summary["mean_ms"] < results[enabled]["mean_ms"]:
+                    results[enabled] = summary
+    print(f"\n/query latency over {args.requests} requests (fake model, SQLite history):")
+    for enabled, summary in results.items():
+        print(f"  metrics {'on ' if enabled else 'off'}: p50={summary['p50_ms']:.3f}ms  p95={summary['p95_ms']:.3f}ms  mean={summary['mean_ms']:.3f}ms")
+    overhead = results[True]["mean_ms"] - results[False]["mean_ms"]
+    print(f"  overhead: {overhead:+.3f}ms per request ({overhead / results[False]['mean_ms']:+.1%})")
@@ -0,0 +1,96 @@
+# benchmarks/bench_pdf_pipeline.py
+"""
+Compare the sequential PDF read path with the concurrent PdfPipeline on local fixture PDFs.
+
+    python -m benchmarks.bench_pdf_pipeline --files 1 10 50 --download-latency 0.05
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PyPDF2
+from benchmarks.pdf_fixtures import write_fixture_pdfs
+from models.bucket_handler import LocalBucket
+from models.pdf_pipeline import PdfPipeline
+
+
+class SlowBucket(LocalBucket):
+    """
+    LocalBucket with a fixed per-download delay to approximate GCS round trips.
+    """
+
+    def __init__(self, root_dir: str, latency: float):
+        super().__init__(root_dir)
+        self.latency = latency
+
+    def download_bytes(self, name: str, generation=None) -> bytes:
+        time.sleep(self.latency)
+        return super().download_bytes(name, generation)
+
+
+def read_sequential(bucket: LocalBucket, names: list) -> list:
+    """
+    The original read path: one blocking download and extraction after another.
+    """
+    texts = []
+    for name in names:
+        reader = PyPDF2.PdfReader(BytesIO(bucket.download_bytes(name)))
+        text = ""
+        for page in reader.pages:
+            text += page.extract_text()
+        texts.append(text)
+    return texts
+
+
+async def read_pipeline(pipeline: PdfPipeline, names: list) -> list:
+    results = await pipeline.fetch_many({name: None for name in names})
+    return ["".join(results[name]) for name in names]
+
+
+def run(file_counts: list, pages: int, latency: float, workers: int, repeats: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        all_names = write_fixture_pdfs(directory, max(file_counts), pages=pages)
+        bucket = SlowBucket(directory, latency)
+        print(f"{'files':>6} {'sequential_s':>13} {'pipeline_s':>11} {'speedup':>8}")
+        for count in file_counts:
+            names = all_names[:count]
+            sequential = min(_timed(lambda: read_sequential(bucket, names)) for _ in range(repeats))
+
+            async def timed_pipeline():
+                pipeline = PdfPipeline(bucket, max_workers=workers)
+                try:
+                    await read_pipeline(pipeline, names[:1])  # Start the worker processes
+                    best = float("inf")
+                    for _ in range(repeats):
+                        start = time.perf_counter()
+                        await read_pipeline(pipeline, names)
+                        best = min(best, time.perf_counter() - start)
+                    return best
+                finally:
+                    pipeline.close()
+
+            concurrent = asyncio.run(timed_pipeline())
+            print(f"{count:>6} {sequential:>13.3f} {concurrent:>11.3f} {sequential / concurrent:>7.1f}x")
+
+
+def _timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--download-latency", type=float, default=0.05, help="Seconds added to every download")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size (defaults to CPU count)")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    run(args.files, args.pages, args.download_latency, args.workers, args.repeats)
@@ -0,0 +1,316 @@
+# benchmarks/bench_query_load.py
+"""
+Offline end-to-end load test of /query.
+
+Starts the mock services (chat completions and Custom Search stand-ins) and the API with
+every external dependency replaced by a local one: DeepSeek points at the mock LLM, Google
+Search at the stub search API, GCS at a directory of fixture PDFs (GCS_BACKEND=local) and
+the history at SQLite (or a local MySQL with --storage-type mysql and the usual MYSQL_*
+variables). The fixture PDFs are ingested before the run, so queries search a prebuilt index.
+
+/query is then driven at the given concurrency. The report has p50/p95/p99 latency overall
+and per pipeline stage, requests per second, errors, and the API process' RSS. --json stores
+it together with the git commit, so runs can be compared across commits with --compare.
+
+    python -m benchmarks.bench_query_load --concurrency 1 8 32 --requests 500 --json load.json
+    python -m benchmarks.bench_query_load --concurrency 8 --llm-latency 0.5 --compare load.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpx
+import numpy as np
+from benchmarks.pdf_fixtures import random_text, write_fixture_pdfs
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _git_commit() -> dict:
+    def git(*args) -> str:
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+
+    return {"commit": git("rev-parse", "HEAD") or None, "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def rss_mb(pid: int) -> float:
+    """
+    Resident set size of a process, from /proc on Linux or ps elsewhere.
+    """
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        output = subprocess.run(["ps", "-o", "rss=", "-p", str(pid)], capture_output=True, text=True).stdout
+        if output.strip():
+            return int(output.strip()) / 1024
+    return float("nan")
+
+
+def start_server(app: str, port: int, env: dict, log_path: str) -> subprocess.Popen:
+    log = open(log_path, "w")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+
+
+def wait_ready(url: str, process: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server for {url} exited with status {process.returncode}, see its log")
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server for {url} was not ready after {timeout}s")
+
+
+def ingest(base_url: str, file_names: list, timeout: float) -> None:
+    httpx.post(f"{base_url}/documents/ingest", json={"file_names": file_names}, timeout=60).raise_for_status()
+    deadline = time.monotonic() + timeout
+    pending = set(file_names)
+    while pending and time.monotonic() < deadline:
+        for name in list(pending):
+            state = httpx.get(f"{base_url}/documents/{name}/status", timeout=10).json().get("state")
+            if state == "failed":
+                raise RuntimeError(f"Ingestion of '{name}' failed")
+            if state == "indexed":
+                pending.discard(name)
+        time.sleep(0.2)
+    if pending:
+        raise RuntimeError(f"Ingestion did not finish after {timeout}s: {sorted(pending)}")
+
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+        "mean_ms": round(float(np.mean(values)), 2),
+    }
+
+
+async def drive(base_url: str, bodies: list, concurrency: int, pid: int = None) -> dict:
+    """
+    Send every body to /query with `concurrency` requests in flight.
+    """
+    latencies, stages, errors = [], {}, {}
+    rss_samples = []
+    queue = iter(bodies)
+
+    async def worker(client: httpx.AsyncClient):
+        for body in queue:
+            start = time.perf_counter()
+            try:
+                response = await client.post(f"{base_url}/query", json=body)
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                response, status = None, type(e).__name__
+            elapsed = (time.perf_counter() - start) * 1000
+            if status != "200":
+                errors[status] = errors.get(status, 0) + 1
+                continue
+            latencies.append(elapsed)
+            for name, stage in response.json()["timings"]["stages"].items():
+                stages.setdefault(name, {}).setdefault(stage["status"], []).append(stage["ms"])
+
+    async def sample_rss(stop: asyncio.Event):
+        while not stop.is_set():
+            rss_samples.append(rss_mb(pid))
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=0.25)
+            except asyncio.TimeoutError:
+                pass
+
+    stop = asyncio.Event()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=300, limits=limits) as client:
+        sampler = asyncio.create_task(sample_rss(stop)) if pid else None
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        seconds = time.perf_counter() - start
+        stop.set()
+        if sampler:
+            await sampler
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(bodies),
+        "seconds": round(seconds, 2),
+        "rps": round(len(latencies) / seconds, 2),
+        "errors": errors,
+        "latency": percentiles(latencies),
+        "stages": {
+            f"{name}:{status}" if status != "ok" else name: percentiles(values)
+            for name, by_status in stages.items()
+            for status, values in by_status.items()
+        },
+        "rss_mb": {
+            "peak": round(max(rss_samples), 1) if rss_samples else None,
+            "end": round(rss_samples[-1], 1) if rss_samples else None,
+        },
+    }
+
+
+def make_bodies(args, file_names: list, seed: int) -> list:
+    rng = random.Random(seed)
+    # A pool of distinct questions: a smaller pool means more repeated (cacheable) queries
+    questions = [random_text(rng.randint(6, 14), rng) + "?" for _ in range(args.unique_queries)]
+    return [
+        {
+            "query": rng.choice(questions),
+            "model_name": args.model,
+            "storage_type": args.storage_type,
+            "user_id": f"load-{rng.randrange(args.users)}",
+            "max_history": args.max_history,
+            "gcs_file_names": rng.sample(file_names, min(args.files_per_query, len(file_names))) or None,
+            "use_cache": args.use_cache,
+        }
+        for _ in range(args.requests)
+    ]
+
+
+def print_run(run: dict) -> None:
+    latency = run["latency"]
+    print(
+        f"\nconcurrency={run['concurrency']}  rps={run['rps']}  errors={run['errors'] or 0}  "
+        f"rss peak={run['rss_mb']['peak']}MB end={run['rss_mb']['end']}MB"
+    )
+    print(f"  {'stage':24s} {'count':>6} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9}")
+    for name, stats in [("total", latency), *run["stages"].items()]:
+        if stats["count"]:
+            print(f"  {name:24s} {stats['count']:>6} {stats['p50_ms']:>9} {stats['p95_ms']:>9} {stats['p99_ms']:>9}")
+
+
+def print_comparison(report: dict, baseline: dict) -> None:
+    print(f"\ncompared with {baseline['git']['commit']} ({baseline['timestamp']}):")
+    previous = {run["concurrency"]: run for run in baseline["runs"]}
+    for run in report["runs"]:
+        old = previous.get(run["concurrency"])
+        if old is None or not old["latency"]["count"] or not run["latency"]["count"]:
+            continue
+        deltas = [f"rps {run['rps'] - old['rps']:+.2f}"] + [
+            f"{key} {run['latency'][key] - old['latency'][key]:+.2f}ms" for key in ("p50_ms", "p95_ms", "p99_ms")
+        ]
+        print(f"  concurrency={run['concurrency']}: " + "  ".join(deltas))
+
+
+def run(args) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        documents = args.bucket_dir or os.path.join(directory, "bucket")
+        os.makedirs(documents, exist_ok=True)
+        file_names = write_fixture_pdfs(documents, args.files, pages=args.pages)
+        processes = []
+        try:
+            base_url, pid = args.app_url, args.app_pid
+            if base_url is None:
+                mock_port, app_port = _free_port(), _free_port()
+                mock_env = dict(
+                    os.environ,
+                    MOCK_LLM_LATENCY=str(args.llm_latency),
+                    MOCK_SEARCH_LATENCY=str(args.search_latency),
+                    MOCK_ERROR_RATE=str(args.error_rate),
+                )
+                processes.append(start_server(
+                    "benchmarks.mock_services:app", mock_port, mock_env, os.path.join(directory, "mock.log")
+                ))
+                mock_url = f"http://127.0.0.1:{mock_port}"
+                app_env = dict(
+                    os.environ,
+                    DEEPSEEK_ENDPOINT=f"{mock_url}/v1/chat/completions",
+                    DEEPSEEK_API_KEY="load-test",
+                    FAKE_MODEL_ENABLED="true",
+                    FAKE_MODEL_LATENCY=str(args.llm_latency),
+                    GOOGLE_SEARCH_ENDPOINT=f"{mock_url}/customsearch/v1",
+                    GOOGLE_SEARCH_API_KEY="load-test",
+                    GOOGLE_CSE_ID="load-test",
+                    GCS_BACKEND="local",
+                    GCS_LOCAL_PATH=documents,
+                    SQLITE_PATH=os.path.join(directory, "history.db"),
+                    VECTOR_STORE_PATH=os.path.join(directory, "vector_store"),
+                )
+                app_process = start_server("main:app", app_port, app_env, os.path.join(directory, "app.log"))
+                processes.append(app_process)
+                base_url, pid = f"http://127.0.0.1:{app_port}", app_process.pid
+                wait_ready(f"{mock_url}/docs", processes[0], args.startup_timeout)
+                wait_ready(f"{base_url}/check-handlers", app_process, args.startup_timeout)
+
+            if args.files_per_query:
+                ingest(base_url, file_names, args.startup_timeout)
+
+            # Warm up connections, the embedding model and the caches
+            asyncio.run(drive(base_url, make_bodies(args, file_names, seed=1)[:args.warmup], 1))
+            report = {
+                "git": _git_commit(),
+                "timestamp": datetime.now().isoformat(),
+                "args": vars(args),
+                "runs": [],
+            }
+            for concurrency in args.concurrency:
+                result = asyncio.run(drive(base_url, make_bodies(args, file_names, seed=concurrency), concurrency, pid))
+                report["runs"].append(result)
+                print_run(result)
+            return report
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=500, help="Requests per concurrency level")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--model", default="deepseek", choices=["deepseek", "fake"], help="'deepseek' calls the mock LLM server")
+    parser.add_argument("--storage-type", default="sqlite", choices=["sqlite", "mysql"])
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Seconds per mock LLM answer")
+    parser.add_argument("--search-latency", type=float, default=0.1, help="Seconds per stub search")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of mock calls failing with 503")
+    parser.add_argument("--files", type=int, default=10, help="Fixture PDFs in the local bucket")
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--files-per-query", type=int, default=2, help="0 sends queries without documents or search")
+    parser.add_argument("--unique-queries", type=int, default=1000, help="Distinct questions the requests draw from")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--max-history", type=int, default=20)
+    parser.add_argument("--use-cache", action="store_true", help="Allow answers from the semantic response cache")
+    parser.add_argument("--app-url", help="Drive an already running API instead of starting one")
+    parser.add_argument("--bucket-dir", help="Write the fixture PDFs here, e.g. the GCS_LOCAL_PATH of the API given with --app-url")
+    parser.add_argument("--app-pid", type=int, help="PID of the API given with --app-url, to sample its RSS")
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    parser.add_argument("--json", help="Write the report to this file")
+    parser.add_argument("--compare", help="Report from an earlier run to compare with")
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(report, json.load(f))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
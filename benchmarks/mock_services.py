@@ -0,0 +1,79 @@
+# benchmarks/mock_services.py
+"""
+Local stand-ins for external HTTP APIs, for offline tests and benchmarks.
+
+    MOCK_LLM_LATENCY=0.5 MOCK_ERROR_RATE=0.1 uvicorn benchmarks.mock_services:app --port 8081
+
+Point the app at it with DEEPSEEK_ENDPOINT=http://127.0.0.1:8081/v1/chat/completions and
+GOOGLE_SEARCH_ENDPOINT=http://127.0.0.1:8081/customsearch/v1.
+"""
+import asyncio
+import json
+import os
+import random
+import time
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI()
+
+LLM_LATENCY = float(os.getenv("MOCK_LLM_LATENCY", 0.2))  # Seconds per answer
+ERROR_RATE = float(os.getenv("MOCK_ERROR_RATE", 0.0))  # Fraction of calls answered with 503
+ANSWER_WORDS = int(os.getenv("MOCK_ANSWER_WORDS", 50))
+SEARCH_LATENCY = float(os.getenv("MOCK_SEARCH_LATENCY", 0.1))  # Seconds per search
+SEARCH_RESULTS = int(os.getenv("MOCK_SEARCH_RESULTS", 5))
+
+
+def _answer(messages: list) -> str:
+    prompt = messages[-1]["content"] if messages else ""
+    words = (f"Mock answer to: {prompt} " * ANSWER_WORDS).split()[:ANSWER_WORDS]
+    return " ".join(words)
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    """
+    OpenAI/DeepSeek-compatible chat completions, streaming and non-streaming.
+    """
+    body = await request.json()
+    if random.random() < ERROR_RATE:
+        return JSONResponse({"error": "mock overload"}, status_code=503)
+    answer = _answer(body.get("messages", []))
+    completion_id = f"mock-{time.time_ns()}"
+
+    if not body.get("stream"):
+        await asyncio.sleep(LLM_LATENCY)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+        }
+
+    async def events():
+        words = answer.split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(LLM_LATENCY / len(words))
+            delta = {"content": word if i == 0 else f" {word}"}
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": delta}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/customsearch/v1")
+async def custom_search(q: str = "", key: str = "", cx: str = ""):
+    """
+    Google Custom Search JSON API stand-in.
+    """
+    if random.random() < ERROR_RATE:
+        return JSONResponse({"error": {"code": 503, "message": "mock overload"}}, status_code=503)
+    await asyncio.sleep(SEARCH_LATENCY)
+    return {
+        "kind": "customsearch#search",
+        "items": [
+            {"title": f"Result {i + 1} for {q}", "link": f"https://example.com/{i}", "snippet": f"Mock snippet {i + 1} about {q}."}
+            for i in range(SEARCH_RESULTS)
+        ],
+    }
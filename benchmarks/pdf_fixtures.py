@@ -0,0 +1,61 @@
+# benchmarks/pdf_fixtures.py
+import os
+import random
+
+_WORDS = (
+    "data model index query vector search document page retrieval context answer cloud storage "
+    "bucket latency throughput embedding chunk token history session cache network request "
+    "response server worker process thread memory disk budget score rank fusion lexical dense"
+).split()
+
+
+def make_pdf(pages: list) -> bytes:
+    """
+    Build a minimal PDF with one line of Helvetica text per page.
+    Only used to generate local fixtures; no PDF library is needed.
+    """
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for i, text in enumerate(pages):
+        page_id = 4 + 2 * i
+        content_id = page_id + 1
+        kids.append(f"{page_id} 0 R")
+        escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        stream = f"BT /F1 10 Tf 72 720 Td ({escaped}) Tj ET".encode("latin-1", "replace")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>".encode()
+
+    output = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref_offset = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        output += f"{offset:010d} 00000 n \n".encode()
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+    return output
+
+
+def random_text(words: int, rng: random.Random) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words))
+
+
+def write_fixture_pdfs(directory: str, count: int, pages: int = 20, words_per_page: int = 120, seed: int = 0) -> list:
+    """
+    Write `count` fixture PDFs to a directory and return their file names.
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    names = []
+    for i in range(count):
+        name = f"fixture_{i:04d}.pdf"
+        with open(os.path.join(directory, name), "wb") as f:
+            f.write(make_pdf([random_text(words_per_page, rng) for _ in range(pages)]))
+        names.append(name)
+    return names
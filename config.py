@@ -9,36 +9,212 @@ load_dotenv()
 MODEL_CONFIG = {
     "deepseek": {
         "api_key": os.getenv("DEEPSEEK_API_KEY"),
-        "endpoint": "https://api.deepseek.com/v1/chat/completions"
+        "endpoint": os.getenv("DEEPSEEK_ENDPOINT", "https://api.deepseek.com/v1/chat/completions"),
+        "model": os.getenv("DEEPSEEK_MODEL", "deepseek-chat"),
+        "max_concurrency": int(os.getenv("DEEPSEEK_MAX_CONCURRENCY", 16)),
+        "timeout": float(os.getenv("DEEPSEEK_TIMEOUT", 60))
     },
     "gemini": {
-        "api_key": os.getenv("GEMINI_API_KEY")
+        "api_key": os.getenv("GEMINI_API_KEY"),
+        "max_concurrency": int(os.getenv("GEMINI_MAX_CONCURRENCY", 16)),
+        "timeout": float(os.getenv("GEMINI_TIMEOUT", 60))
+    },
+    "fake": {
+        # Offline backend that echoes the prompt, for tests and benchmarks
+        "enabled": os.getenv("FAKE_MODEL_ENABLED", "false").lower() == "true",
+        "latency": float(os.getenv("FAKE_MODEL_LATENCY", 0.0))  # Seconds per answer
     }
 }
 
+# Model Provider Resilience Configuration (shared by all providers)
+PROVIDER_CONFIG = {
+    "max_concurrency": 16,  # Default per-provider limit of concurrent calls
+    "timeout": 60.0,  # Default seconds per call
+    "max_retries": int(os.getenv("PROVIDER_MAX_RETRIES", 2)),  # Retries on 429/5xx, timeouts and connection errors
+    "backoff_base": float(os.getenv("PROVIDER_BACKOFF_BASE", 0.5)),  # Seconds, doubled per retry with full jitter
+    "backoff_max": float(os.getenv("PROVIDER_BACKOFF_MAX", 8)),
+    "breaker_failure_threshold": int(os.getenv("PROVIDER_BREAKER_FAILURE_THRESHOLD", 5)),
+    "breaker_reset_timeout": float(os.getenv("PROVIDER_BREAKER_RESET_TIMEOUT", 30)),  # Seconds before a trial call
+    "http2": os.getenv("PROVIDER_HTTP2", "true").lower() == "true",  # Needs the 'h2' package
+    "max_connections": int(os.getenv("PROVIDER_MAX_CONNECTIONS", 100)),
+    "max_keepalive_connections": int(os.getenv("PROVIDER_MAX_KEEPALIVE_CONNECTIONS", 20)),
+    "connect_timeout": float(os.getenv("PROVIDER_CONNECT_TIMEOUT", 10)),
+    "read_timeout": float(os.getenv("PROVIDER_READ_TIMEOUT", 60))  # Seconds to wait for each chunk of a response
+}
+
 # Database Configuration
 DATABASE_CONFIG = {
     "mysql": {
         "host": os.getenv("MYSQL_HOST"),
         "user": os.getenv("MYSQL_USER"),
         "password": os.getenv("MYSQL_PASSWORD"),
-        "database": os.getenv("MYSQL_DATABASE")
+        "database": os.getenv("MYSQL_DATABASE"),
+        "pool_size": int(os.getenv("MYSQL_POOL_SIZE", 5)),
+        "pool_acquire_timeout": float(os.getenv("MYSQL_POOL_ACQUIRE_TIMEOUT", 10)),  # Seconds to wait for a free connection
+        "pool_health_check_interval": float(os.getenv("MYSQL_POOL_HEALTH_CHECK_INTERVAL", 30))  # Ping connections idle longer than this
     },
     "bigquery": {
         "project_id": os.getenv("BIGQUERY_PROJECT_ID"),
         "dataset_id": os.getenv("BIGQUERY_DATASET_ID"),
         "credentials_path": os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+    },
+    "sqlite": {
+        "path": os.getenv("SQLITE_PATH", "conversation_history.db")  # Local stand-in for development and tests
     }
 }
 
+# History Schema and Read Configuration
+HISTORY_SCHEMA_CONFIG = {
+    # Apply pending schema migrations when a MySQL/BigQuery handler starts (SQLite always migrates)
+    "auto_migrate": os.getenv("HISTORY_AUTO_MIGRATE", "false").lower() == "true",
+    "migration_lock_timeout": int(os.getenv("HISTORY_MIGRATION_LOCK_TIMEOUT", 60)),  # Seconds to wait for another process's migration (MySQL)
+    "window_days": float(os.getenv("HISTORY_WINDOW_DAYS", 30)),  # Only turns this recent are read, 0 reads all
+    "max_page_size": int(os.getenv("HISTORY_MAX_PAGE_SIZE", 100))
+}
+
+# History Write-Behind Configuration
+HISTORY_WRITER_CONFIG = {
+    "enabled": os.getenv("HISTORY_WRITE_BEHIND", "true").lower() == "true",
+    "max_batch_size": int(os.getenv("HISTORY_WRITER_MAX_BATCH_SIZE", 100)),
+    "flush_interval": float(os.getenv("HISTORY_WRITER_FLUSH_INTERVAL", 1.0)),  # Seconds a row may wait before being written
+    "max_buffer_size": int(os.getenv("HISTORY_WRITER_MAX_BUFFER_SIZE", 10000)),  # Oldest rows are dropped beyond this
+    "max_retries": int(os.getenv("HISTORY_WRITER_MAX_RETRIES", 3)),
+    "retry_backoff": float(os.getenv("HISTORY_WRITER_RETRY_BACKOFF", 0.5))
+}
+
+# History Cache Configuration
+HISTORY_CACHE_CONFIG = {
+    "backend": os.getenv("HISTORY_CACHE_BACKEND", "memory"),  # 'memory', 'redis' or 'none'
+    "redis_url": os.getenv("HISTORY_CACHE_REDIS_URL", "redis://localhost:6379/0"),
+    "ttl": float(os.getenv("HISTORY_CACHE_TTL", 900)),  # Seconds
+    "max_users": int(os.getenv("HISTORY_CACHE_MAX_USERS", 10000)),  # In-memory backend only
+    "max_entries_per_user": int(os.getenv("HISTORY_CACHE_MAX_ENTRIES_PER_USER", 50)),
+    "max_bytes_per_user": int(os.getenv("HISTORY_CACHE_MAX_BYTES_PER_USER", 262144))
+}
+
 # Google Cloud Storage Configuration
 GCS_CONFIG = {
     "bucket_name": os.getenv("GCS_BUCKET_NAME"),
-    "credentials_path": os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+    "credentials_path": os.getenv("GOOGLE_APPLICATION_CREDENTIALS"),
+    "backend": os.getenv("GCS_BACKEND", "gcs"),  # 'gcs' or 'local'
+    "local_path": os.getenv("GCS_LOCAL_PATH", "local_bucket")  # Directory used when backend is 'local'
+}
+
+# Document Vector Store Configuration
+VECTOR_STORE_CONFIG = {
+    "path": os.getenv("VECTOR_STORE_PATH", "vector_store"),
+    "index_type": os.getenv("VECTOR_STORE_INDEX_TYPE", "flat_ip"),  # flat_l2, flat_ip, ivf_flat, ivf_pq or hnsw
+    "nlist": int(os.getenv("VECTOR_STORE_NLIST", 256)),  # IVF clusters
+    "pq_m": int(os.getenv("VECTOR_STORE_PQ_M", 48)),  # PQ sub-quantizers, must divide the embedding dimension
+    "pq_nbits": int(os.getenv("VECTOR_STORE_PQ_NBITS", 8)),
+    "hnsw_m": int(os.getenv("VECTOR_STORE_HNSW_M", 32)),  # HNSW links per node
+    "ef_construction": int(os.getenv("VECTOR_STORE_EF_CONSTRUCTION", 40)),
+    "nprobe": int(os.getenv("VECTOR_STORE_NPROBE", 16)),  # IVF clusters visited per search
+    "ef_search": int(os.getenv("VECTOR_STORE_EF_SEARCH", 64)),  # HNSW candidates per search
+    "train_size": int(os.getenv("VECTOR_STORE_TRAIN_SIZE", 0)),  # Vectors before IVF training, 0 means 39 * nlist
+    "mmap": os.getenv("VECTOR_STORE_MMAP", "false").lower() == "true"  # Memory-map the index file when loading
+}
+
+# Embedding Model Configuration
+EMBEDDING_CONFIG = {
+    "model_name": os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2"),
+    "backend": os.getenv("EMBEDDING_BACKEND", "torch"),  # 'torch' or 'onnx'
+    "onnx_file": os.getenv("EMBEDDING_ONNX_FILE", "onnx/model_qint8_avx512_vnni.onnx"),  # int8-quantized export
+    "batch_size": int(os.getenv("EMBEDDING_BATCH_SIZE", 64)),
+    "threads": int(os.getenv("EMBEDDING_THREADS", 0)),  # 0 keeps the library default
+    "cache_enabled": os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true",
+    "cache_max_entries": int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 200000)),  # ~750 bytes each for MiniLM
+    "cache_path": os.getenv("EMBEDDING_CACHE_PATH", "")  # Optional SQLite file that persists the cache
+}
+
+# Document Retrieval Configuration
+RETRIEVAL_CONFIG = {
+    "chunk_tokens": int(os.getenv("RETRIEVAL_CHUNK_TOKENS", 200)),  # Stays under MiniLM's 256 token limit
+    "chunk_overlap_tokens": int(os.getenv("RETRIEVAL_CHUNK_OVERLAP_TOKENS", 40)),
+    "embed_batch_size": int(os.getenv("RETRIEVAL_EMBED_BATCH_SIZE", 64)),
+    "top_k": int(os.getenv("RETRIEVAL_TOP_K", 5)),
+    "context_token_budget": int(os.getenv("RETRIEVAL_CONTEXT_TOKEN_BUDGET", 1500)),
+    # 'hybrid': BM25 and dense results fused by reciprocal rank; 'dense': FAISS only
+    "mode": os.getenv("RETRIEVAL_MODE", "hybrid"),
+    "fusion_candidates": int(os.getenv("RETRIEVAL_FUSION_CANDIDATES", 50)),  # Taken from each retriever
+    "rrf_k": int(os.getenv("RETRIEVAL_RRF_K", 60)),
+    "bm25_k1": float(os.getenv("RETRIEVAL_BM25_K1", 1.2)),
+    "bm25_b": float(os.getenv("RETRIEVAL_BM25_B", 0.75)),
+    "reranker_enabled": os.getenv("RETRIEVAL_RERANKER_ENABLED", "false").lower() == "true",
+    "reranker_model": os.getenv("RETRIEVAL_RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2"),
+    "reranker_top_n": int(os.getenv("RETRIEVAL_RERANKER_TOP_N", 20)),  # Fused candidates re-scored per query
+    "reranker_batch_size": int(os.getenv("RETRIEVAL_RERANKER_BATCH_SIZE", 32))
+}
+
+# PDF Fetch and Extraction Pipeline Configuration
+PDF_PIPELINE_CONFIG = {
+    "max_concurrent_downloads": int(os.getenv("PDF_MAX_CONCURRENT_DOWNLOADS", 8)),
+    "max_files_in_flight": int(os.getenv("PDF_MAX_FILES_IN_FLIGHT", 16)),  # Bounds PDF bytes held in memory
+    "max_workers": int(os.getenv("PDF_MAX_WORKERS", 0)) or None,  # Process pool size, defaults to CPU count
+    "pages_per_task": int(os.getenv("PDF_PAGES_PER_TASK", 8)),
+    "file_timeout": float(os.getenv("PDF_FILE_TIMEOUT", 60))  # Seconds to download and extract one file
+}
+
+# Query Pipeline Configuration
+# Per-stage deadlines in seconds; a stage that misses its deadline is left out of the context
+QUERY_PIPELINE_CONFIG = {
+    "history_timeout": float(os.getenv("QUERY_HISTORY_TIMEOUT", 2)),
+    "documents_timeout": float(os.getenv("QUERY_DOCUMENTS_TIMEOUT", 15)),
+    "search_timeout": float(os.getenv("QUERY_SEARCH_TIMEOUT", 5)),
+    "batch_max_size": int(os.getenv("QUERY_BATCH_MAX_SIZE", 256)),  # Queries accepted per /query/batch call
+    "batch_max_concurrency": int(os.getenv("QUERY_BATCH_MAX_CONCURRENCY", 8))  # Model calls in flight per batch
+}
+
+# Prompt Assembly Configuration (token budgets per prompt section)
+PROMPT_CONFIG = {
+    "context_tokens": int(os.getenv("PROMPT_CONTEXT_TOKENS", 1000)),  # Request context
+    "documents_tokens": int(os.getenv("PROMPT_DOCUMENTS_TOKENS", os.getenv("RETRIEVAL_CONTEXT_TOKEN_BUDGET", 1500))),
+    "search_tokens": int(os.getenv("PROMPT_SEARCH_TOKENS", 400)),  # Web search results
+    "history_tokens": int(os.getenv("PROMPT_HISTORY_TOKENS", 1500)),  # Recent turns sent verbatim
+    "recent_turns": int(os.getenv("PROMPT_RECENT_TURNS", 4)),  # Older turns are compacted into a summary
+    "turn_tokens": int(os.getenv("PROMPT_TURN_TOKENS", 400)),  # Per recent turn
+    "summary_tokens": int(os.getenv("PROMPT_SUMMARY_TOKENS", 300)),
+    "summary_turn_tokens": int(os.getenv("PROMPT_SUMMARY_TURN_TOKENS", 48)),  # Per compacted turn
+    "summary_max_users": int(os.getenv("PROMPT_SUMMARY_MAX_USERS", 10000)),
+    "include_context": os.getenv("PROMPT_INCLUDE_CONTEXT", "false").lower() == "true"  # Default for responses
+}
+
+# Document Ingestion Configuration
+INGESTION_CONFIG = {
+    "workers": int(os.getenv("INGESTION_WORKERS", 2)),  # Files ingested concurrently
+    "max_attempts": int(os.getenv("INGESTION_MAX_ATTEMPTS", 3)),
+    "retry_backoff": float(os.getenv("INGESTION_RETRY_BACKOFF", 1.0)),  # Seconds, doubled on each retry
+    "max_queue": int(os.getenv("INGESTION_MAX_QUEUE", 1000)),
+    "max_finished_jobs": int(os.getenv("INGESTION_MAX_FINISHED_JOBS", 10000)),  # Finished jobs kept for /documents status
+    "blob_info_ttl": float(os.getenv("INGESTION_BLOB_INFO_TTL", 5.0)),  # Seconds queries reuse a file's generation lookup
+    # 'background': queries search the prebuilt index and queue stale files for ingestion;
+    # 'inline': queries index stale files themselves before searching
+    "query_indexing": os.getenv("INGESTION_QUERY_INDEXING", "background")
+}
+
+# Semantic Response Cache Configuration
+RESPONSE_CACHE_CONFIG = {
+    "enabled": os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true",
+    "similarity_threshold": float(os.getenv("RESPONSE_CACHE_SIMILARITY_THRESHOLD", 0.95)),  # Cosine similarity
+    "max_entries": int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 5000)),
+    "ttl": float(os.getenv("RESPONSE_CACHE_TTL", 3600))  # Seconds
 }
 
 # Google Search API Configuration
 GOOGLE_SEARCH_CONFIG = {
     "api_key": os.getenv("GOOGLE_SEARCH_API_KEY"),
-    "cse_id": os.getenv("GOOGLE_CSE_ID")
-}
\ No newline at end of file
+    "cse_id": os.getenv("GOOGLE_CSE_ID"),
+    "endpoint": os.getenv("GOOGLE_SEARCH_ENDPOINT", "https://www.googleapis.com/customsearch/v1"),
+    "timeout": float(os.getenv("GOOGLE_SEARCH_TIMEOUT", 5)),  # Seconds per API call
+    "pool_size": int(os.getenv("GOOGLE_SEARCH_POOL_SIZE", 10)),  # Kept-alive connections
+    "cache_enabled": os.getenv("GOOGLE_SEARCH_CACHE_ENABLED", "true").lower() == "true",
+    "cache_max_entries": int(os.getenv("GOOGLE_SEARCH_CACHE_MAX_ENTRIES", 10000)),
+    "cache_ttl": float(os.getenv("GOOGLE_SEARCH_CACHE_TTL", 3600))  # Seconds
+}
+
+# Metrics and Tracing Configuration
+METRICS_CONFIG = {
+    "enabled": os.getenv("METRICS_ENABLED", "true").lower() == "true",  # Prometheus metrics on /metrics
+    "tracing_enabled": os.getenv("TRACING_ENABLED", "false").lower() == "true",  # OpenTelemetry spans
+    "service_name": os.getenv("TRACING_SERVICE_NAME", "omnisearch-rag")
+}
@@ -1,15 +1,45 @@
+import asyncio
+import json
+import logging
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from models.model_handler import ModelHandler
-from models.database_handler import DatabaseHandler
-from models.external_source_handler import ExternalSourceHandler
-from models.storage_handler import StorageHandler
-from models.faiss_handler import FaissHandler
-from schemas.request_models import QueryRequest
-from typing import Dict
+from fastapi.responses import StreamingResponse
+from config import HISTORY_SCHEMA_CONFIG, PROMPT_CONFIG, QUERY_PIPELINE_CONFIG, RESPONSE_CACHE_CONFIG
+from models.external_source_handler import IndexingIncomplete
+from models.handler_registry import build_default_registry
+from models.ingestion_service import REJECTED
+from models.metrics import STAGE_SECONDS, MetricsMiddleware, register_cache_collector, render_metrics, span
+from models.prompt_assembler import AssembledPrompt
+from models.response_cache import context_fingerprint
+from schemas.request_models import IngestRequest, QueryRequest
+from typing import Dict, List, Literal, Optional
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+# Handlers and clients are built once per process and shared across requests
+registry = build_default_registry()
+
+# Cache hit/miss counters are read from the caches when /metrics is scraped
+register_cache_collector(registry, {
+    "response_cache": "response",
+    "search_cache": "search",
+    "embedding_model": "embedding",
+    "prompt_assembler": "history_summary",
+})
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    registry.warm_up()
+    # Start the ingestion workers on the server's event loop
+    if registry.status()["ingestion"]["state"] == "warm":
+        registry.get("ingestion").start()
+    yield
+    await registry.aclose()
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -20,106 +50,459 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+# Request latency and in-flight requests for /metrics
+app.add_middleware(MetricsMiddleware)
+
+def _use_cache(request: QueryRequest) -> bool:
+    return request.use_cache and RESPONSE_CACHE_CONFIG["enabled"]
+
+def _cache_fingerprint(request: QueryRequest, source) -> str:
+    file_versions = source.vector_store.file_versions(request.gcs_file_names or [])
+    # Prompts include the user's history, so such answers are only shared with the same user
+    user_id = request.user_id if request.max_history else None
+    return context_fingerprint(request.context, file_versions, user_id)
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+def _observe_stage(name: str, status: str, start: float) -> None:
+    STAGE_SECONDS.labels(stage=name, status=status).observe(time.perf_counter() - start)
+
+async def _timed(timings: dict, name: str, awaitable):
+    """
+    Await a required stage and record its duration. Failures propagate.
+    """
+    start = time.perf_counter()
+    status = "error"
+    try:
+        with span(f"stage.{name}"):
+            result = await awaitable
+        status = "ok"
+        return result
+    finally:
+        timings[name] = {"status": status, "ms": _elapsed_ms(start)}
+        _observe_stage(name, status, start)
+
+async def _run_stage(timings: dict, name: str, awaitable, timeout: float, fallback):
+    """
+    Await an optional context stage under its deadline and record its duration.
+    A stage that misses the deadline or fails yields `fallback`, so the request continues
+    with partial context instead of failing. A document search over files that are not all
+    indexed yields what it found, with status 'pending' (still ingesting) or 'error' (failed).
+    """
+    start = time.perf_counter()
+    try:
+        with span(f"stage.{name}"):
+            result = await asyncio.wait_for(awaitable, timeout=timeout)
+        timings[name] = {"status": "ok"}
+    except asyncio.TimeoutError:
+        result = fallback
+        timings[name] = {"status": "timeout"}
+    except IndexingIncomplete as e:
+        # Answer from the files that are indexed; the stage is not "ok", so the answer is not cached
+        result = e.result
+        timings[name] = {"status": e.status, "files": e.files}
+    except Exception as e:
+        result = fallback
+        # Error messages can quote request URLs and credentials; clients only see the type
+        logger.warning("Stage %s failed: %s", name, e, exc_info=True)
+        timings[name] = {"status": "error", "error": type(e).__name__}
+    timings[name]["ms"] = _elapsed_ms(start)
+    _observe_stage(name, timings[name]["status"], start)
+    return result
+
+def _context_complete(timings: dict) -> bool:
+    return all(stage["status"] in ("ok", "skipped") for stage in timings.values())
+
+def _context_summary(assembled: AssembledPrompt) -> dict:
+    return {"prompt": assembled.prompt, "references": assembled.references}
+
+def _shared_context(assembled: AssembledPrompt) -> dict:
+    # What is stored with a cached answer: nothing from the user's conversation history
+    references = {key: value for key, value in assembled.references.items() if not key.startswith("history")}
+    return {"prompt": assembled.shared_prompt, "references": references}
+
+def _response_data(
+    request: QueryRequest, answer: str, context: dict, cache_hit: bool, timings: dict, start: float
+) -> dict:
+    response = {
+        "answer": answer,
+        "context_refs": context["references"]  # Documents, search and history the prompt was built from
+    }
+    # The full prompt is only echoed on request
+    include_context = PROMPT_CONFIG["include_context"] if request.include_context is None else request.include_context
+    if include_context:
+        response["context_used"] = context["prompt"]
+    return {
+        "user_id": request.user_id,  # Include the user_id in the response
+        "response_status": "success",  # Indicate the status of the response
+        "timestamp": datetime.now().isoformat(),  # Add current timestamp
+        "cache_hit": cache_hit,  # Whether the answer came from the semantic response cache
+        "response": response,
+        "timings": {"stages": timings, "total_ms": _elapsed_ms(start)},  # Per-stage latency breakdown
+    }
+
+async def _lookup_cached_answer(request: QueryRequest, source) -> Optional[dict]:
+    """
+    Look up a cached answer for repeated and near-duplicate questions.
+    """
+    if not _use_cache(request):
+        return None
+    cache = registry.get("response_cache")
+    return await asyncio.to_thread(
+        cache.lookup, request.query, _cache_fingerprint(request, source), request.model_name
+    )
+
+async def _skip_stage(timings: dict, name: str, value):
+    timings[name] = {"status": "skipped", "ms": 0.0}
+    return value
+
+def _build_prompt(request: QueryRequest, relevant_chunks: list, google_results: str, history: list) -> AssembledPrompt:
+    # External context is only gathered when GCS files are specified
+    return registry.get("prompt_assembler").assemble(
+        request.query,
+        context=request.context,
+        chunks=relevant_chunks,
+        search_results=google_results,
+        history=history,
+        user_id=request.user_id,
+        external=bool(request.gcs_file_names),
+    )
+
+async def _prepare_prompt(request: QueryRequest, db, source, timings: dict) -> AssembledPrompt:
+    """
+    Fetch the user's history, relevant documents and web search results concurrently and
+    assemble the prompt within the section token budgets. Each stage runs under its own deadline.
+    """
+    use_external = bool(request.gcs_file_names)
+    history, relevant_chunks, google_results = await asyncio.gather(
+        _run_stage(
+            timings, "history", db.aget_history(request.user_id, request.max_history),
+            QUERY_PIPELINE_CONFIG["history_timeout"], [],
+        ),
+        _run_stage(
+            timings, "documents", source.aget_relevant_chunks(request.query, request.gcs_file_names),
+            QUERY_PIPELINE_CONFIG["documents_timeout"], [],
+        ) if use_external else _skip_stage(timings, "documents", []),
+        _run_stage(
+            timings, "web_search", source.asearch_google(request.query),
+            QUERY_PIPELINE_CONFIG["search_timeout"], "",
+        ) if use_external else _skip_stage(timings, "web_search", ""),
+    )
+    return _build_prompt(request, relevant_chunks, google_results, history)
+
+async def _record_answer(
+    request: QueryRequest, db, source, answer: str, assembled: AssembledPrompt, cacheable: bool = True
+) -> None:
+    """
+    Insert the conversation into the database and the response cache.
+    Answers built from partial context are not cached.
+    """
+    await db.ainsert_history(request.user_id, request.query, answer)
+    if _use_cache(request) and cacheable:
+        # Fingerprint after retrieval: files indexed by this request now have a known generation
+        await asyncio.to_thread(
+            registry.get("response_cache").store,
+            request.query,
+            _cache_fingerprint(request, source),
+            request.model_name,
+            answer,
+            _shared_context(assembled),
+        )
+
 @app.post("/query")
 async def query(request: QueryRequest):
     try:
-        # Initialize handlers
-        model = ModelHandler(request.model_name)
-        db = DatabaseHandler(request.storage_type)
-        storage = StorageHandler()
-        source = ExternalSourceHandler()
-
-        # Get user history from the database
-        history = db.get_history(request.user_id, request.max_history)
-
-        # Get external context if GCS files are specified
-        external_context = ""
-        if request.gcs_file_names:
-            external_context = source.get_external_context(request.query, request.gcs_file_names)
-
-        # Combine query, context, and external context
-        if request.context or external_context:
-            full_prompt = f"{request.query}\n\nContext:\n{request.context}\n{external_context}"
-        else:
-            full_prompt = request.query
+        start = time.perf_counter()
+        timings = {}
+
+        # Get the shared handlers
+        model = registry.get(f"model_{request.model_name}")
+        db = registry.get(f"database_{request.storage_type}")
+        source = registry.get("external_source")
+
+        # Serve repeated and near-duplicate questions from the semantic response cache
+        cached = await _timed(timings, "cache_lookup", _lookup_cached_answer(request, source))
+        if cached is not None:
+            await db.ainsert_history(request.user_id, request.query, cached["answer"])
+            return _response_data(
+                request, cached["answer"], cached["context"], cache_hit=True, timings=timings, start=start
+            )
+
+        assembled = await _prepare_prompt(request, db, source, timings)
 
         # Generate response using the model
-        response = model.generate_response(full_prompt, history)
-
-        # Insert the conversation into the database
-        db.insert_history(request.user_id, request.query, response["answer"])
-
-        # Prepare the response with additional fields
-        response_data = {
-            "user_id": request.user_id,  # Include the user_id in the response
-            "response_status": "success",  # Indicate the status of the response   
-            "timestamp": datetime.now().isoformat(),  # Add current timestamp
-            "response": {
-                "answer": response["answer"],
-                "context_used": full_prompt
-            },
-        }
-
-        return response_data
+        response = await _timed(
+            timings, "generate", model.agenerate_response(assembled.prompt, assembled.history)
+        )
+
+        await _record_answer(
+            request, db, source, response["answer"], assembled, cacheable=_context_complete(timings)
+        )
+        return _response_data(
+            request, response["answer"], _context_summary(assembled), cache_hit=False, timings=timings, start=start
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/check-handlers")
-async def check_handlers() -> Dict[str, str]:
+async def _lookup_cached_answers(requests: List[QueryRequest], source) -> list:
     """
-    Endpoint to check the functionality of all handlers.
+    Batched cache lookup: the prompts of all requests using the cache are embedded together.
     """
-    results = {}
+    cached = [None] * len(requests)
+    positions = [i for i, request in enumerate(requests) if _use_cache(request)]
+    if positions:
+        lookups = [
+            (requests[i].query, _cache_fingerprint(requests[i], source), requests[i].model_name) for i in positions
+        ]
+        found = await asyncio.to_thread(registry.get("response_cache").lookup_many, lookups)
+        for i, entry in zip(positions, found):
+            cached[i] = entry
+    return cached
 
+@app.post("/query/batch")
+async def query_batch(requests: List[QueryRequest]):
+    """
+    Answer a list of queries in one call, for offline evaluation and bulk document QA.
+    Queries are embedded with one batched encode, documents shared across the batch are
+    fetched and indexed once, and model calls run with bounded concurrency. Results are
+    returned in request order; a failed item carries its error instead of failing the batch.
+    """
+    if len(requests) > QUERY_PIPELINE_CONFIG["batch_max_size"]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch Error: at most {QUERY_PIPELINE_CONFIG['batch_max_size']} queries per batch",
+        )
+    start = time.perf_counter()
     try:
-        # Check DatabaseHandler (MySQL)
-        db_mysql = DatabaseHandler("mysql")
-        db_mysql.get_history(user_id="ADMIN", limit=1)
-        results["database_mysql"] = "OK"
+        source = registry.get("external_source")
+
+        # Stages shared by the whole batch
+        shared_timings = {}
+        cached = await _timed(shared_timings, "cache_lookup", _lookup_cached_answers(requests, source))
+        retrieval = [i for i, request in enumerate(requests) if cached[i] is None and request.gcs_file_names]
+        relevant_chunks = [[] for _ in requests]
+        if retrieval:
+            found = await _run_stage(
+                shared_timings,
+                "documents",
+                source.aget_relevant_chunks_many(
+                    [requests[i].query for i in retrieval], [requests[i].gcs_file_names for i in retrieval]
+                ),
+                QUERY_PIPELINE_CONFIG["documents_timeout"],
+                [[] for _ in retrieval],
+            )
+            for i, chunks in zip(retrieval, found):
+                relevant_chunks[i] = chunks
     except Exception as e:
-        results["database_mysql"] = f"Error: {str(e)}"
+        raise HTTPException(status_code=500, detail=str(e))
+
+    model_slots = asyncio.Semaphore(QUERY_PIPELINE_CONFIG["batch_max_concurrency"])
+
+    async def answer(i: int, request: QueryRequest) -> dict:
+        timings = {"cache_lookup": shared_timings["cache_lookup"]}
+        try:
+            model = registry.get(f"model_{request.model_name}")
+            db = registry.get(f"database_{request.storage_type}")
+            if cached[i] is not None:
+                await db.ainsert_history(request.user_id, request.query, cached[i]["answer"])
+                return _response_data(
+                    request, cached[i]["answer"], cached[i]["context"], cache_hit=True, timings=timings, start=start
+                )
+
+            use_external = bool(request.gcs_file_names)
+            if use_external:
+                timings["documents"] = shared_timings["documents"]
+            history, google_results = await asyncio.gather(
+                _run_stage(
+                    timings, "history", db.aget_history(request.user_id, request.max_history),
+                    QUERY_PIPELINE_CONFIG["history_timeout"], [],
+                ),
+                # Identical searches across the batch are coalesced by the search cache
+                _run_stage(
+                    timings, "web_search", source.asearch_google(request.query),
+                    QUERY_PIPELINE_CONFIG["search_timeout"], "",
+                ) if use_external else _skip_stage(timings, "web_search", ""),
+            )
+            assembled = _build_prompt(request, relevant_chunks[i], google_results, history)
+
+            async with model_slots:
+                response = await _timed(
+                    timings, "generate", model.agenerate_response(assembled.prompt, assembled.history)
+                )
+
+            await _record_answer(
+                request, db, source, response["answer"], assembled, cacheable=_context_complete(timings)
+            )
+            return _response_data(
+                request, response["answer"], _context_summary(assembled), cache_hit=False, timings=timings, start=start
+            )
+        except Exception as e:
+            return {
+                "user_id": request.user_id,
+                "response_status": "error",
+                "timestamp": datetime.now().isoformat(),
+                "detail": str(e),
+            }
+
+    results = await asyncio.gather(*(answer(i, request) for i, request in enumerate(requests)))
+    return {"results": results, "total_ms": _elapsed_ms(start)}
+
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
+@app.post("/query/stream")
+async def query_stream(request: QueryRequest):
+    """
+    Streaming variant of /query using Server-Sent Events.
+    Emits `token` events as the model generates text, then a `done` event with the
+    same fields as the /query response. Failures during generation emit an `error` event.
+    """
     try:
-        # Check DatabaseHandler (BigQuery)
-        db_bigquery = DatabaseHandler("bigquery")
-        db_bigquery.get_history(user_id="ADMIN", limit=1)
-        results["database_bigquery"] = "OK"
+        start = time.perf_counter()
+        timings = {}
+        model = registry.get(f"model_{request.model_name}")
+        db = registry.get(f"database_{request.storage_type}")
+        source = registry.get("external_source")
+
+        cached = await _timed(timings, "cache_lookup", _lookup_cached_answer(request, source))
+        if cached is None:
+            assembled = await _prepare_prompt(request, db, source, timings)
     except Exception as e:
-        results["database_bigquery"] = f"Error: {str(e)}"
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def events():
+        if cached is not None:
+            await db.ainsert_history(request.user_id, request.query, cached["answer"])
+            yield _sse_event("token", {"text": cached["answer"]})
+            yield _sse_event("done", _response_data(
+                request, cached["answer"], cached["context"], cache_hit=True, timings=timings, start=start
+            ))
+            return
 
+        pieces = []
+        try:
+            generate_start = time.perf_counter()
+            async for piece in model.astream_response(assembled.prompt, assembled.history):
+                if not pieces:
+                    timings["first_token"] = {"status": "ok", "ms": _elapsed_ms(generate_start)}
+                    _observe_stage("first_token", "ok", generate_start)
+                pieces.append(piece)
+                yield _sse_event("token", {"text": piece})
+            timings["generate"] = {"status": "ok", "ms": _elapsed_ms(generate_start)}
+            _observe_stage("generate", "ok", generate_start)
+            answer = "".join(pieces)
+            await _record_answer(request, db, source, answer, assembled, cacheable=_context_complete(timings))
+            yield _sse_event("done", _response_data(
+                request, answer, _context_summary(assembled), cache_hit=False, timings=timings, start=start
+            ))
+        except Exception as e:
+            yield _sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@app.post("/documents/ingest", status_code=202)
+async def ingest_documents(request: IngestRequest, response: Response) -> Dict[str, dict]:
+    """
+    Endpoint to queue files for background ingestion (download, parse, chunk and embed).
+    Files already indexed at their current generation are skipped unless force is set.
+    Responds 503 when the queue was full for some of the files, which are reported as 'rejected'.
+    """
     try:
-        # Check ModelHandler (Gemini)
-        model_gemini = ModelHandler("gemini")
-        response = model_gemini.generate_response("Test query", [])
-        results["model_gemini"] = f"OK - Response: {response['answer']}"
+        ingestion = registry.get("ingestion")
     except Exception as e:
-        results["model_gemini"] = f"Error: {str(e)}"
+        raise HTTPException(status_code=500, detail=str(e))
+    jobs = await ingestion.submit_many(request.file_names, force=request.force)
+    if any(job["state"] == REJECTED for job in jobs.values()):
+        response.status_code = 503
+    return jobs
 
+@app.get("/documents/{file_name:path}/status")
+async def document_status(file_name: str) -> dict:
+    """
+    Endpoint to report the ingestion state and progress of a file.
+    """
     try:
-        # Check ExternalSourceHandler
-        source = ExternalSourceHandler()
-        source.search_google("Test query")
-        results["external_source"] = "OK"
+        status = registry.get("ingestion").status(file_name)
     except Exception as e:
-        results["external_source"] = f"Error: {str(e)}"
+        raise HTTPException(status_code=500, detail=str(e))
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Document '{file_name}' has not been submitted for ingestion.")
+    return status
 
+@app.get("/history/{user_id}")
+async def history(
+    user_id: str,
+    storage_type: Literal["mysql", "bigquery", "sqlite"],
+    limit: int = Query(20, ge=1, le=HISTORY_SCHEMA_CONFIG["max_page_size"]),
+    cursor: Optional[str] = None,
+) -> dict:
+    """
+    Endpoint to page through a user's conversation history, newest first.
+    Pass the returned next_cursor to get the following page; it is null on the last page.
+    """
     try:
-        # Check StorageHandler
-        storage = StorageHandler()
-        results["storage"] = "OK"
+        db = registry.get(f"database_{storage_type}")
+        return await db.aget_history_page(user_id, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        results["storage"] = f"Error: {str(e)}"
+        raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/metrics")
+async def metrics() -> Response:
+    """
+    Endpoint exposing Prometheus metrics: request, stage, provider, embedding, FAISS, PDF
+    and database latencies, index size, in-flight requests and cache stats.
+    """
     try:
-        # Check FaissHandler
-        faiss_handler = FaissHandler()
-        faiss_handler.add_documents(["Test document"])
-        faiss_handler.search("Test query")
-        results["faiss"] = "OK"
-    except Exception as e:
-        results["faiss"] = f"Error: {str(e)}"
+        body, content_type = render_metrics()
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return Response(content=body, media_type=content_type)
 
-    return results
+@app.get("/check-handlers")
+async def check_handlers() -> Dict[str, dict]:
+    """
+    Endpoint to report the warm/cold state and init time of all shared handlers,
+    the circuit breaker state of warm model providers and the vector store's chunking.
+    """
+    status = registry.status()
+    for name, handler_status in status.items():
+        if name.startswith("model_") and handler_status["state"] == "warm":
+            handler_status["provider"] = registry.get(name).stats()
+    if status["vector_store"]["state"] == "warm":
+        status["vector_store"]["store"] = registry.get("vector_store").stats()
+    return status
+
+@app.get("/database-pools")
+async def database_pools() -> Dict[str, dict]:
+    """
+    Endpoint to report connection pool and history write-behind metrics of the
+    database handlers that are warm.
+    """
+    status = registry.status()
+    return {
+        name: registry.get(name).pool_metrics()
+        for name in ("database_mysql", "database_bigquery", "database_sqlite")
+        if status[name]["state"] == "warm"
+    }
+
+@app.get("/cache-stats")
+async def cache_stats() -> Dict[str, dict]:
+    """
+    Endpoint to report hit/miss stats of the response, search result, history summary and embedding caches.
+    """
+    status = registry.status()
+    stats = {
+        name: registry.get(name).stats()
+        for name in ("response_cache", "search_cache", "prompt_assembler")
+        if status[name]["state"] == "warm"
+    }
+    # The embedding model only has stats when the embedding cache is enabled
+    if status["embedding_model"]["state"] == "warm" and hasattr(registry.get("embedding_model"), "stats"):
+        stats["embedding_cache"] = registry.get("embedding_model").stats()
+    return stats
 
 if __name__ == "__main__":
     import uvicorn
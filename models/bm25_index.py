@@ -0,0 +1,228 @@
+# models/bm25_index.py
+import math
+import os
+import re
+from array import array
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from config import RETRIEVAL_CONFIG
+
+# Bumped whenever tokenization or the file layout changes, so older files are rebuilt
+BM25_VERSION = 1
+
+# Words, and codes joined by '-', '.', '/' or '_' (e.g. "SKU-4821", "v2.1.0") kept whole as well
+_TERM_PATTERN = re.compile(r"\w+(?:[-./]\w+)*")
+_PART_PATTERN = re.compile(r"[^\W_]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased lexical terms of a text. Compound codes yield the whole code and its parts,
+    so "SKU-4821" matches both "sku-4821" and "4821".
+    """
+    terms = []
+    for match in _TERM_PATTERN.finditer((text or "").lower()):
+        term = match.group()
+        terms.append(term)
+        parts = _PART_PATTERN.findall(term)
+        if len(parts) > 1:
+            terms.extend(parts)
+    return terms
+
+
+class BM25Index:
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        k1: float = RETRIEVAL_CONFIG["bm25_k1"],
+        b: float = RETRIEVAL_CONFIG["bm25_b"],
+    ):
+        """
+        Okapi BM25 inverted index over document chunks, keyed by the chunks' vector ids.
+        Postings are compact typed arrays (int64 ids, uint16 term frequencies) per term, scored
+        with numpy at query time. Removed documents are tombstoned and purged once they make
+        up half the index. The index is persisted as one .npz file in CSR layout.
+        :param path: File the index is loaded from and saved to.
+        :param k1: Term frequency saturation.
+        :param b: Document length normalization.
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.reset()
+        if path and os.path.exists(path):
+            self._load()
+
+    def reset(self) -> None:
+        self._vocabulary: Dict[str, int] = {}
+        self._terms: List[str] = []
+        self._posting_ids: List[array] = []
+        self._posting_tfs: List[array] = []
+        self._doc_lengths = array("I")  # Indexed by document id, 0 for absent documents
+        self._doc_count = 0
+        self._total_length = 0
+        self._removed = 0  # Tombstoned documents still present in the postings
+
+    @property
+    def doc_count(self) -> int:
+        return self._doc_count
+
+    def add(self, doc_ids: Iterable[int], texts: Iterable[str]) -> None:
+        """
+        Index documents. Ids must not be indexed already.
+        """
+        for doc_id, text in zip(doc_ids, texts):
+            frequencies = {}
+            for term in tokenize(text):
+                frequencies[term] = frequencies.get(term, 0) + 1
+            length = max(1, sum(frequencies.values()))
+            if doc_id >= len(self._doc_lengths):
+                self._doc_lengths.extend([0] * (doc_id + 1 - len(self._doc_lengths)))
+            self._doc_lengths[doc_id] = length
+            self._doc_count += 1
+            self._total_length += length
+            for term, frequency in frequencies.items():
+                term_id = self._vocabulary.get(term)
+                if term_id is None:
+                    term_id = self._vocabulary[term] = len(self._terms)
+                    self._terms.append(term)
+                    self._posting_ids.append(array("q"))
+                    self._posting_tfs.append(array("H"))
+                self._posting_ids[term_id].append(doc_id)
+                self._posting_tfs[term_id].append(min(frequency, 65535))
+
+    def remove(self, doc_ids: Iterable[int]) -> None:
+        """
+        Remove documents from the index.
+        """
+        for doc_id in doc_ids:
+            if doc_id < len(self._doc_lengths) and self._doc_lengths[doc_id]:
+                self._total_length -= self._doc_lengths[doc_id]
+                self._doc_lengths[doc_id] = 0
+                self._doc_count -= 1
+                self._removed += 1
+        if self._removed > max(self._doc_count, 1000):
+            self._compact()
+
+    def _compact(self) -> None:
+        lengths = np.frombuffer(self._doc_lengths, dtype=np.uint32)
+        vocabulary, terms, posting_ids, posting_tfs = {}, [], [], []
+        for term, ids, tfs in zip(self._terms, self._posting_ids, self._posting_tfs):
+            ids = np.frombuffer(ids, dtype=np.int64)
+            live = lengths[ids] > 0
+            if not live.any():
+                continue
+            vocabulary[term] = len(terms)
+            terms.append(term)
+            posting_ids.append(array("q", ids[live].tobytes()))
+            posting_tfs.append(array("H", np.frombuffer(tfs, dtype=np.uint16)[live].tobytes()))
+        self._vocabulary, self._terms = vocabulary, terms
+        self._posting_ids, self._posting_tfs = posting_ids, posting_tfs
+        self._removed = 0
+
+    def search(self, query: str, k: int, allowed_ids: Optional[list] = None) -> list:
+        """
+        Rank documents by BM25 score for a query.
+        :param allowed_ids: Optional document ids the search is restricted to.
+        :return: (id, score) pairs of at most k documents with a positive score, best first.
+        """
+        if k <= 0 or not self._doc_count:
+            return []
+        lengths = np.frombuffer(self._doc_lengths, dtype=np.uint32)
+        allowed = None
+        if allowed_ids is not None:
+            allowed = np.zeros(len(lengths), dtype=bool)
+            allowed_ids = np.asarray(allowed_ids, dtype=np.int64)
+            allowed[allowed_ids[allowed_ids < len(lengths)]] = True
+        average_length = self._total_length / self._doc_count
+
+        id_parts, score_parts = [], []
+        for term in set(tokenize(query)):
+            term_id = self._vocabulary.get(term)
+            if term_id is None:
+                continue
+            ids = np.frombuffer(self._posting_ids[term_id], dtype=np.int64)
+            doc_lengths = lengths[ids]
+            live = doc_lengths > 0
+            document_frequency = int(live.sum())
+            if allowed is not None:
+                live &= allowed[ids]
+            if not live.any():
+                continue
+            tfs = np.frombuffer(self._posting_tfs[term_id], dtype=np.uint16)[live].astype(np.float32)
+            idf = math.log(1 + (self._doc_count - document_frequency + 0.5) / (document_frequency + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * doc_lengths[live] / average_length)
+            id_parts.append(ids[live])
+            score_parts.append(idf * tfs * (self.k1 + 1) / (tfs + norm))
+        if not id_parts:
+            return []
+
+        doc_ids, inverse = np.unique(np.concatenate(id_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(doc_ids[i]), float(scores[i])) for i in top if scores[i] > 0]
+
+    def save(self) -> None:
+        """
+        Write the index to path atomically, in CSR layout.
+        """
+        if not self.path:
+            raise ValueError("BM25Index has no path to save to.")
+        offsets = np.zeros(len(self._terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(ids) for ids in self._posting_ids])
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                version=np.array([BM25_VERSION], dtype=np.int64),
+                # Terms never contain whitespace, so newline-joined UTF-8 is a compact encoding
+                terms=np.frombuffer("\n".join(self._terms).encode("utf-8"), dtype=np.uint8),
+                offsets=offsets,
+                posting_ids=np.frombuffer(b"".join(ids.tobytes() for ids in self._posting_ids), dtype=np.int64),
+                posting_tfs=np.frombuffer(b"".join(tfs.tobytes() for tfs in self._posting_tfs), dtype=np.uint16),
+                doc_lengths=np.frombuffer(self._doc_lengths, dtype=np.uint32),
+            )
+        os.replace(tmp_path, self.path)
+
+    def _load(self) -> None:
+        with np.load(self.path) as data:
+            if int(data["version"][0]) != BM25_VERSION:
+                return  # Left empty; the owner rebuilds it
+            terms = data["terms"].tobytes().decode("utf-8")
+            self._terms = terms.split("\n") if terms else []
+            offsets, posting_ids, posting_tfs = data["offsets"], data["posting_ids"], data["posting_tfs"]
+            self._posting_ids = [array("q", posting_ids[start:end].tobytes()) for start, end in zip(offsets, offsets[1:])]
+            self._posting_tfs = [array("H", posting_tfs[start:end].tobytes()) for start, end in zip(offsets, offsets[1:])]
+            self._doc_lengths = array("I", data["doc_lengths"].astype(np.uint32).tobytes())
+        self._vocabulary = {term: term_id for term_id, term in enumerate(self._terms)}
+        lengths = np.frombuffer(self._doc_lengths, dtype=np.uint32)
+        self._doc_count = int((lengths > 0).sum())
+        self._total_length = int(lengths.sum())
+        # Postings of documents removed before saving are still present until compaction
+        self._removed = 0
+        if self._doc_count and len(posting_ids) and not (lengths[posting_ids] > 0).all():
+            self._compact()
+
+    def document_ids(self) -> set:
+        """
+        Ids of the indexed documents.
+        """
+        return set(np.flatnonzero(np.frombuffer(self._doc_lengths, dtype=np.uint32)).tolist())
+
+
+def reciprocal_rank_fusion(rankings: List[list], k: int = RETRIEVAL_CONFIG["rrf_k"]) -> list:
+    """
+    Fuse ranked lists of (id, score) pairs by reciprocal rank: each list contributes
+    1 / (k + rank) for every id it contains. Raw scores are ignored, so lists with
+    incomparable scales (cosine similarity, BM25) can be combined.
+    :return: (id, fused score) pairs, best first.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, (doc_id, _) in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
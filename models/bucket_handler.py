@@ -0,0 +1,76 @@
+# models/bucket_handler.py
+import os
+from typing import NamedTuple, Optional
+from google.cloud import storage
+
+
+class BlobInfo(NamedTuple):
+    """
+    Version information for an object in a bucket.
+    """
+    name: str
+    generation: str  # Changes whenever the object content is replaced
+    md5: Optional[str] = None
+
+
+class GCSBucket:
+    def __init__(self, client: storage.Client, bucket_name: str):
+        """
+        Read-only view of a Google Cloud Storage bucket.
+        :param client: Shared GCS client.
+        :param bucket_name: Name of the bucket.
+        """
+        self.client = client
+        self.bucket_name = bucket_name
+        self.bucket = client.bucket(bucket_name)
+
+    def get_blob_info(self, name: str) -> BlobInfo:
+        """
+        Fetch the generation and md5 of an object without downloading it.
+        """
+        blob = self.bucket.get_blob(name)
+        if blob is None:
+            raise FileNotFoundError(f"GCS object '{name}' not found in bucket '{self.bucket_name}'.")
+        return BlobInfo(name=name, generation=str(blob.generation), md5=blob.md5_hash)
+
+    def download_bytes(self, name: str, generation: Optional[str] = None) -> bytes:
+        """
+        Download an object. If a generation is given, only that generation is returned.
+        """
+        blob = self.bucket.blob(name)
+        if generation is not None:
+            return blob.download_as_bytes(if_generation_match=int(generation))
+        return blob.download_as_bytes()
+
+
+class LocalBucket:
+    def __init__(self, root_dir: str):
+        """
+        Local directory standing in for a GCS bucket, for development and tests.
+        The file modification time and size are used as the object generation.
+        :param root_dir: Directory holding the objects.
+        """
+        self.root_dir = root_dir
+
+    def _path(self, name: str) -> str:
+        path = os.path.abspath(os.path.join(self.root_dir, name))
+        if not path.startswith(os.path.abspath(self.root_dir) + os.sep):
+            raise ValueError(f"Invalid object name: {name}")
+        return path
+
+    def get_blob_info(self, name: str) -> BlobInfo:
+        """
+        Return the generation of a local file from a stat, without reading it.
+        """
+        path = self._path(name)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Object '{name}' not found in '{self.root_dir}'.")
+        stat = os.stat(path)
+        return BlobInfo(name=name, generation=f"{stat.st_mtime_ns}-{stat.st_size}")
+
+    def download_bytes(self, name: str, generation: Optional[str] = None) -> bytes:
+        """
+        Read a local file.
+        """
+        with open(self._path(name), "rb") as f:
+            return f.read()
@@ -1,135 +1,408 @@
-import mysql.connector
+import asyncio
+import base64
+import json
+import sqlite3
+import uuid
+from typing import Optional
 from google.cloud import bigquery
-from config import DATABASE_CONFIG
+from config import DATABASE_CONFIG, HISTORY_SCHEMA_CONFIG, HISTORY_WRITER_CONFIG
+from models.mysql_pool import MySQLPool
+from models.schema_migrations import SchemaMigrator
+from models.history_writer import HistoryWriteBuffer
+from models.history_cache import build_history_cache
+from models.metrics import DB_SECONDS, timer
 import datetime
 
+HISTORY_COLUMNS = ("query", "response", "timestamp")
+
+
+def _encode_cursor(row: dict) -> str:
+    # Opaque to clients: the (timestamp, id) of the last row of a page
+    payload = json.dumps([str(row["timestamp"]), row.get("id")])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def _as_local_datetime(value) -> datetime.datetime:
+    # History timestamps are naive local time (MySQL, SQLite, buffered rows), UTC-aware (BigQuery)
+    # or their string form once cached
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        datetime.datetime.fromisoformat(timestamp)
+    except Exception:
+        raise ValueError("Invalid history cursor.")
+    return timestamp, row_id
+
 
 class DatabaseHandler:
-    def __init__(self, db_type: str):
+    def __init__(
+        self,
+        db_type: str,
+        bigquery_client: bigquery.Client = None,
+        mysql_pool: MySQLPool = None,
+        write_behind: bool = HISTORY_WRITER_CONFIG["enabled"],
+        history_cache=None,
+        auto_migrate: Optional[bool] = None,
+        window_days: float = HISTORY_SCHEMA_CONFIG["window_days"],
+    ):
         """
         Initialize the database handler based on the database type.
-        Supported types: 'mysql', 'bigquery'.
+        Supported types: 'mysql', 'bigquery', 'sqlite' (local stand-in for development and tests).
+        :param bigquery_client: Optional shared BigQuery client, reused across calls.
+        :param mysql_pool: Optional shared MySQL connection pool.
+        :param write_behind: Buffer history inserts and write them in background batches.
+        :param history_cache: Optional history cache. Defaults to the backend set by HISTORY_CACHE_BACKEND.
+        :param auto_migrate: Apply pending schema migrations on startup. Defaults to True for SQLite
+            and to HISTORY_AUTO_MIGRATE for the other databases.
+        :param window_days: Only turns this recent are read. 0 reads the whole history.
         """
         self.db_type = db_type
         self.config = DATABASE_CONFIG.get(db_type)
         if not self.config:
             raise ValueError(f"Database type '{db_type}' is not supported or misconfigured.")
 
+        self.bigquery_client = bigquery_client
+        if self.db_type == "bigquery" and self.bigquery_client is None:
+            self.bigquery_client = bigquery.Client.from_service_account_json(self.config["credentials_path"])
+
+        self.mysql_pool = mysql_pool
+        if self.db_type == "mysql" and self.mysql_pool is None:
+            self.mysql_pool = MySQLPool(
+                self.config,
+                pool_size=self.config["pool_size"],
+                acquire_timeout=self.config["pool_acquire_timeout"],
+                health_check_interval=self.config["pool_health_check_interval"],
+            )
+
+        self.window_days = window_days
+        if auto_migrate is None:
+            auto_migrate = self.db_type == "sqlite" or HISTORY_SCHEMA_CONFIG["auto_migrate"]
+        if auto_migrate:
+            self.migrate()
+
+        self.history_writer = None
+        if write_behind:
+            self.history_writer = HistoryWriteBuffer(
+                self._insert_rows,
+                max_batch_size=HISTORY_WRITER_CONFIG["max_batch_size"],
+                flush_interval=HISTORY_WRITER_CONFIG["flush_interval"],
+                max_buffer_size=HISTORY_WRITER_CONFIG["max_buffer_size"],
+                max_retries=HISTORY_WRITER_CONFIG["max_retries"],
+                retry_backoff=HISTORY_WRITER_CONFIG["retry_backoff"],
+            )
+
+        # Read-through/write-through cache of recent history per user
+        self.history_cache = history_cache if history_cache is not None else build_history_cache(f"history:{db_type}")
+
     def get_history(self, user_id: str, limit: int = 20) -> list:
         """
         Retrieve conversation history for a user from the database.
         If the user does not exist, they will be implicitly added when inserting history.
+        Served from the history cache when possible, without touching the database.
+        Rows still waiting in the write-behind buffer are included.
+        """
+        if self.history_cache is None:
+            return self._load_history(user_id, limit)
+        cached = self.history_cache.get(user_id, limit)
+        if cached is not None:
+            # Cached turns are kept regardless of age; drop those the database read would not return
+            return self._within_window(cached)
+        version = self.history_cache.version(user_id)
+        history = self._load_history(user_id, limit)
+        self.history_cache.fill(user_id, history, complete=len(history) < limit, version=version)
+        return history
+
+    def _load_history(self, user_id: str, limit: int) -> list:
+        """
+        Load history from the database and the write-behind buffer.
+        The database is read first and the rows still buffered are added afterwards. If a batch
+        was written while the query ran, its rows may or may not be in the result, so the
+        query is repeated with flushes paused; otherwise each row is counted exactly once.
+        """
+        writer = self.history_writer
+        if writer is None:
+            return self._history_rows(user_id, limit)
+        sequence = writer.flush_sequence()
+        history = self._history_rows(user_id, limit)
+        after, in_flight, pending = writer.pending_snapshot(user_id)
+        if after != sequence or in_flight:
+            with writer.paused():
+                history = self._history_rows(user_id, limit)
+                pending = writer.pending_rows(user_id)
+        pending = [
+            {"query": row["query"], "response": row["response"], "timestamp": row["timestamp"]}
+            for row in reversed(pending)
+        ]
+        return (pending + history)[:limit]
+
+    def _history_rows(self, user_id: str, limit: int) -> list:
+        return [{column: row[column] for column in HISTORY_COLUMNS} for row in self._get_history(user_id, limit)]
+
+    def get_history_page(self, user_id: str, limit: int = 20, cursor: Optional[str] = None) -> dict:
+        """
+        Read one page of a user's history from the database, newest first.
+        Pages are keyset-paginated: each one continues after the (timestamp, id) of the previous
+        page's last row, so a deep page costs the same index range scan as the first. Rows still
+        in the write-behind buffer appear once they are written.
+        :param cursor: next_cursor of the previous page, or None for the first page.
+        :return: {"history": rows, "next_cursor": cursor of the next page, None after the last page}
         """
-        return self._get_history(user_id, limit)
+        before = _decode_cursor(cursor) if cursor else None
+        rows = self._get_history(user_id, limit, before)
+        return {
+            "history": [{column: row[column] for column in HISTORY_COLUMNS} for row in rows],
+            "next_cursor": _encode_cursor(rows[-1]) if rows and len(rows) == limit else None,
+        }
+
+    async def aget_history_page(self, user_id: str, limit: int = 20, cursor: Optional[str] = None) -> dict:
+        """
+        Async version of get_history_page.
+        """
+        return await asyncio.to_thread(self.get_history_page, user_id, limit, cursor)
+
+    def migrate(self, dry_run: bool = False) -> list:
+        """
+        Apply the pending schema migrations of the history table (see models/schema_migrations.py).
+        :param dry_run: Only report what would be applied.
+        :return: The migrations applied (or pending, for a dry run).
+        """
+        return SchemaMigrator(self).migrate(dry_run=dry_run)
 
     def insert_history(self, user_id: str, query: str, response: str) -> None:
         """
         Insert a new conversation entry into the database.
         If the user does not exist, they will be implicitly added.
+        With write-behind enabled the entry is buffered and this returns immediately.
         """
-        self._insert_history(user_id, query, response)
+        row = {
+            "user_id": user_id,
+            "query": query,
+            "response": response,
+            "timestamp": datetime.datetime.now(),
+        }
+        if self.history_writer is not None:
+            self.history_writer.enqueue(row)
+        else:
+            self._insert_rows([row])
+        if self.history_cache is not None:
+            self.history_cache.append(user_id, {"query": query, "response": response, "timestamp": row["timestamp"]})
 
-    def _get_history(self, user_id: str, limit: int) -> list:
+    async def aget_history(self, user_id: str, limit: int = 20) -> list:
         """
-        Retrieve conversation history for a user from the database.
+        Async version of get_history. The blocking driver call runs in a worker thread
+        so a slow round-trip does not stall the event loop.
         """
-        if self.db_type == "mysql":
-            return self._get_history_mysql(user_id, limit)
-        elif self.db_type == "bigquery":
-            return self._get_history_bigquery(user_id, limit)
+        return await asyncio.to_thread(self.get_history, user_id, limit)
+
+    async def ainsert_history(self, user_id: str, query: str, response: str) -> None:
+        """
+        Async version of insert_history.
+        """
+        if self.history_writer is not None:
+            # Enqueueing does not block, so skip the thread hop
+            self.insert_history(user_id, query, response)
         else:
-            raise ValueError(f"Unsupported database type: {self.db_type}")
+            await asyncio.to_thread(self.insert_history, user_id, query, response)
 
-    def _insert_history(self, user_id: str, query: str, response: str) -> None:
+    def flush_history(self) -> None:
         """
-        Insert a new conversation entry into the database.
+        Write every buffered history row now.
+        """
+        if self.history_writer is not None:
+            self.history_writer.flush()
+
+    def health_check(self) -> bool:
+        """
+        Check that the database is reachable.
         """
         if self.db_type == "mysql":
-            self._insert_history_mysql(user_id, query, response)
-        elif self.db_type == "bigquery":
-            self._insert_history_bigquery(user_id, query, response)
-        else:
-            raise ValueError(f"Unsupported database type: {self.db_type}")
+            return self.mysql_pool.health_check()
+        if self.db_type == "sqlite":
+            connection = self._connect_sqlite()
+            connection.execute("SELECT 1")
+            connection.close()
+            return True
+        list(self.bigquery_client.query("SELECT 1").result())
+        return True
 
-    def _get_history_mysql(self, user_id: str, limit: int) -> list:
+    def pool_metrics(self) -> dict:
+        """
+        Return connection pool metrics (MySQL only), write-behind buffer and history cache stats.
+        """
+        metrics = {}
+        if self.db_type == "mysql":
+            metrics = self.mysql_pool.metrics()
+        if self.history_writer is not None:
+            metrics["history_writer"] = self.history_writer.stats()
+        if self.history_cache is not None:
+            metrics["history_cache"] = self.history_cache.stats()
+        return metrics
+
+    def close(self) -> None:
+        """
+        Drain the write-behind buffer, then close pooled MySQL connections.
+        Shared BigQuery clients are closed by their owner.
+        """
+        if self.history_writer is not None:
+            self.history_writer.close()
+        if self.mysql_pool is not None:
+            self.mysql_pool.close()
+
+    def _get_history(self, user_id: str, limit: int, before: Optional[tuple] = None) -> list:
+        """
+        Retrieve conversation history for a user from the database.
+        :param before: Optional (timestamp, id) keyset position; only older rows are returned.
+        :return: Rows with their id, newest first.
+        """
+        with timer(DB_SECONDS, db_type=self.db_type, operation="get_history"):
+            if self.db_type == "mysql":
+                return self._get_history_mysql(user_id, limit, before)
+            elif self.db_type == "bigquery":
+                return self._get_history_bigquery(user_id, limit, before)
+            elif self.db_type == "sqlite":
+                return self._get_history_sqlite(user_id, limit, before)
+            else:
+                raise ValueError(f"Unsupported database type: {self.db_type}")
+
+    def _window_start(self) -> Optional[datetime.datetime]:
+        if self.window_days <= 0:
+            return None
+        return datetime.datetime.now() - datetime.timedelta(days=self.window_days)
+
+    def _within_window(self, rows: list) -> list:
+        since = self._window_start()
+        if since is None:
+            return rows
+        return [row for row in rows if _as_local_datetime(row["timestamp"]) >= since]
+
+    def _history_conditions(self, before: Optional[tuple], placeholder: str) -> tuple:
+        """
+        Time-window and keyset conditions of a MySQL or SQLite history read. Both are ranges on
+        the (user_id, timestamp) index, which also carries the row id.
+        :return: (SQL fragment, parameters)
+        """
+        conditions = ""
+        params = []
+        since = self._window_start()
+        if since is not None:
+            conditions += f" AND timestamp >= {placeholder}"
+            params.append(since.strftime("%Y-%m-%d %H:%M:%S.%f"))
+        if before is not None:
+            conditions += f" AND (timestamp < {placeholder} OR (timestamp = {placeholder} AND id < {placeholder}))"
+            params.extend([before[0], before[0], before[1]])
+        return conditions, params
+
+    def _insert_rows(self, rows: list) -> None:
+        """
+        Insert a batch of conversation entries into the database in one round-trip.
+        """
+        with timer(DB_SECONDS, db_type=self.db_type, operation="insert_rows"):
+            if self.db_type == "mysql":
+                self._insert_rows_mysql(rows)
+            elif self.db_type == "bigquery":
+                self._insert_rows_bigquery(rows)
+            elif self.db_type == "sqlite":
+                self._insert_rows_sqlite(rows)
+            else:
+                raise ValueError(f"Unsupported database type: {self.db_type}")
+
+    def _get_history_mysql(self, user_id: str, limit: int, before: Optional[tuple] = None) -> list:
         """
         Retrieve conversation history from MySQL.
         """
         try:
-            connection = mysql.connector.connect(
-                host=self.config["host"],
-                user=self.config["user"],
-                password=self.config["password"],
-                database=self.config["database"]
-            )
-            cursor = connection.cursor(dictionary=True)
+            conditions, params = self._history_conditions(before, "%s")
+            with self.mysql_pool.connection() as connection:
+                cursor = connection.cursor(dictionary=True)
 
-            # Query to fetch history
-            query = """
-                SELECT query, response, timestamp
-                FROM conversation_history
-                WHERE user_id = %s
-                ORDER BY timestamp DESC
-                LIMIT %s
-            """
-            cursor.execute(query, (user_id, limit))
-            history = cursor.fetchall()
-
-            # Close connection
-            cursor.close()
-            connection.close()
+                # Query to fetch history: a backward range scan of idx_history_user_timestamp
+                query = f"""
+                    SELECT id, query, response, timestamp
+                    FROM conversation_history
+                    WHERE user_id = %s{conditions}
+                    ORDER BY timestamp DESC, id DESC
+                    LIMIT %s
+                """
+                cursor.execute(query, (user_id, *params, limit))
+                history = cursor.fetchall()
+                cursor.close()
 
             return history
         except Exception as e:
             raise Exception(f"MySQL Error: {str(e)}")
 
-    def _insert_history_mysql(self, user_id: str, query: str, response: str) -> None:
+    def _insert_rows_mysql(self, rows: list) -> None:
         """
-        Insert a new conversation entry into MySQL.
+        Insert conversation entries into MySQL with a single multi-row statement.
         """
         try:
-            connection = mysql.connector.connect(
-                host=self.config["host"],
-                user=self.config["user"],
-                password=self.config["password"],
-                database=self.config["database"]
-            )
-            cursor = connection.cursor()
-
-            # Query to insert history
-            insert_query = """
-                INSERT INTO conversation_history (user_id, query, response, timestamp)
-                VALUES (%s, %s, %s, %s)
-            """
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            cursor.execute(insert_query, (user_id, query, response, timestamp))
-            connection.commit()
-
-            # Close connection
-            cursor.close()
-            connection.close()
+            with self.mysql_pool.connection() as connection:
+                cursor = connection.cursor()
+
+                # Query to insert history
+                insert_query = """
+                    INSERT INTO conversation_history (user_id, query, response, timestamp)
+                    VALUES (%s, %s, %s, %s)
+                """
+                cursor.executemany(insert_query, [
+                    (row["user_id"], row["query"], row["response"], row["timestamp"].strftime("%Y-%m-%d %H:%M:%S"))
+                    for row in rows
+                ])
+                connection.commit()
+                cursor.close()
         except Exception as e:
             raise Exception(f"MySQL Insert Error: {str(e)}")
 
-    def _get_history_bigquery(self, user_id: str, limit: int) -> list:
+    def _history_query_bigquery(self, user_id: str, limit: int, before: Optional[tuple] = None) -> tuple:
+        """
+        Build the BigQuery history read. The time window prunes partitions and the user_id
+        filter prunes clustered blocks, so only the user's recent data is scanned and billed.
+        Rows are ordered by (timestamp, id). Streamed rows get a random id on insert and schema
+        migration 2 backfills rows written without one. Until it has run, such rows are keyed by
+        a fingerprint of their content, which identical rows share.
+        :return: (query, query parameters)
+        """
+        sort_id = "COALESCE(id, FARM_FINGERPRINT(CONCAT(query, '\\x1f', response)))"
+        conditions = ""
+        query_params = [
+            bigquery.ScalarQueryParameter("user_id", "STRING", user_id),
+            bigquery.ScalarQueryParameter("limit", "INT64", limit),
+        ]
+        since = self._window_start()
+        if since is not None:
+            conditions += " AND timestamp >= @since"
+            query_params.append(bigquery.ScalarQueryParameter("since", "TIMESTAMP", since.astimezone(datetime.timezone.utc)))
+        if before is not None:
+            conditions += f" AND (timestamp < @before OR (timestamp = @before AND {sort_id} < @before_id))"
+            query_params.extend([
+                bigquery.ScalarQueryParameter("before", "TIMESTAMP", datetime.datetime.fromisoformat(before[0])),
+                bigquery.ScalarQueryParameter("before_id", "INT64", before[1]),
+            ])
+        query = f"""
+            SELECT {sort_id} AS id, query, response, timestamp
+            FROM `{self.config["project_id"]}.{self.config["dataset_id"]}.conversation_history`
+            WHERE user_id = @user_id{conditions}
+            ORDER BY timestamp DESC, id DESC
+            LIMIT @limit
+        """
+        return query, query_params
+
+    def _get_history_bigquery(self, user_id: str, limit: int, before: Optional[tuple] = None) -> list:
         """
         Retrieve conversation history from BigQuery.
         """
         try:
-            client = bigquery.Client.from_service_account_json(self.config["credentials_path"])
+            client = self.bigquery_client
 
             # Query to fetch history
-            query = f"""
-                SELECT query, response, timestamp
-                FROM `{self.config["project_id"]}.{self.config["dataset_id"]}.conversation_history`
-                WHERE user_id = @user_id
-                ORDER BY timestamp DESC
-                LIMIT @limit
-            """
-            query_params = [
-                bigquery.ScalarQueryParameter("user_id", "STRING", user_id),
-                bigquery.ScalarQueryParameter("limit", "INT64", limit),
-            ]
+            query, query_params = self._history_query_bigquery(user_id, limit, before)
             job_config = bigquery.QueryJobConfig(query_parameters=query_params)
             query_job = client.query(query, job_config=job_config)
             history = [dict(row) for row in query_job]
@@ -138,27 +411,81 @@ class DatabaseHandler:
         except Exception as e:
             raise Exception(f"BigQuery Error: {str(e)}")
 
-    def _insert_history_bigquery(self, user_id: str, query: str, response: str) -> None:
+    def _insert_rows_bigquery(self, rows: list) -> None:
         """
-        Insert a new conversation entry into BigQuery.
+        Insert conversation entries into BigQuery with a single streaming insert.
         """
         try:
-            client = bigquery.Client.from_service_account_json(self.config["credentials_path"])
+            client = self.bigquery_client
 
             # Define the table reference
             table_ref = f"{self.config['project_id']}.{self.config['dataset_id']}.conversation_history"
 
-            # Prepare the row to insert
-            row = {
-                "user_id": user_id,
-                "query": query,
-                "response": response,
-                "timestamp": datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
-            }
+            # Prepare the rows to insert
+            json_rows = [
+                {
+                    # BigQuery has no auto-increment; a random positive INT64 breaks timestamp ties when paging
+                    "id": uuid.uuid4().int >> 65,
+                    "user_id": row["user_id"],
+                    "query": row["query"],
+                    "response": row["response"],
+                    "timestamp": row["timestamp"].astimezone(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f"),
+                }
+                for row in rows
+            ]
 
-            # Insert the row
-            errors = client.insert_rows_json(table_ref, [row])
+            # Insert the rows
+            errors = client.insert_rows_json(table_ref, json_rows)
             if errors:
                 raise Exception(f"BigQuery Insert Errors: {errors}")
         except Exception as e:
-            raise Exception(f"BigQuery Insert Error: {str(e)}")
\ No newline at end of file
+            raise Exception(f"BigQuery Insert Error: {str(e)}")
+
+    def _connect_sqlite(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.config["path"], timeout=30)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def _get_history_sqlite(self, user_id: str, limit: int, before: Optional[tuple] = None) -> list:
+        """
+        Retrieve conversation history from SQLite.
+        """
+        try:
+            conditions, params = self._history_conditions(before, "?")
+            connection = self._connect_sqlite()
+            try:
+                cursor = connection.execute(
+                    f"""
+                    SELECT id, query, response, timestamp
+                    FROM conversation_history
+                    WHERE user_id = ?{conditions}
+                    ORDER BY timestamp DESC, id DESC
+                    LIMIT ?
+                    """,
+                    (user_id, *params, limit),
+                )
+                return [dict(row) for row in cursor.fetchall()]
+            finally:
+                connection.close()
+        except Exception as e:
+            raise Exception(f"SQLite Error: {str(e)}")
+
+    def _insert_rows_sqlite(self, rows: list) -> None:
+        """
+        Insert conversation entries into SQLite in one transaction.
+        """
+        try:
+            connection = self._connect_sqlite()
+            try:
+                with connection:
+                    connection.executemany(
+                        "INSERT INTO conversation_history (user_id, query, response, timestamp) VALUES (?, ?, ?, ?)",
+                        [
+                            (row["user_id"], row["query"], row["response"], row["timestamp"].strftime("%Y-%m-%d %H:%M:%S.%f"))
+                            for row in rows
+                        ],
+                    )
+            finally:
+                connection.close()
+        except Exception as e:
+            raise Exception(f"SQLite Insert Error: {str(e)}")
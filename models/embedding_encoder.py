@@ -0,0 +1,239 @@
+# models/embedding_encoder.py
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import numpy as np
+from sentence_transformers import SentenceTransformer
+from config import EMBEDDING_CONFIG
+
+
+def text_key(text: str) -> bytes:
+    """
+    Content hash an embedding is cached under.
+    """
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def load_sentence_transformer(
+    model_name: str = EMBEDDING_CONFIG["model_name"],
+    backend: str = EMBEDDING_CONFIG["backend"],
+    onnx_file: str = EMBEDDING_CONFIG["onnx_file"],
+    threads: int = EMBEDDING_CONFIG["threads"],
+) -> SentenceTransformer:
+    """
+    Load the sentence transformer on the selected CPU backend.
+    :param backend: 'torch', or 'onnx' to run an ONNX export (e.g. the int8-quantized
+        MiniLM shipped in the model repository) through ONNX Runtime.
+    :param onnx_file: ONNX file inside the model repository, used by the 'onnx' backend.
+    :param threads: CPU threads used by the encoder, 0 keeps the library default.
+    """
+    if backend == "torch":
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        return SentenceTransformer(model_name)
+    if backend == "onnx":
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError("The 'optimum[onnxruntime]' package is required for the ONNX embedding backend.")
+        session_options = onnxruntime.SessionOptions()
+        if threads:
+            session_options.intra_op_num_threads = threads
+        return SentenceTransformer(
+            model_name,
+            backend="onnx",
+            model_kwargs={"file_name": onnx_file, "provider": "CPUExecutionProvider", "session_options": session_options},
+        )
+    raise ValueError(f"Embedding backend '{backend}' is not supported.")
+
+
+class SQLiteEmbeddingStore:
+    def __init__(self, path: str, namespace: str):
+        """
+        On-disk float16 embedding store shared across restarts.
+        :param path: SQLite database file.
+        :param namespace: Model and backend the vectors were computed with.
+        """
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                namespace TEXT NOT NULL,
+                text_key BLOB NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (namespace, text_key)
+            ) WITHOUT ROWID
+            """
+        )
+        self._connection.commit()
+
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        found = {}
+        with self._lock:
+            # Stay below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._connection.execute(
+                    f"SELECT text_key, vector FROM embeddings WHERE namespace = ? "
+                    f"AND text_key IN ({', '.join('?' * len(chunk))})",
+                    [self.namespace, *chunk],
+                ).fetchall()
+                for key, vector in rows:
+                    found[bytes(key)] = np.frombuffer(vector, dtype="float16")
+        return found
+
+    def put_many(self, items: Dict[bytes, np.ndarray]) -> None:
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (namespace, text_key, vector) VALUES (?, ?, ?)",
+                [(self.namespace, key, vector.tobytes()) for key, vector in items.items()],
+            )
+            self._connection.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class CachedEncoder:
+    def __init__(
+        self,
+        model: SentenceTransformer,
+        batch_size: int = EMBEDDING_CONFIG["batch_size"],
+        max_entries: int = EMBEDDING_CONFIG["cache_max_entries"],
+        store: Optional[SQLiteEmbeddingStore] = None,
+    ):
+        """
+        Sentence transformer wrapper that reuses embeddings of text it has already seen.
+        Embeddings are keyed on a hash of the text and kept as float16 in an in-memory LRU,
+        backed by an optional on-disk store. Only texts missing from both are encoded, in
+        batches of `batch_size`. Accepts the same encode() calls as SentenceTransformer.
+        :param model: Sentence transformer doing the encoding.
+        :param batch_size: Texts per forward pass when the caller does not pass one.
+        :param max_entries: Embeddings kept in memory before the least recently used one is evicted.
+        :param store: Optional SQLiteEmbeddingStore consulted on memory misses.
+        """
+        self.model = model
+        self.batch_size = batch_size
+        self.max_entries = max_entries
+        self.store = store
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "encoded": 0, "evictions": 0}
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    @property
+    def tokenizer(self):
+        """
+        The wrapped model's tokenizer, used to count chunk tokens the way the model does.
+        """
+        return getattr(self.model, "tokenizer", None)
+
+    @property
+    def max_seq_length(self) -> Optional[int]:
+        """
+        The wrapped model's maximum sequence length, past which its input is truncated.
+        """
+        return getattr(self.model, "max_seq_length", None)
+
+    def encode(self, sentences, batch_size: int = None, normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        """
+        Embed texts, serving repeated texts from the cache.
+        :return: float32 array with one row per text (a single row for a single string).
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        keys = [text_key(text) for text in texts]
+
+        vectors = {}
+        with self._lock:
+            for key in keys:
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    vectors[key] = vector
+            self._stats["hits"] += sum(1 for key in keys if key in vectors)
+
+        # Each missing text is looked up on disk and encoded at most once per call
+        missing = {key: text for key, text in zip(keys, texts) if key not in vectors}
+        if missing and self.store is not None:
+            found = self.store.get_many(list(missing))
+            vectors.update(found)
+            for key in found:
+                del missing[key]
+            with self._lock:
+                self._stats["disk_hits"] += sum(1 for key in keys if key in found)
+                self._remember(found)
+        if missing:
+            encoded = self.model.encode(
+                list(missing.values()),
+                batch_size=batch_size or self.batch_size,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+                **kwargs,
+            )
+            new_vectors = {key: np.asarray(vector, dtype="float16") for key, vector in zip(missing, encoded)}
+            vectors.update(new_vectors)
+            if self.store is not None:
+                self.store.put_many(new_vectors)
+            with self._lock:
+                self._stats["misses"] += sum(1 for key in keys if key in new_vectors)
+                self._stats["encoded"] += len(new_vectors)
+                self._remember(new_vectors)
+
+        # Every result goes through float16, so cached and fresh embeddings are identical
+        result = np.stack([vectors[key] for key in keys]).astype("float32")
+        if normalize_embeddings:
+            norms = np.linalg.norm(result, axis=1, keepdims=True)
+            result = result / np.where(norms == 0, 1, norms)
+        return result[0] if single else result
+
+    def _remember(self, vectors: Dict[bytes, np.ndarray]) -> None:
+        for key, vector in vectors.items():
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def stats(self) -> dict:
+        """
+        Return hit/miss counters, the hit ratio and the number of cached embeddings.
+        """
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries))
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_ratio"] = (stats["hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def close(self) -> None:
+        """
+        Close the on-disk store.
+        """
+        if self.store is not None:
+            self.store.close()
+
+
+def build_embedding_model():
+    """
+    Build the shared embedding model: the sentence transformer on the configured backend,
+    behind the embedding cache unless EMBEDDING_CACHE_ENABLED is false.
+    """
+    model = load_sentence_transformer()
+    if not EMBEDDING_CONFIG["cache_enabled"]:
+        return model
+    store = None
+    if EMBEDDING_CONFIG["cache_path"]:
+        namespace = f"{EMBEDDING_CONFIG['model_name']}:{EMBEDDING_CONFIG['backend']}"
+        if EMBEDDING_CONFIG["backend"] == "onnx":
+            namespace += f":{EMBEDDING_CONFIG['onnx_file']}"
+        store = SQLiteEmbeddingStore(EMBEDDING_CONFIG["cache_path"], namespace)
+    return CachedEncoder(model, store=store)
@@ -1,61 +1,271 @@
 # models/external_source_handler.py
+import asyncio
 import requests
+from requests.adapters import HTTPAdapter
 from google.cloud import storage
-from config import GOOGLE_SEARCH_CONFIG, GCS_CONFIG
+from config import GOOGLE_SEARCH_CONFIG, GCS_CONFIG, VECTOR_STORE_CONFIG, RETRIEVAL_CONFIG, INGESTION_CONFIG
 import PyPDF2
 from io import BytesIO
-from models.faiss_handler import FaissHandler
+from models.bucket_handler import GCSBucket, LocalBucket
+from models.vector_store import DocumentVectorStore
+from models.pdf_pipeline import PdfPipeline
+from models.ingestion_service import FAILED, INDEXED
+from models.search_cache import SearchResultCache
+from models.metrics import EXTERNAL_CALL_SECONDS, timer
+from models.text_chunker import select_chunks
+
+class IndexingIncomplete(Exception):
+    def __init__(self, result, files: dict):
+        """
+        Raised by a search when some of its files are not indexed at their current generation.
+        The query can still be answered from `result`, but not cached.
+        :param result: What the search returned for the files that are indexed.
+        :param files: Job state of each file that is not indexed, e.g. 'queued', 'rejected' or 'failed'.
+        """
+        super().__init__(f"Ingestion Error: not indexed yet: {', '.join(sorted(files))}")
+        self.result = result
+        self.files = files
+        # Failed or missing files will not show up by retrying; queued or rejected ones will
+        self.status = "error" if FAILED in files.values() else "pending"
 
 class ExternalSourceHandler:
-    def __init__(self):
+    def __init__(
+        self,
+        bucket=None,
+        vector_store: DocumentVectorStore = None,
+        pdf_pipeline: PdfPipeline = None,
+        search_cache: SearchResultCache = None,
+        ingestion=None,
+    ):
+        """
+        Initialize the external source handler.
+        :param bucket: Optional GCSBucket or LocalBucket documents are read from.
+        :param vector_store: Optional shared persistent document vector store.
+        :param pdf_pipeline: Optional shared concurrent PDF fetch/extraction pipeline.
+        :param search_cache: Optional shared cache of search results. Without it every search calls the API.
+        :param ingestion: Optional IngestionService. With it (and INGESTION_QUERY_INDEXING=background) the
+            async query paths only search the prebuilt index and queue stale files for ingestion.
+        """
         # Google Search API Configuration
         self.google_api_key = GOOGLE_SEARCH_CONFIG['api_key']
         self.google_cse_id = GOOGLE_SEARCH_CONFIG['cse_id']
+        self.search_cache = search_cache
+        self.ingestion = ingestion
+
+        # Pooled session so searches reuse kept-alive connections
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=GOOGLE_SEARCH_CONFIG['pool_size'])
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # Google Cloud Storage Configuration (or a local directory standing in for it)
+        if bucket is None:
+            if GCS_CONFIG['backend'] == "local":
+                bucket = LocalBucket(GCS_CONFIG['local_path'])
+            else:
+                client = storage.Client.from_service_account_json(GCS_CONFIG['credentials_path'])
+                bucket = GCSBucket(client, GCS_CONFIG['bucket_name'])
+        self.bucket = bucket
 
-        # Google Cloud Storage Configuration
-        self.gcs_client = storage.Client.from_service_account_json(GCS_CONFIG['credentials_path'])
-        self.bucket_name = GCS_CONFIG['bucket_name']
+        # Persistent document index
+        self.vector_store = vector_store or DocumentVectorStore(VECTOR_STORE_CONFIG['path'])
 
-        # FAISS Handler
-        self.faiss_handler = FaissHandler()
+        # Concurrent fetch and extraction used by the async methods
+        self.pdf_pipeline = pdf_pipeline or PdfPipeline(self.bucket)
 
     def search_google(self, query: str) -> str:
         """
         Search Google using the Custom Search JSON API and return a summary of the results.
+        Results are served from the search cache when one is configured.
+        """
+        if self.search_cache is not None:
+            return self.search_cache.get_or_fetch(query, self._fetch_google_results)
+        return self._fetch_google_results(query)
+
+    def _fetch_google_results(self, query: str) -> str:
+        with timer(EXTERNAL_CALL_SECONDS, service="google_search"):
+            try:
+                response = self.session.get(
+                    GOOGLE_SEARCH_CONFIG['endpoint'],
+                    params={"q": query, "key": self.google_api_key, "cx": self.google_cse_id},
+                    timeout=GOOGLE_SEARCH_CONFIG['timeout'],
+                )
+            except requests.RequestException as e:
+                # Connection errors quote the request URL, which carries the API key
+                raise Exception(f"Google Search API Error: {self._redact(str(e))}")
+            if response.status_code == 200:
+                results = response.json()
+                summary = "Google Search Results:\n"
+                for item in results.get("items", []):
+                    summary += f"- {item['title']}: {item['snippet']}\n"
+                return summary
+            else:
+                raise Exception(f"Google Search API Error: {response.status_code} - {response.text}")
+
+    def _redact(self, message: str) -> str:
+        return message.replace(self.google_api_key, "<redacted>") if self.google_api_key else message
+
+    @staticmethod
+    def extract_pdf_pages(data: bytes) -> list:
+        """
+        Extract the text of every page of a PDF file.
+        """
+        reader = PyPDF2.PdfReader(BytesIO(data))
+        return [page.extract_text() or "" for page in reader.pages]
+
+    def read_pdf_pages_from_gcs(self, file_name: str, generation: str = None) -> list:
+        """
+        Read a PDF file from Google Cloud Storage and extract the text of each page.
         """
-        url = f"https://www.googleapis.com/customsearch/v1?q={query}&key={self.google_api_key}&cx={self.google_cse_id}"
-        response = requests.get(url)
-        if response.status_code == 200:
-            results = response.json()
-            summary = "Google Search Results:\n"
-            for item in results.get("items", []):
-                summary += f"- {item['title']}: {item['snippet']}\n"
-            return summary
-        else:
-            raise Exception(f"Google Search API Error: {response.status_code} - {response.text}")
+        return self.extract_pdf_pages(self.bucket.download_bytes(file_name, generation))
 
-    def read_pdf_from_gcs(self, file_name: str) -> str:
+    def read_pdf_from_gcs(self, file_name: str, generation: str = None) -> str:
         """
         Read a PDF file from Google Cloud Storage and extract text.
         """
-        bucket = self.gcs_client.bucket(self.bucket_name)
-        blob = bucket.blob(file_name)
-        pdf_file = BytesIO(blob.download_as_bytes())
+        return "".join(self.read_pdf_pages_from_gcs(file_name, generation))
 
-        reader = PyPDF2.PdfReader(pdf_file)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text()
-        return text
+    def index_documents(self, file_names: list) -> list:
+        """
+        Make sure the current generation of each file is in the vector store.
+        Only new or changed files are downloaded and embedded.
+        :return: Names of the files that were (re)indexed.
+        """
+        indexed = []
+        for file_name in file_names:
+            blob_info = self.bucket.get_blob_info(file_name)
+            if self.vector_store.is_current(blob_info):
+                continue
+            pages = self.read_pdf_pages_from_gcs(file_name, blob_info.generation)
+            self.vector_store.upsert_file(blob_info, pages)
+            indexed.append(file_name)
+        return indexed
+
+    async def aindex_documents(self, file_names: list) -> list:
+        """
+        Async version of index_documents. Metadata lookups and downloads run concurrently,
+        page extraction runs in the PDF pipeline's process pool.
+        :return: Names of the files that were (re)indexed.
+        """
+        unique_names = list(dict.fromkeys(file_names))
+        blob_infos = await asyncio.gather(
+            *(asyncio.to_thread(self.bucket.get_blob_info, file_name) for file_name in unique_names)
+        )
+        stale = {info.name: info for info in blob_infos if not self.vector_store.is_current(info)}
+        if not stale:
+            return []
+        results = await self.pdf_pipeline.fetch_many({name: info.generation for name, info in stale.items()})
+        for file_name, pages in results.items():
+            if isinstance(pages, Exception):
+                raise pages
+            await asyncio.to_thread(self.vector_store.upsert_file, stale[file_name], pages)
+        return list(stale)
+
+    def get_relevant_chunks(
+        self,
+        query: str,
+        file_names: list,
+        k: int = RETRIEVAL_CONFIG["top_k"],
+        token_budget: int = RETRIEVAL_CONFIG["context_token_budget"],
+    ) -> list:
+        """
+        Retrieve the top-k chunks of the given files that fit within the token budget.
+        :return: Chunk metadata entries (file_name, page_start, page_end, text, score, ...), best first.
+        """
+        self.index_documents(file_names)
+        return select_chunks(self.vector_store.search(query, file_names, k=k), token_budget)
+
+    async def _aensure_indexed(self, file_names: list) -> dict:
+        """
+        Make sure the files are indexed before a query searches them: inline, or by queueing
+        stale files with the ingestion service so the query searches what is already indexed.
+        :return: Job state of each file that is not indexed at its current generation yet.
+        """
+        if self.ingestion is None or INGESTION_CONFIG["query_indexing"] == "inline":
+            await self.aindex_documents(file_names)
+            return {}
+        # Queries may reuse a recent generation lookup instead of hitting the bucket for every file
+        jobs = await self.ingestion.submit_many(file_names, max_age=INGESTION_CONFIG["blob_info_ttl"])
+        return {file_name: job["state"] for file_name, job in jobs.items() if job["state"] != INDEXED}
+
+    async def aget_relevant_chunks(
+        self,
+        query: str,
+        file_names: list,
+        k: int = RETRIEVAL_CONFIG["top_k"],
+        token_budget: int = RETRIEVAL_CONFIG["context_token_budget"],
+    ) -> list:
+        """
+        Async version of get_relevant_chunks.
+        Raises IndexingIncomplete, carrying the chunks found, when some files are still being
+        ingested in the background or could not be ingested.
+        """
+        not_indexed = await self._aensure_indexed(file_names)
+        chunks = await asyncio.to_thread(self.vector_store.search, query, file_names, k)
+        chunks = select_chunks(chunks, token_budget)
+        if not_indexed:
+            raise IndexingIncomplete(chunks, not_indexed)
+        return chunks
+
+    async def aget_relevant_chunks_many(
+        self,
+        queries: list,
+        file_names_per_query: list,
+        k: int = RETRIEVAL_CONFIG["top_k"],
+        token_budget: int = RETRIEVAL_CONFIG["context_token_budget"],
+    ) -> list:
+        """
+        Batched version of aget_relevant_chunks. Files shared across queries are indexed once,
+        and all queries are embedded and searched together.
+        :return: One list of chunk metadata entries per query.
+        """
+        not_indexed = await self._aensure_indexed(
+            [name for file_names in file_names_per_query for name in file_names or []]
+        )
+        results = await asyncio.to_thread(self.vector_store.search_many, queries, file_names_per_query, k)
+        results = [select_chunks(chunks, token_budget) for chunks in results]
+        if not_indexed:
+            raise IndexingIncomplete(results, not_indexed)
+        return results
+
+    @staticmethod
+    def _format_chunks(chunks: list) -> list:
+        return [
+            f"[{chunk['file_name']} p.{chunk['page_start']}-{chunk['page_end']}]\n{chunk['text']}"
+            for chunk in chunks
+        ]
 
     def get_optimal_documents(self, query: str, file_names: list) -> list:
         """
-        Retrieve the most relevant documents from GCS using FAISS.
+        Retrieve the most relevant document chunks from GCS using FAISS.
+        """
+        return self._format_chunks(self.get_relevant_chunks(query, file_names))
+
+    async def aget_optimal_documents(self, query: str, file_names: list) -> list:
+        """
+        Async version of get_optimal_documents.
+        """
+        return self._format_chunks(await self.aget_relevant_chunks(query, file_names))
+
+    @staticmethod
+    def format_external_context(relevant_docs: list, google_results: str) -> str:
+        """
+        Combine retrieved document chunks and search results into the context section of a prompt.
         """
-        documents = [self.read_pdf_from_gcs(file_name) for file_name in file_names]
-        self.faiss_handler.add_documents(documents)
-        relevant_indices = self.faiss_handler.search(query)
-        return [documents[i] for i in relevant_indices]
+        return "Relevant Documents:\n" + "\n".join(relevant_docs) + "\n\nGoogle Search Results:\n" + google_results
+
+    async def asearch_google(self, query: str) -> str:
+        """
+        Async version of search_google.
+        """
+        return await asyncio.to_thread(self.search_google, query)
+
+    async def aget_optimal_documents_many(self, queries: list, file_names_per_query: list) -> list:
+        """
+        Batched version of aget_optimal_documents.
+        """
+        chunk_lists = await self.aget_relevant_chunks_many(queries, file_names_per_query)
+        return [self._format_chunks(chunks) for chunks in chunk_lists]
 
     def get_external_context(self, query: str, file_names: list) -> str:
         """
@@ -63,4 +273,20 @@ class ExternalSourceHandler:
         """
         relevant_docs = self.get_optimal_documents(query, file_names)
         google_results = self.search_google(query)
-        return "Relevant Documents:\n" + "\n".join(relevant_docs) + "\n\nGoogle Search Results:\n" + google_results
\ No newline at end of file
+        return self.format_external_context(relevant_docs, google_results)
+
+    async def aget_external_context(self, query: str, file_names: list) -> str:
+        """
+        Async version of get_external_context that retrieves documents and searches the web concurrently.
+        """
+        relevant_docs, google_results = await asyncio.gather(
+            self.aget_optimal_documents(query, file_names),
+            self.asearch_google(query),
+        )
+        return self.format_external_context(relevant_docs, google_results)
+
+    def close(self) -> None:
+        """
+        Close the pooled search session.
+        """
+        self.session.close()
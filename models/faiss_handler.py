@@ -1,26 +1,329 @@
 # models/faiss_handler.py
+import os
 import faiss
 import numpy as np
 from sentence_transformers import SentenceTransformer
+from config import EMBEDDING_CONFIG, VECTOR_STORE_CONFIG
+from models.metrics import (
+    EMBEDDING_BATCH_SIZE, EMBEDDING_SECONDS, FAISS_INDEX_VECTORS, FAISS_SEARCH_QUERIES, FAISS_SEARCH_SECONDS, timer
+)
+
+INDEX_TYPES = ("flat_l2", "flat_ip", "ivf_flat", "ivf_pq", "hnsw")
+
+# File-filtered searches pass an IDSelector in the search parameters of IndexIDMap indexes,
+# which faiss only supports from 1.8.0 on (older versions fail every filtered search)
+MIN_FAISS_VERSION = (1, 8, 0)
+
+
+def check_faiss_version(version: str = faiss.__version__) -> None:
+    """
+    Fail at startup instead of on every search when the installed faiss is too old.
+    """
+    installed = tuple(int(part) for part in version.split(".")[:3] if part.isdigit())
+    if installed < MIN_FAISS_VERSION:
+        raise ImportError(
+            f"faiss-cpu>={'.'.join(map(str, MIN_FAISS_VERSION))} is required for filtered search, found {version}."
+        )
+
+
+check_faiss_version()
+
+
+def build_index(
+    index_type: str,
+    dimension: int,
+    nlist: int = VECTOR_STORE_CONFIG["nlist"],
+    pq_m: int = VECTOR_STORE_CONFIG["pq_m"],
+    pq_nbits: int = VECTOR_STORE_CONFIG["pq_nbits"],
+    hnsw_m: int = VECTOR_STORE_CONFIG["hnsw_m"],
+    ef_construction: int = VECTOR_STORE_CONFIG["ef_construction"],
+) -> faiss.Index:
+    """
+    Build an empty index that accepts add_with_ids.
+    'flat_l2' is exact L2 search over raw embeddings. The other types use inner product,
+    i.e. cosine similarity when vectors are normalized: 'flat_ip' is exact, 'ivf_flat' and
+    'ivf_pq' partition vectors into `nlist` clusters (PQ also compresses them into `pq_m`
+    codes of `pq_nbits` bits) and must be trained, 'hnsw' is a graph with `hnsw_m` links per node.
+    """
+    if index_type == "flat_l2":
+        # IndexIDMap lets vectors be addressed (and removed) by stable ids
+        return faiss.IndexIDMap(faiss.IndexFlatL2(dimension))
+    if index_type == "flat_ip":
+        return faiss.IndexIDMap(faiss.IndexFlatIP(dimension))
+    if index_type == "ivf_flat":
+        return faiss.IndexIVFFlat(faiss.IndexFlatIP(dimension), dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+    if index_type == "ivf_pq":
+        return faiss.IndexIVFPQ(
+            faiss.IndexFlatIP(dimension), dimension, nlist, pq_m, pq_nbits, faiss.METRIC_INNER_PRODUCT
+        )
+    if index_type == "hnsw":
+        graph = faiss.IndexHNSWFlat(dimension, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        graph.hnsw.efConstruction = ef_construction
+        # IndexIDMap2 can reconstruct vectors by position, which removal relies on
+        return faiss.IndexIDMap2(graph)
+    raise ValueError(f"Index type '{index_type}' is not supported.")
+
+
+def search_parameters(
+    index: faiss.Index,
+    allowed_ids: list = None,
+    nprobe: int = VECTOR_STORE_CONFIG["nprobe"],
+    ef_search: int = VECTOR_STORE_CONFIG["ef_search"],
+):
+    """
+    Build search parameters for an index: an optional id filter plus the index's
+    accuracy/speed knob (nprobe for IVF, efSearch for HNSW).
+    """
+    kwargs = {}
+    if allowed_ids is not None:
+        kwargs["sel"] = faiss.IDSelectorBatch(np.array(allowed_ids, dtype="int64"))
+    if isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(nprobe=nprobe, **kwargs)
+    if isinstance(index, faiss.IndexIDMap2) and isinstance(faiss.downcast_index(index.index), faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(efSearch=ef_search, **kwargs)
+    return faiss.SearchParameters(**kwargs) if kwargs else None
+
 
 class FaissHandler:
-    def __init__(self):
-        # Load a pre-trained sentence transformer model
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.dimension = 384  # Dimension of the embeddings
-        self.index = faiss.IndexFlatL2(self.dimension)  # FAISS index
+    def __init__(
+        self,
+        model: SentenceTransformer = None,
+        index_path: str = None,
+        index_type: str = VECTOR_STORE_CONFIG["index_type"],
+        nlist: int = VECTOR_STORE_CONFIG["nlist"],
+        pq_m: int = VECTOR_STORE_CONFIG["pq_m"],
+        pq_nbits: int = VECTOR_STORE_CONFIG["pq_nbits"],
+        hnsw_m: int = VECTOR_STORE_CONFIG["hnsw_m"],
+        ef_construction: int = VECTOR_STORE_CONFIG["ef_construction"],
+        nprobe: int = VECTOR_STORE_CONFIG["nprobe"],
+        ef_search: int = VECTOR_STORE_CONFIG["ef_search"],
+        train_size: int = VECTOR_STORE_CONFIG["train_size"],
+        mmap: bool = VECTOR_STORE_CONFIG["mmap"],
+    ):
+        """
+        Initialize the FAISS handler.
+        IVF indexes need training. Until `train_size` vectors were added they are kept in an
+        exact staging index, then the IVF index is trained on them and takes them over.
+        :param model: Optional shared sentence transformer. Loaded if not provided.
+        :param index_path: Optional file the index is loaded from and saved to.
+        :param index_type: One of INDEX_TYPES, see build_index().
+        :param nprobe: IVF clusters visited per search.
+        :param ef_search: HNSW candidate list size per search.
+        :param train_size: Vectors needed before an IVF index is trained (defaults to FAISS's
+            recommended 39 points per centroid).
+        :param mmap: Memory-map the index file instead of reading it into memory. The index
+            is read into memory on the first write.
+        """
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Index type '{index_type}' is not supported.")
+        # Reuse a shared sentence transformer model if one is provided, otherwise load it
+        self.model = model if model is not None else SentenceTransformer(EMBEDDING_CONFIG["model_name"])
+        self.dimension = self.model.get_sentence_embedding_dimension()
+        self.index_type = index_type
+        self.build_options = {"nlist": nlist, "pq_m": pq_m, "pq_nbits": pq_nbits, "hnsw_m": hnsw_m}
+        self.ef_construction = ef_construction
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        # k-means needs at least one point per centroid: nlist clusters, and 2^nbits PQ codes per sub-quantizer
+        self.min_train_points = max(nlist, 2 ** pq_nbits) if index_type == "ivf_pq" else nlist
+        self.train_size = max(train_size or 39 * self.min_train_points, self.min_train_points)
+        # MiniLM is trained for cosine similarity, which is inner product on normalized vectors
+        self.normalize = index_type != "flat_l2"
+        self.index_path = index_path
+        self._load(mmap)
+
+    @property
+    def trainable(self) -> bool:
+        return self.index_type in ("ivf_flat", "ivf_pq")
+
+    def signature(self) -> dict:
+        """
+        Settings that shape the stored vectors; an index built with other settings cannot be reused.
+        """
+        return {"index_type": self.index_type, **self.build_options}
+
+    def _new_index(self) -> faiss.Index:
+        return build_index(self.index_type, self.dimension, ef_construction=self.ef_construction, **self.build_options)
+
+    def _new_staging(self) -> faiss.Index:
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(self.dimension))
+
+    def _load(self, mmap: bool) -> None:
+        self.index = self._new_index()
+        self.staging = self._new_staging() if self.trainable else None
+        self._mmapped = False
+        if not (self.index_path and os.path.exists(self.index_path)):
+            self._report_size()
+            return
+        loaded = faiss.read_index(self.index_path, faiss.IO_FLAG_MMAP if mmap else 0)
+        if self.trainable and not isinstance(loaded, faiss.IndexIVF):
+            # Saved before the IVF index had enough vectors to be trained
+            self.staging = loaded
+        else:
+            self.index = loaded
+        self._mmapped = mmap
+        self._report_size()
+
+    def _ensure_writable(self) -> None:
+        if self._mmapped:
+            self._load(mmap=False)
+
+    def _active(self) -> faiss.Index:
+        """
+        The index currently holding the vectors.
+        """
+        if self.trainable and not self.index.is_trained:
+            return self.staging
+        return self.index
+
+    @property
+    def ntotal(self) -> int:
+        return self._active().ntotal
+
+    def _report_size(self) -> None:
+        FAISS_INDEX_VECTORS.labels(index_type=self.index_type).set(self.ntotal)
 
-    def add_documents(self, documents: list):
+    def reset(self) -> None:
+        """
+        Remove every vector (and the training of IVF indexes).
+        """
+        self.index = self._new_index()
+        self.staging = self._new_staging() if self.trainable else None
+        self._mmapped = False
+        self._report_size()
+
+    def encode(self, texts: list, batch_size: int = EMBEDDING_CONFIG["batch_size"]) -> np.ndarray:
+        """
+        Embed texts in batched forward passes.
+        """
+        EMBEDDING_BATCH_SIZE.observe(len(texts))
+        with timer(EMBEDDING_SECONDS):
+            return np.array(
+                self.model.encode(texts, batch_size=batch_size, normalize_embeddings=self.normalize), dtype="float32"
+            )
+
+    def add_documents(self, documents: list, ids: list = None, batch_size: int = EMBEDDING_CONFIG["batch_size"]) -> list:
         """
         Add documents to the FAISS index.
+        :param documents: Texts to embed and add.
+        :param ids: Optional vector ids, one per document. Defaults to sequential ids.
+        :param batch_size: Number of texts encoded per forward pass.
+        :return: The ids of the added vectors.
+        """
+        if ids is None:
+            ids = list(range(self.ntotal, self.ntotal + len(documents)))
+        if not documents:
+            return []
+        self.add_embeddings(self.encode(documents, batch_size=batch_size), ids)
+        return ids
+
+    def add_embeddings(self, embeddings: np.ndarray, ids: list) -> None:
+        """
+        Add precomputed embeddings, training an IVF index once enough vectors were staged.
+        """
+        self._ensure_writable()
+        ids = np.array(ids, dtype="int64")
+        if self.trainable and not self.index.is_trained:
+            self.staging.add_with_ids(embeddings, ids)
+            if self.staging.ntotal >= self.train_size:
+                self.train()
+        else:
+            self.index.add_with_ids(embeddings, ids)
+        self._report_size()
+
+    def train(self) -> None:
+        """
+        Train the IVF index on the staged vectors and move them into it.
+        """
+        if not self.trainable or self.index.is_trained:
+            return
+        if self.staging.ntotal < self.min_train_points:
+            raise ValueError(
+                f"FAISS Error: training needs at least {self.min_train_points} vectors, "
+                f"{self.staging.ntotal} are staged"
+            )
+        self._ensure_writable()
+        vectors = self.staging.index.reconstruct_n(0, self.staging.ntotal)
+        ids = faiss.vector_to_array(self.staging.id_map)
+        self.index.train(vectors)
+        self.index.add_with_ids(vectors, ids)
+        self.staging = self._new_staging()
+
+    def remove_ids(self, ids: list) -> int:
+        """
+        Remove vectors from the index.
+        :return: Number of vectors removed.
+        """
+        if not ids:
+            return 0
+        self._ensure_writable()
+        active = self._active()
+        if self.index_type == "hnsw":
+            removed = self._rebuild_without(ids)
+        else:
+            removed = active.remove_ids(np.array(ids, dtype="int64"))
+        self._report_size()
+        return removed
+
+    def _rebuild_without(self, ids: list) -> int:
+        # HNSW graphs do not support removal, so the remaining vectors are re-inserted
+        id_map = faiss.vector_to_array(self.index.id_map)
+        keep = ~np.isin(id_map, np.array(ids, dtype="int64"))
+        removed = int(len(id_map) - keep.sum())
+        if removed:
+            vectors = self.index.index.reconstruct_n(0, self.index.ntotal)
+            index = self._new_index()
+            if keep.any():
+                index.add_with_ids(vectors[keep], id_map[keep])
+            self.index = index
+        return removed
+
+    def search(self, query: str, k: int = 3, allowed_ids: list = None) -> list:
+        """
+        Search for the most relevant documents.
+        :param allowed_ids: Optional ids the search is restricted to.
+        :return: Ids of at most k documents, best first.
         """
-        embeddings = self.model.encode(documents)
-        self.index.add(np.array(embeddings))
+        return [vector_id for vector_id, _ in self.search_with_scores(query, k, allowed_ids)]
 
-    def search(self, query: str, k: int = 3) -> list:
+    def search_with_scores(self, query: str, k: int = 3, allowed_ids: list = None) -> list:
         """
         Search for the most relevant documents.
+        :param allowed_ids: Optional ids the search is restricted to.
+        :return: (id, score) pairs of at most k documents, best first. The score is an L2
+            distance for 'flat_l2' and a cosine similarity for the other index types.
+        """
+        return self.search_embeddings(self.encode([query]), k, allowed_ids)[0]
+
+    def search_embeddings(self, embeddings: np.ndarray, k: int = 3, allowed_ids: list = None) -> list:
+        """
+        Search for the most relevant documents of several query embeddings with one matrix search.
+        :param allowed_ids: Optional ids every search is restricted to.
+        :return: One list of (id, score) pairs per query, best first.
+        """
+        index = self._active()
+        candidates = index.ntotal if allowed_ids is None else min(len(allowed_ids), index.ntotal)
+        k = min(k, candidates)
+        if k <= 0:
+            return [[] for _ in range(len(embeddings))]
+        params = search_parameters(index, allowed_ids, nprobe=self.nprobe, ef_search=self.ef_search)
+        FAISS_SEARCH_QUERIES.labels(index_type=self.index_type).observe(len(embeddings))
+        with timer(FAISS_SEARCH_SECONDS, index_type=self.index_type):
+            distances, indices = index.search(embeddings, k, params=params)
+        # FAISS pads with -1 when fewer than k vectors match
+        return [
+            [(int(vector_id), float(distance)) for vector_id, distance in zip(row_ids, row_distances) if vector_id != -1]
+            for row_ids, row_distances in zip(indices, distances)
+        ]
+
+    def save(self) -> None:
+        """
+        Write the index to index_path atomically.
         """
-        query_embedding = self.model.encode([query])
-        distances, indices = self.index.search(np.array(query_embedding), k)
-        return indices[0].tolist()
\ No newline at end of file
+        if not self.index_path:
+            raise ValueError("FaissHandler has no index_path to save to.")
+        if self._mmapped:
+            return  # Nothing was written since the file was mapped
+        tmp_path = f"{self.index_path}.tmp"
+        faiss.write_index(self._active(), tmp_path)
+        os.replace(tmp_path, self.index_path)
@@ -0,0 +1,221 @@
+# models/handler_registry.py
+import inspect
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+from google.cloud import bigquery, storage
+from config import (
+    DATABASE_CONFIG, GCS_CONFIG, GOOGLE_SEARCH_CONFIG, MODEL_CONFIG, RETRIEVAL_CONFIG, VECTOR_STORE_CONFIG
+)
+from models.bucket_handler import GCSBucket, LocalBucket
+from models.embedding_encoder import build_embedding_model
+from models.model_handler import ModelHandler
+from models.llm_providers import build_http_client
+from models.database_handler import DatabaseHandler
+from models.external_source_handler import ExternalSourceHandler
+from models.storage_handler import StorageHandler
+from models.faiss_handler import FaissHandler
+from models.vector_store import DocumentVectorStore
+from models.pdf_pipeline import PdfPipeline
+from models.reranker import CrossEncoderReranker
+from models.ingestion_service import IngestionService
+from models.prompt_assembler import PromptAssembler
+from models.response_cache import SemanticResponseCache
+from models.search_cache import SearchResultCache
+
+
+class HandlerRegistry:
+    def __init__(self):
+        """
+        Process-wide registry of handlers and clients.
+        Each component is built once by its factory and then shared across requests.
+        """
+        self._factories: Dict[str, Callable[["HandlerRegistry"], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._status: Dict[str, dict] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._warm_by_default: Dict[str, bool] = {}
+
+    def register(self, name: str, factory: Callable[["HandlerRegistry"], Any], warm: bool = True) -> None:
+        """
+        Register a factory for a component. The factory receives the registry so it can
+        depend on other components (e.g. the shared embedding model).
+        :param warm: Build the component in the default warm-up. Components with side effects
+            that are only wanted when used (e.g. creating a local database) are built on first use.
+        """
+        self._factories[name] = factory
+        self._warm_by_default[name] = warm
+        self._locks[name] = threading.Lock()
+        self._status[name] = {"state": "cold", "init_time_ms": None, "error": None}
+
+    def get(self, name: str) -> Any:
+        """
+        Return the shared instance of a component, building it on first use.
+        """
+        if name not in self._factories:
+            raise ValueError(f"Handler '{name}' is not registered.")
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        with self._locks[name]:
+            # Another request may have built it while we were waiting for the lock
+            if name in self._instances:
+                return self._instances[name]
+            start = time.perf_counter()
+            try:
+                instance = self._factories[name](self)
+            except Exception as e:
+                self._status[name] = {
+                    "state": "error",
+                    "init_time_ms": round((time.perf_counter() - start) * 1000, 2),
+                    "error": str(e),
+                }
+                raise
+            self._instances[name] = instance
+            self._status[name] = {
+                "state": "warm",
+                "init_time_ms": round((time.perf_counter() - start) * 1000, 2),
+                "error": None,
+            }
+            return instance
+
+    def warm_up(self, names: Optional[List[str]] = None) -> None:
+        """
+        Build the given components (by default all those registered with warm=True). Failures
+        are recorded in the status instead of raised, so one misconfigured backend does not
+        prevent startup.
+        """
+        for name in names or [name for name in self._factories if self._warm_by_default[name]]:
+            try:
+                self.get(name)
+            except Exception:
+                pass
+
+    def status(self) -> Dict[str, dict]:
+        """
+        Report warm/cold/error state and init time for every registered component.
+        """
+        return {name: dict(status) for name, status in self._status.items()}
+
+    def _closing_order(self) -> List[str]:
+        # A factory builds the components it depends on before its own instance is stored, so
+        # reversing the build order closes every component before the ones it uses (e.g. the
+        # ingestion workers before the vector store they write to)
+        return list(reversed(self._instances))
+
+    def _closed(self, name: str) -> None:
+        del self._instances[name]
+        self._status[name] = {"state": "cold", "init_time_ms": None, "error": None}
+
+    def close(self) -> None:
+        """
+        Close every built component that exposes a close() method and reset it to cold.
+        Components are closed before the components they depend on.
+        """
+        for name in self._closing_order():
+            close = getattr(self._instances[name], "close", None)
+            if callable(close):
+                try:
+                    close()
+                except Exception:
+                    pass
+            self._closed(name)
+
+    async def aclose(self) -> None:
+        """
+        Like close(), but also awaits async closers (e.g. the shared HTTP client's aclose()).
+        """
+        for name in self._closing_order():
+            instance = self._instances[name]
+            aclose = getattr(instance, "aclose", None)
+            close = getattr(instance, "close", None)
+            try:
+                if callable(aclose) and inspect.iscoroutinefunction(aclose):
+                    await aclose()
+                elif callable(close):
+                    close()
+            except Exception:
+                pass
+            self._closed(name)
+
+
+def _build_bucket(registry: HandlerRegistry):
+    if GCS_CONFIG["backend"] == "local":
+        return LocalBucket(GCS_CONFIG["local_path"])
+    return GCSBucket(registry.get("gcs_client"), GCS_CONFIG["bucket_name"])
+
+
+def build_default_registry() -> HandlerRegistry:
+    """
+    Build the registry with every handler and client used by the API.
+    """
+    registry = HandlerRegistry()
+
+    # Shared clients
+    registry.register("embedding_model", lambda r: build_embedding_model())
+    registry.register("gcs_client", lambda r: storage.Client.from_service_account_json(GCS_CONFIG["credentials_path"]))
+    registry.register("http_client", lambda r: build_http_client())
+    registry.register(
+        "bigquery_client",
+        lambda r: bigquery.Client.from_service_account_json(DATABASE_CONFIG["bigquery"]["credentials_path"]),
+    )
+
+    # Model handlers
+    registry.register("model_gemini", lambda r: ModelHandler("gemini"))
+    registry.register("model_deepseek", lambda r: ModelHandler("deepseek", http_client=r.get("http_client")))
+    if MODEL_CONFIG["fake"]["enabled"]:
+        registry.register("model_fake", lambda r: ModelHandler("fake"))
+
+    # Database handlers
+    registry.register("database_mysql", lambda r: DatabaseHandler("mysql"))
+    registry.register(
+        "database_bigquery",
+        lambda r: DatabaseHandler("bigquery", bigquery_client=r.get("bigquery_client")),
+    )
+    # The SQLite stand-in creates its database file and starts a history writer when built,
+    # so it is only built by requests that use it
+    registry.register("database_sqlite", lambda r: DatabaseHandler("sqlite"), warm=False)
+
+    # Storage and retrieval handlers
+    # Uploaded files are queued for ingestion; the service is only built on the first upload
+    registry.register(
+        "storage",
+        lambda r: StorageHandler(
+            client=r.get("gcs_client"), on_upload=lambda name: r.get("ingestion").submit_threadsafe(name)
+        ),
+    )
+    registry.register("bucket", _build_bucket)
+    registry.register("faiss", lambda r: FaissHandler(model=r.get("embedding_model")))
+    if RETRIEVAL_CONFIG["reranker_enabled"]:
+        registry.register("reranker", lambda r: CrossEncoderReranker())
+    registry.register(
+        "vector_store",
+        lambda r: DocumentVectorStore(
+            VECTOR_STORE_CONFIG["path"],
+            embedding_model=r.get("embedding_model"),
+            reranker=r.get("reranker") if RETRIEVAL_CONFIG["reranker_enabled"] else None,
+        ),
+    )
+    registry.register("pdf_pipeline", lambda r: PdfPipeline(r.get("bucket")))
+    registry.register(
+        "ingestion",
+        lambda r: IngestionService(r.get("bucket"), r.get("vector_store"), r.get("pdf_pipeline")),
+    )
+    registry.register(
+        "external_source",
+        lambda r: ExternalSourceHandler(
+            bucket=r.get("bucket"),
+            vector_store=r.get("vector_store"),
+            pdf_pipeline=r.get("pdf_pipeline"),
+            search_cache=r.get("search_cache") if GOOGLE_SEARCH_CONFIG["cache_enabled"] else None,
+            ingestion=r.get("ingestion"),
+        ),
+    )
+
+    # Caches
+    registry.register("response_cache", lambda r: SemanticResponseCache(r.get("embedding_model")))
+    registry.register("search_cache", lambda r: SearchResultCache())
+    registry.register("prompt_assembler", lambda r: PromptAssembler())
+
+    return registry
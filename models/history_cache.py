@@ -0,0 +1,238 @@
+# models/history_cache.py
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+from config import HISTORY_CACHE_CONFIG
+
+
+def _row_size(row: dict) -> int:
+    return len(row.get("query") or "") + len(row.get("response") or "")
+
+
+def _trim(rows: List[dict], max_entries: int, max_bytes: int) -> tuple:
+    """
+    Trim newest-first rows to the per-user caps.
+    :return: (kept rows, whether anything was dropped)
+    """
+    kept = []
+    used_bytes = 0
+    for row in rows[:max_entries]:
+        used_bytes += _row_size(row)
+        if kept and used_bytes > max_bytes:
+            break
+        kept.append(row)
+    return kept, len(kept) < len(rows)
+
+
+class _CacheEntry:
+    __slots__ = ("rows", "complete", "expires_at")
+
+    def __init__(self, rows: List[dict], complete: bool, expires_at: float):
+        self.rows = rows  # Newest first
+        self.complete = complete  # True if rows hold the user's entire history
+        self.expires_at = expires_at
+
+
+class InMemoryHistoryCache:
+    def __init__(
+        self,
+        max_users: int = HISTORY_CACHE_CONFIG["max_users"],
+        ttl: float = HISTORY_CACHE_CONFIG["ttl"],
+        max_entries_per_user: int = HISTORY_CACHE_CONFIG["max_entries_per_user"],
+        max_bytes_per_user: int = HISTORY_CACHE_CONFIG["max_bytes_per_user"],
+    ):
+        """
+        In-process LRU/TTL cache of recent conversation history per user.
+        :param max_users: Users kept before the least recently used one is evicted.
+        :param ttl: Seconds an entry lives after it was last filled or appended to.
+        :param max_entries_per_user: Most recent rows kept per user.
+        :param max_bytes_per_user: Approximate text bytes kept per user.
+        """
+        self.max_users = max_users
+        self.ttl = ttl
+        self.max_entries_per_user = max_entries_per_user
+        self.max_bytes_per_user = max_bytes_per_user
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "fills": 0, "appends": 0, "evictions": 0, "expirations": 0}
+
+    def get(self, user_id: str, limit: int) -> Optional[List[dict]]:
+        """
+        Return the latest `limit` rows of a user, or None if the cache cannot answer.
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                del self._entries[user_id]
+                self._stats["expirations"] += 1
+                entry = None
+            if entry is None or (len(entry.rows) < limit and not entry.complete):
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self._stats["hits"] += 1
+            return list(entry.rows[:limit])
+
+    def version(self, user_id: str) -> int:
+        """
+        Return a counter that changes whenever rows are appended for the user.
+        Read it before loading from the database and pass it to fill().
+        """
+        with self._lock:
+            return self._versions.get(user_id, 0)
+
+    def fill(self, user_id: str, rows: List[dict], complete: bool, version: int) -> None:
+        """
+        Store rows loaded from the database, unless rows were appended since `version`
+        was read (the loaded rows would then be stale).
+        """
+        with self._lock:
+            if self._versions.get(user_id, 0) != version:
+                return
+            kept, trimmed = _trim(rows, self.max_entries_per_user, self.max_bytes_per_user)
+            self._store(user_id, _CacheEntry(kept, complete and not trimmed, time.monotonic() + self.ttl))
+            self._stats["fills"] += 1
+
+    def append(self, user_id: str, row: dict) -> None:
+        """
+        Add a newly written row (write-through).
+        """
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            entry = self._entries.get(user_id)
+            if entry is None or entry.expires_at <= time.monotonic():
+                # Older rows may exist in the database, so the entry is partial
+                entry = _CacheEntry([], False, 0)
+            kept, trimmed = _trim([row] + entry.rows, self.max_entries_per_user, self.max_bytes_per_user)
+            self._store(user_id, _CacheEntry(kept, entry.complete and not trimmed, time.monotonic() + self.ttl))
+            self._stats["appends"] += 1
+
+    def _store(self, user_id: str, entry: _CacheEntry) -> None:
+        self._entries[user_id] = entry
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_users:
+            evicted_user, _ = self._entries.popitem(last=False)
+            self._versions.pop(evicted_user, None)
+            self._stats["evictions"] += 1
+
+    def stats(self) -> dict:
+        """
+        Return hit/miss counters, the hit ratio and the number of cached users.
+        """
+        with self._lock:
+            stats = dict(self._stats, users=len(self._entries))
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+class RedisHistoryCache:
+    def __init__(
+        self,
+        url: str = HISTORY_CACHE_CONFIG["redis_url"],
+        prefix: str = "history",
+        ttl: float = HISTORY_CACHE_CONFIG["ttl"],
+        max_entries_per_user: int = HISTORY_CACHE_CONFIG["max_entries_per_user"],
+        max_bytes_per_user: int = HISTORY_CACHE_CONFIG["max_bytes_per_user"],
+    ):
+        """
+        Conversation history cache backed by a Redis-compatible server, shared between
+        processes. Eviction across users is left to the server's maxmemory policy.
+        :param url: Redis connection URL.
+        :param prefix: Key prefix, e.g. per database type.
+        """
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("The 'redis' package is required for the Redis history cache backend.")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.ttl = int(ttl)
+        self.max_entries_per_user = max_entries_per_user
+        self.max_bytes_per_user = max_bytes_per_user
+        self._watch_error = redis.WatchError
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "fills": 0, "appends": 0}
+
+    def _key(self, user_id: str) -> str:
+        return f"{self.prefix}:{user_id}"
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, user_id: str, limit: int) -> Optional[List[dict]]:
+        raw = self.client.get(self._key(user_id))
+        if raw is None:
+            self._count("misses")
+            return None
+        entry = json.loads(raw)
+        if len(entry["rows"]) < limit and not entry["complete"]:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return entry["rows"][:limit]
+
+    def version(self, user_id: str) -> int:
+        return int(self.client.get(f"{self._key(user_id)}:version") or 0)
+
+    def fill(self, user_id: str, rows: List[dict], complete: bool, version: int) -> None:
+        kept, trimmed = _trim(rows, self.max_entries_per_user, self.max_bytes_per_user)
+        payload = json.dumps({"rows": kept, "complete": complete and not trimmed}, default=str)
+        version_key = f"{self._key(user_id)}:version"
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(version_key)
+                if int(pipe.get(version_key) or 0) != version:
+                    return
+                pipe.multi()
+                pipe.set(self._key(user_id), payload, ex=self.ttl)
+                pipe.execute()
+                self._count("fills")
+            except self._watch_error:
+                pass
+
+    def append(self, user_id: str, row: dict) -> None:
+        key = self._key(user_id)
+        version_key = f"{key}:version"
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key, version_key)
+                    raw = pipe.get(key)
+                    entry = json.loads(raw) if raw else {"rows": [], "complete": False}
+                    kept, trimmed = _trim([row] + entry["rows"], self.max_entries_per_user, self.max_bytes_per_user)
+                    payload = json.dumps({"rows": kept, "complete": entry["complete"] and not trimmed}, default=str)
+                    pipe.multi()
+                    pipe.incr(version_key)
+                    pipe.expire(version_key, self.ttl)
+                    pipe.set(key, payload, ex=self.ttl)
+                    pipe.execute()
+                    break
+                except self._watch_error:
+                    continue
+        self._count("appends")
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+def build_history_cache(prefix: str):
+    """
+    Build the history cache selected by HISTORY_CACHE_BACKEND ('memory', 'redis' or 'none').
+    """
+    backend = HISTORY_CACHE_CONFIG["backend"]
+    if backend == "memory":
+        return InMemoryHistoryCache()
+    if backend == "redis":
+        return RedisHistoryCache(prefix=prefix)
+    if backend == "none":
+        return None
+    raise ValueError(f"History cache backend '{backend}' is not supported.")
@@ -0,0 +1,160 @@
+# models/history_writer.py
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, List
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryWriteBuffer:
+    def __init__(
+        self,
+        flush_rows: Callable[[List[dict]], None],
+        max_batch_size: int = 100,
+        flush_interval: float = 1.0,
+        max_buffer_size: int = 10000,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+    ):
+        """
+        Write-behind buffer for conversation history rows.
+        Rows are accepted immediately and written by a background thread in batches, when
+        max_batch_size rows are waiting or flush_interval seconds have passed.
+        :param flush_rows: Writes a batch of rows to the database in one round-trip.
+        :param max_batch_size: Maximum rows per batch.
+        :param flush_interval: Maximum seconds a row waits before being flushed.
+        :param max_buffer_size: Maximum rows held in memory. The oldest rows are dropped beyond it.
+        :param max_retries: Attempts per batch before its rows are dropped.
+        :param retry_backoff: Seconds before the first retry, doubled on each further retry.
+        """
+        self.flush_rows = flush_rows
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer_size = max_buffer_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._buffer = deque()
+        self._in_flight = []  # Batch currently being written
+        self._finished_batches = 0  # Batches written or dropped, so readers can detect a flush
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._stats = {"enqueued": 0, "written": 0, "batches": 0, "retries": 0, "dropped": 0}
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, row: dict) -> None:
+        """
+        Add a row to the buffer and return without waiting for the write.
+        """
+        with self._condition:
+            if self._closed:
+                raise Exception("History Writer Error: writer is closed")
+            if len(self._buffer) >= self.max_buffer_size:
+                self._buffer.popleft()
+                self._stats["dropped"] += 1
+                logger.warning("History write buffer is full, dropped the oldest row")
+            self._buffer.append(row)
+            self._stats["enqueued"] += 1
+            if len(self._buffer) >= self.max_batch_size:
+                self._condition.notify()
+
+    def pending_rows(self, user_id: str) -> List[dict]:
+        """
+        Return the rows of a user that are not written yet, oldest first.
+        """
+        with self._condition:
+            return [row for row in [*self._in_flight, *self._buffer] if row["user_id"] == user_id]
+
+    def flush_sequence(self) -> int:
+        """
+        Return the number of batches whose write has finished. A reader that sees the same
+        number before and after a query, with no batch in flight, knows no row moved from
+        the buffer to the database in between.
+        """
+        with self._condition:
+            return self._finished_batches
+
+    def pending_snapshot(self, user_id: str) -> tuple:
+        """
+        Atomically return (flush_sequence, whether a batch is in flight, pending rows of the user).
+        """
+        with self._condition:
+            rows = [row for row in [*self._in_flight, *self._buffer] if row["user_id"] == user_id]
+            return self._finished_batches, bool(self._in_flight), rows
+
+    @contextmanager
+    def paused(self):
+        """
+        Hold back flushes (waiting for one in progress to finish) while the block runs.
+        """
+        with self._flush_lock:
+            yield
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                if not self._closed and len(self._buffer) < self.max_batch_size:
+                    self._condition.wait(timeout=self.flush_interval)
+                if self._closed:
+                    return
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Write every buffered row, batch by batch, retrying failed batches.
+        """
+        with self._flush_lock:
+            while True:
+                with self._condition:
+                    batch = [self._buffer.popleft() for _ in range(min(self.max_batch_size, len(self._buffer)))]
+                    self._in_flight = batch
+                if not batch:
+                    return
+                written = self._write_batch(batch)
+                with self._condition:
+                    self._in_flight = []
+                    self._finished_batches += 1
+                if not written:
+                    return
+
+    def _write_batch(self, batch: List[dict]) -> bool:
+        for attempt in range(self.max_retries):
+            try:
+                self.flush_rows(batch)
+                with self._condition:
+                    self._stats["written"] += len(batch)
+                    self._stats["batches"] += 1
+                return True
+            except Exception as e:
+                logger.warning("History batch write failed (attempt %d/%d): %s", attempt + 1, self.max_retries, e)
+                if attempt + 1 < self.max_retries:
+                    with self._condition:
+                        self._stats["retries"] += 1
+                    time.sleep(self.retry_backoff * (2 ** attempt))
+        with self._condition:
+            self._stats["dropped"] += len(batch)
+        logger.error("Dropped %d history rows after %d failed attempts", len(batch), self.max_retries)
+        return False
+
+    def stats(self) -> dict:
+        """
+        Return buffer counters and the number of rows waiting to be written.
+        """
+        with self._condition:
+            return dict(self._stats, pending=len(self._buffer))
+
+    def close(self, timeout: float = 30.0) -> None:
+        """
+        Stop the background thread and write every remaining row.
+        """
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify()
+        self._thread.join(timeout=timeout)
+        self.flush()
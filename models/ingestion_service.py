@@ -0,0 +1,247 @@
+# models/ingestion_service.py
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from config import INGESTION_CONFIG
+from models.pdf_pipeline import PdfPipeline
+from models.vector_store import DocumentVectorStore
+
+logger = logging.getLogger(__name__)
+
+# Job states, in the order a job goes through them
+QUEUED, FETCHING, EMBEDDING, INDEXED, FAILED = "queued", "fetching", "embedding", "indexed", "failed"
+# Submission state of a file turned away because the queue was full; it is not a job and can be resubmitted
+REJECTED = "rejected"
+
+
+class IngestionQueueFull(Exception):
+    """
+    Raised by submit when the ingestion queue is full.
+    """
+
+
+class IngestionService:
+    def __init__(
+        self,
+        bucket,
+        vector_store: DocumentVectorStore,
+        pdf_pipeline: PdfPipeline,
+        workers: int = INGESTION_CONFIG["workers"],
+        max_attempts: int = INGESTION_CONFIG["max_attempts"],
+        retry_backoff: float = INGESTION_CONFIG["retry_backoff"],
+        max_queue: int = INGESTION_CONFIG["max_queue"],
+        max_finished_jobs: int = INGESTION_CONFIG["max_finished_jobs"],
+    ):
+        """
+        Background document ingestion: a pool of workers downloads, parses, chunks and embeds
+        files into the vector store, so queries search indexes that are already built.
+        Jobs are idempotent per object generation: a file already indexed at its current
+        generation, already queued or running for it, or whose ingestion of it failed, is not
+        ingested again unless forced.
+        :param bucket: GCSBucket or LocalBucket the files are read from.
+        :param vector_store: Shared persistent document vector store.
+        :param pdf_pipeline: Shared concurrent PDF fetch/extraction pipeline.
+        :param workers: Files ingested concurrently.
+        :param max_attempts: Attempts per file before the job is marked as failed.
+        :param retry_backoff: Seconds before the first retry, doubled on each further retry.
+        :param max_queue: Maximum queued files. Submissions beyond it are rejected.
+        :param max_finished_jobs: Indexed or failed jobs kept for status queries. The oldest are
+            evicted beyond it; the status of an evicted file is read from the vector store.
+            Also bounds the generation lookups kept for submissions with a max_age.
+        """
+        self.bucket = bucket
+        self.vector_store = vector_store
+        self.pdf_pipeline = pdf_pipeline
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.max_queue = max_queue
+        self.max_finished_jobs = max_finished_jobs
+        self._jobs = {}  # file name -> latest job
+        self._finished = OrderedDict()  # file names whose latest job is indexed or failed, oldest first
+        self._blob_infos = OrderedDict()  # file name -> (monotonic lookup time, BlobInfo), oldest first
+        self._queue = None
+        self._tasks = []
+        self._upserts = set()  # vector store writes running in threads
+        self._loop = None
+
+    def start(self) -> None:
+        """
+        Start the workers on the running event loop.
+        """
+        if self._loop is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"ingestion-worker-{i}") for i in range(self.workers)
+        ]
+
+    async def submit(self, file_name: str, force: bool = False, max_age: float = 0.0) -> dict:
+        """
+        Queue a file for ingestion unless its current generation is indexed, already in progress
+        or already failed.
+        :param force: Re-ingest even if the current generation is already indexed or failed.
+        :param max_age: Seconds a previous lookup of the file's generation may be reused for,
+            0 looks it up in the bucket.
+        :return: The file's job status.
+        """
+        self.start()
+        blob_info = await self._get_blob_info(file_name, max_age)
+        job = self._jobs.get(file_name)
+        if job is not None and job["generation"] == blob_info.generation:
+            # A failed generation would fail again; it is retried when replaced or forced
+            if job["state"] in (QUEUED, FETCHING, EMBEDDING) or (job["state"] == FAILED and not force):
+                return dict(job)
+        if not force and self.vector_store.is_current(blob_info):
+            job = self._new_job(blob_info, QUEUED)
+            self._finish(job, INDEXED, skipped=True)  # Nothing to do for this generation
+            return dict(job)
+        if self._queue.full():
+            raise IngestionQueueFull(f"Ingestion Error: queue is full ({self.max_queue} files)")
+        job = self._new_job(blob_info, QUEUED)
+        self._queue.put_nowait((job, blob_info))
+        return dict(job)
+
+    async def submit_many(self, file_names: List[str], force: bool = False, max_age: float = 0.0) -> Dict[str, dict]:
+        """
+        Submit several files concurrently.
+        :return: Mapping of file name to its job status, or to a 'rejected' status if the queue was
+            full, or to a 'failed' status if it could not be submitted (e.g. the file does not exist).
+        """
+        names = list(dict.fromkeys(file_names))
+        results = await asyncio.gather(*(self.submit(name, force, max_age) for name in names), return_exceptions=True)
+        statuses = {}
+        for name, result in zip(names, results):
+            if isinstance(result, dict):
+                statuses[name] = result
+            else:
+                state = REJECTED if isinstance(result, IngestionQueueFull) else FAILED
+                statuses[name] = {"file_name": name, "state": state, "error": str(result)}
+        return statuses
+
+    def submit_threadsafe(self, file_name: str) -> None:
+        """
+        Queue a file from synchronous code running outside the event loop (e.g. an upload hook).
+        """
+        if self._loop is None:
+            logger.warning("Ingestion service is not started, '%s' was not queued", file_name)
+            return
+        asyncio.run_coroutine_threadsafe(self.submit(file_name), self._loop)
+
+    def status(self, file_name: str) -> Optional[dict]:
+        """
+        Return the latest job of a file. Files indexed before this process started are reported
+        from the vector store. Returns None for unknown files.
+        """
+        job = self._jobs.get(file_name)
+        if job is not None:
+            return dict(job)
+        generation = self.vector_store.file_versions([file_name])[file_name]
+        if generation is None:
+            return None
+        return {"file_name": file_name, "generation": generation, "state": INDEXED}
+
+    def stats(self) -> dict:
+        """
+        Return the number of jobs per state and the queue length.
+        """
+        states = {}
+        for job in self._jobs.values():
+            states[job["state"]] = states.get(job["state"], 0) + 1
+        return {"jobs": states, "queued": self._queue.qsize() if self._queue else 0, "workers": len(self._tasks)}
+
+    async def _get_blob_info(self, file_name: str, max_age: float):
+        cached = self._blob_infos.get(file_name)
+        if max_age > 0 and cached is not None and time.monotonic() - cached[0] < max_age:
+            return cached[1]
+        blob_info = await asyncio.to_thread(self.bucket.get_blob_info, file_name)
+        self._blob_infos[file_name] = (time.monotonic(), blob_info)
+        self._blob_infos.move_to_end(file_name)
+        while len(self._blob_infos) > self.max_finished_jobs:
+            self._blob_infos.popitem(last=False)
+        return blob_info
+
+    def _new_job(self, blob_info, state: str) -> dict:
+        now = time.time()
+        job = {
+            "file_name": blob_info.name,
+            "generation": blob_info.generation,
+            "state": state,
+            "attempts": 0,
+            "pages": None,
+            "chunks_embedded": 0,
+            "error": None,
+            "submitted_at": now,
+            "updated_at": now,
+        }
+        self._jobs[blob_info.name] = job
+        self._finished.pop(blob_info.name, None)
+        return job
+
+    @staticmethod
+    def _update(job: dict, **changes) -> None:
+        job.update(changes, updated_at=time.time())
+
+    def _finish(self, job: dict, state: str, **changes) -> None:
+        self._update(job, state=state, **changes)
+        if self._jobs.get(job["file_name"]) is not job:
+            return
+        self._finished[job["file_name"]] = None
+        while len(self._finished) > self.max_finished_jobs:
+            file_name, _ = self._finished.popitem(last=False)
+            del self._jobs[file_name]
+
+    async def _worker(self) -> None:
+        while True:
+            job, blob_info = await self._queue.get()
+            try:
+                await self._ingest(job, blob_info)
+            finally:
+                self._queue.task_done()
+
+    async def _ingest(self, job: dict, blob_info) -> None:
+        if self._jobs.get(blob_info.name) is not job:
+            return  # Superseded by a newer generation of the file
+        for attempt in range(1, self.max_attempts + 1):
+            self._update(job, state=FETCHING, attempts=attempt, error=None, chunks_embedded=0)
+            try:
+                pages = await self.pdf_pipeline.fetch_pages(blob_info.name, blob_info.generation)
+                self._update(job, state=EMBEDDING, pages=len(pages))
+                # A cancelled worker cannot stop the thread, so aclose() waits for the write instead
+                upsert = asyncio.ensure_future(asyncio.to_thread(
+                    self.vector_store.upsert_file,
+                    blob_info,
+                    pages,
+                    lambda chunks: self._update(job, chunks_embedded=chunks),
+                ))
+                self._upserts.add(upsert)
+                upsert.add_done_callback(self._upserts.discard)
+                await asyncio.shield(upsert)
+                self._finish(job, INDEXED)
+                return
+            except FileNotFoundError as e:
+                self._finish(job, FAILED, error=str(e))
+                return
+            except Exception as e:
+                logger.warning(
+                    "Ingestion of '%s' failed (attempt %d/%d): %s", blob_info.name, attempt, self.max_attempts, e
+                )
+                self._update(job, error=str(e))
+                if attempt < self.max_attempts:
+                    await asyncio.sleep(self.retry_backoff * (2 ** (attempt - 1)))
+        self._finish(job, FAILED)
+
+    async def aclose(self) -> None:
+        """
+        Stop the workers and wait for the vector store writes they started, so the store can be
+        closed afterwards. Files still queued are not ingested.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await asyncio.gather(*self._upserts, return_exceptions=True)
+        self._tasks = []
+        self._loop = None
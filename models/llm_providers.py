@@ -0,0 +1,338 @@
+# models/llm_providers.py
+import asyncio
+import json
+import random
+import time
+from typing import AsyncIterator, Optional
+import httpx
+import google.generativeai as genai
+from config import PROVIDER_CONFIG
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class _RetryableError(Exception):
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def build_http_client() -> httpx.AsyncClient:
+    """
+    Build the pooled HTTP client shared by all providers (keep-alive, HTTP/2 when `h2` is installed).
+    """
+    try:
+        import h2  # noqa: F401
+        http2 = PROVIDER_CONFIG["http2"]
+    except ImportError:
+        http2 = False
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=PROVIDER_CONFIG["max_connections"],
+            max_keepalive_connections=PROVIDER_CONFIG["max_keepalive_connections"],
+        ),
+        # The read timeout bounds the wait for each chunk of a response, so a stalled stream fails
+        timeout=httpx.Timeout(PROVIDER_CONFIG["connect_timeout"], read=PROVIDER_CONFIG["read_timeout"]),
+    )
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        """
+        Stops calls to a provider after repeated failures.
+        After `failure_threshold` consecutive failures the circuit opens and calls fail
+        fast; after `reset_timeout` seconds one trial call is let through (half-open).
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_progress = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_in_progress:
+            self._trial_in_progress = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_progress = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_in_progress = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def release_trial(self) -> None:
+        """
+        Let another trial call through after one ended without an outcome (e.g. it was cancelled).
+        """
+        self._trial_in_progress = False
+
+
+class BaseProvider:
+    # Prefix of error messages, e.g. "DeepSeek API Error"
+    label = "Provider"
+
+    def __init__(self, config: dict):
+        """
+        Common resilience layer: per-provider concurrency limit, timeout, jittered retry
+        on 429/5xx and a circuit breaker.
+        :param config: Provider entry of MODEL_CONFIG.
+        """
+        self.config = config
+        self.timeout = config.get("timeout", PROVIDER_CONFIG["timeout"])
+        self.max_retries = PROVIDER_CONFIG["max_retries"]
+        self.backoff_base = PROVIDER_CONFIG["backoff_base"]
+        self.backoff_max = PROVIDER_CONFIG["backoff_max"]
+        self.semaphore = asyncio.Semaphore(config.get("max_concurrency", PROVIDER_CONFIG["max_concurrency"]))
+        self.breaker = CircuitBreaker(PROVIDER_CONFIG["breaker_failure_threshold"], PROVIDER_CONFIG["breaker_reset_timeout"])
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        # Full jitter
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def _with_resilience(self, call):
+        """
+        Run `call` (a coroutine function) under the concurrency limit, timeout, retries and breaker.
+        """
+        trial = self.breaker.state == "half_open"
+        if not self.breaker.allow():
+            raise Exception(f"{self.label} Error: circuit open after repeated failures, try again later")
+        try:
+            return await self._call_with_retries(call)
+        except BaseException:
+            # A cancelled trial records neither outcome; without this the circuit would never close again
+            if trial:
+                self.breaker.release_trial()
+            raise
+
+    async def _call_with_retries(self, call):
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self.semaphore:
+                    result = await asyncio.wait_for(call(), timeout=self.timeout)
+                self.breaker.record_success()
+                return result
+            except asyncio.TimeoutError:
+                last_error = _RetryableError(f"timed out after {self.timeout}s")
+            except _RetryableError as e:
+                last_error = e
+            except Exception as e:
+                # Not transient (e.g. a 4xx): the provider is reachable, so the breaker stays closed
+                self.breaker.record_success()
+                raise Exception(f"{self.label} Error: {str(e)}")
+            if attempt < self.max_retries:
+                await asyncio.sleep(self._backoff(attempt, last_error.retry_after))
+        self.breaker.record_failure()
+        raise Exception(f"{self.label} Error: {str(last_error)}")
+
+    async def generate(self, prompt: str, history: list) -> str:
+        raise NotImplementedError
+
+    def stream(self, prompt: str, history: list) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {"circuit": self.breaker.state, "consecutive_failures": self.breaker.failures}
+
+
+def to_chat_messages(prompt: str, history: list) -> list:
+    """
+    Convert database history rows (newest first) and the prompt into chat-completions messages.
+    """
+    messages = []
+    for entry in reversed(history or []):
+        messages.append({"role": "user", "content": entry["query"]})
+        messages.append({"role": "assistant", "content": entry["response"]})
+    messages.append({"role": "user", "content": prompt})
+    return messages
+
+
+def to_gemini_history(history: list) -> list:
+    """
+    Convert database history rows (newest first) into Gemini chat history (oldest first).
+    """
+    gemini_history = []
+    for entry in reversed(history or []):
+        gemini_history.append({"role": "user", "parts": [entry["query"]]})
+        gemini_history.append({"role": "model", "parts": [entry["response"]]})
+    return gemini_history
+
+
+class DeepSeekProvider(BaseProvider):
+    label = "DeepSeek API"
+
+    def __init__(self, config: dict, http_client: httpx.AsyncClient):
+        """
+        DeepSeek chat-completions provider over the shared HTTP client.
+        """
+        super().__init__(config)
+        self.http_client = http_client
+        self.headers = {
+            "Authorization": f"Bearer {config['api_key']}",
+            "Content-Type": "application/json"
+        }
+
+    def _payload(self, prompt: str, history: list, stream: bool) -> dict:
+        return {"model": self.config["model"], "messages": to_chat_messages(prompt, history), "stream": stream}
+
+    @staticmethod
+    def _check_status(response: httpx.Response) -> None:
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            retry_after = response.headers.get("Retry-After")
+            raise _RetryableError(
+                f"HTTP {response.status_code}",
+                retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+            )
+        response.raise_for_status()
+
+    async def generate(self, prompt: str, history: list) -> str:
+        async def call():
+            try:
+                response = await self.http_client.post(
+                    self.config["endpoint"], headers=self.headers, json=self._payload(prompt, history, False)
+                )
+            except httpx.TransportError as e:
+                raise _RetryableError(str(e))
+            self._check_status(response)
+            return response.json()["choices"][0]["message"]["content"]
+
+        return await self._with_resilience(call)
+
+    async def stream(self, prompt: str, history: list) -> AsyncIterator[str]:
+        # Retries only cover opening the stream; once tokens were forwarded they cannot be replayed
+        async def open_stream():
+            try:
+                request = self.http_client.build_request(
+                    "POST", self.config["endpoint"], headers=self.headers, json=self._payload(prompt, history, True)
+                )
+                response = await self.http_client.send(request, stream=True)
+            except httpx.TransportError as e:
+                raise _RetryableError(str(e))
+            try:
+                self._check_status(response)
+            except Exception:
+                await response.aclose()
+                raise
+            return response
+
+        response = await self._with_resilience(open_stream)
+        try:
+            async with self.semaphore:
+                # Server-Sent Events: one "data: {...}" line per delta, ended by "data: [DONE]"
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    payload = line[len("data:"):].strip()
+                    if payload == "[DONE]":
+                        break
+                    delta = json.loads(payload)["choices"][0].get("delta", {})
+                    if delta.get("content"):
+                        yield delta["content"]
+        except httpx.HTTPError as e:
+            raise Exception(f"{self.label} Error: {str(e)}")
+        finally:
+            await response.aclose()
+
+
+class GeminiProvider(BaseProvider):
+    label = "Gemini API"
+
+    def __init__(self, config: dict):
+        """
+        Gemini provider using the SDK's async calls.
+        """
+        super().__init__(config)
+        genai.configure(api_key=config["api_key"])
+        self.model = genai.GenerativeModel(
+            model_name="gemini-2.0-flash-exp",
+            generation_config={
+                "temperature": 1,
+                "top_p": 0.95,
+                "top_k": 40,
+                "max_output_tokens": 8192,
+            },
+        )
+
+    @staticmethod
+    def _classify(e: Exception) -> Exception:
+        # google.api_core exceptions carry the HTTP status as `code`
+        if getattr(e, "code", None) in RETRYABLE_STATUS_CODES:
+            return _RetryableError(str(e))
+        return e
+
+    async def generate(self, prompt: str, history: list) -> str:
+        async def call():
+            # Start a chat session per call so the provider can be shared across requests
+            chat_session = self.model.start_chat(history=to_gemini_history(history))
+            try:
+                response = await chat_session.send_message_async(prompt)
+            except Exception as e:
+                raise self._classify(e)
+            return response.text
+
+        return await self._with_resilience(call)
+
+    async def stream(self, prompt: str, history: list) -> AsyncIterator[str]:
+        async def open_stream():
+            chat_session = self.model.start_chat(history=to_gemini_history(history))
+            try:
+                return await chat_session.send_message_async(prompt, stream=True)
+            except Exception as e:
+                raise self._classify(e)
+
+        response = await self._with_resilience(open_stream)
+        try:
+            async with self.semaphore:
+                async for chunk in response:
+                    if chunk.text:
+                        yield chunk.text
+        except Exception as e:
+            raise Exception(f"{self.label} Error: {str(e)}")
+
+
+class FakeProvider(BaseProvider):
+    label = "Fake Model"
+
+    def __init__(self, config: dict):
+        """
+        Offline provider that echoes the prompt after a configurable latency.
+        """
+        super().__init__(config)
+
+    def _answer(self, prompt: str) -> str:
+        return f"Fake answer to: {prompt[:200]}"
+
+    async def generate(self, prompt: str, history: list) -> str:
+        async def call():
+            await asyncio.sleep(self.config["latency"])
+            return self._answer(prompt)
+
+        return await self._with_resilience(call)
+
+    async def stream(self, prompt: str, history: list) -> AsyncIterator[str]:
+        words = self._answer(prompt).split(" ")
+        async with self.semaphore:
+            for i, word in enumerate(words):
+                await asyncio.sleep(self.config["latency"] / len(words))
+                yield word if i == 0 else f" {word}"
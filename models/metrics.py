@@ -0,0 +1,212 @@
+# models/metrics.py
+import time
+from contextlib import nullcontext
+from config import METRICS_CONFIG
+
+# Latency buckets from sub-millisecond index lookups to multi-second model calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+class _NoopMetric:
+    """
+    Stands in for every metric when metrics are disabled.
+    """
+    def labels(self, *args, **kwargs) -> "_NoopMetric":
+        return self
+
+    def observe(self, value: float) -> None:
+        pass
+
+    def inc(self, amount: float = 1) -> None:
+        pass
+
+    def dec(self, amount: float = 1) -> None:
+        pass
+
+    def set(self, value: float) -> None:
+        pass
+
+
+if METRICS_CONFIG["enabled"]:
+    try:
+        import prometheus_client
+    except ImportError:
+        raise ImportError("The 'prometheus-client' package is required for metrics (or set METRICS_ENABLED=false).")
+
+    def _histogram(name: str, documentation: str, labels: list, buckets: tuple = LATENCY_BUCKETS):
+        return prometheus_client.Histogram(name, documentation, labels, buckets=buckets)
+
+    def _counter(name: str, documentation: str, labels: list):
+        return prometheus_client.Counter(name, documentation, labels)
+
+    def _gauge(name: str, documentation: str, labels: list):
+        return prometheus_client.Gauge(name, documentation, labels)
+else:
+    prometheus_client = None
+
+    def _histogram(name: str, documentation: str, labels: list, buckets: tuple = LATENCY_BUCKETS):
+        return _NoopMetric()
+
+    _counter = _gauge = _histogram
+
+if METRICS_CONFIG["tracing_enabled"]:
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        raise ImportError("The 'opentelemetry-api' package is required for tracing (or set TRACING_ENABLED=false).")
+    _tracer = trace.get_tracer(METRICS_CONFIG["service_name"])
+else:
+    _tracer = None
+
+# HTTP requests
+REQUESTS_IN_FLIGHT = _gauge("omnisearch_requests_in_flight", "HTTP requests being served", [])
+REQUEST_SECONDS = _histogram(
+    "omnisearch_request_duration_seconds", "HTTP request latency", ["route", "method", "status_code"]
+)
+
+# Query pipeline stages (cache_lookup, history, documents, web_search, generate, ...)
+STAGE_SECONDS = _histogram("omnisearch_stage_duration_seconds", "Query pipeline stage latency", ["stage", "status"])
+
+# Calls to model providers, Google Search and GCS
+EXTERNAL_CALL_SECONDS = _histogram(
+    "omnisearch_external_call_duration_seconds", "Latency of calls to external services", ["service", "outcome"]
+)
+
+# Embeddings and FAISS
+EMBEDDING_BATCH_SIZE = _histogram(
+    "omnisearch_embedding_batch_size", "Texts per embedding call", [], buckets=BATCH_BUCKETS
+)
+EMBEDDING_SECONDS = _histogram("omnisearch_embedding_duration_seconds", "Embedding call latency", ["outcome"])
+FAISS_SEARCH_SECONDS = _histogram(
+    "omnisearch_faiss_search_duration_seconds", "FAISS search latency", ["index_type", "outcome"]
+)
+FAISS_SEARCH_QUERIES = _histogram(
+    "omnisearch_faiss_search_queries", "Query vectors per FAISS search", ["index_type"], buckets=BATCH_BUCKETS
+)
+FAISS_INDEX_VECTORS = _gauge("omnisearch_faiss_index_vectors", "Vectors in the FAISS index", ["index_type"])
+
+# PDF fetch and extraction
+PDF_BYTES = _counter("omnisearch_pdf_bytes", "PDF bytes downloaded", [])
+PDF_PAGES = _counter("omnisearch_pdf_pages", "PDF pages extracted", [])
+PDF_SECONDS = _histogram("omnisearch_pdf_duration_seconds", "PDF download and extraction latency", ["phase", "outcome"])
+
+# Database round-trips
+DB_SECONDS = _histogram(
+    "omnisearch_db_duration_seconds", "Database round-trip latency", ["db_type", "operation", "outcome"]
+)
+
+
+class _Timer:
+    # A plain class rather than @contextmanager: it is entered several times per request
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels: dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc, traceback):
+        outcome = "ok" if exc_type is None else "error"
+        self.histogram.labels(**self.labels, outcome=outcome).observe(time.perf_counter() - self.start)
+
+
+def timer(histogram, **labels) -> _Timer:
+    """
+    Observe the duration of a with-block in `histogram`, labelled with `outcome` ok or error.
+    """
+    return _Timer(histogram, labels)
+
+
+def span(name: str, **attributes):
+    """
+    OpenTelemetry span around a block when tracing is enabled, otherwise a no-op.
+    """
+    if _tracer is None:
+        return nullcontext()
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        """
+        ASGI middleware recording in-flight requests and request latency per route template.
+        Streaming responses are measured until their last chunk is sent.
+        """
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            with span(f"{scope['method']} {scope['path']}"):
+                await self.app(scope, receive, send_with_status)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            # The router stores the matched route in the scope; unmatched paths share one label
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_SECONDS.labels(route=route, method=scope["method"], status_code=str(status["code"])).observe(
+                time.perf_counter() - start
+            )
+
+
+class CacheStatsCollector:
+    def __init__(self, registry, caches: dict):
+        """
+        Prometheus collector exporting the stats() counters of warm caches at scrape time,
+        so cache hits and misses cost nothing extra on the request path.
+        :param registry: HandlerRegistry the caches are read from.
+        :param caches: Mapping of handler name to the cache label it is exported under.
+        """
+        self.registry = registry
+        self.caches = caches
+
+    def collect(self):
+        from prometheus_client.core import GaugeMetricFamily
+
+        families = {}
+        status = self.registry.status()
+        for name, label in self.caches.items():
+            if status.get(name, {}).get("state") != "warm":
+                continue
+            stats = getattr(self.registry.get(name), "stats", None)
+            if not callable(stats):
+                continue
+            for key, value in stats().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    family = families.get(key)
+                    if family is None:
+                        family = families[key] = GaugeMetricFamily(
+                            f"omnisearch_cache_{key}", f"Cache stat '{key}'", labels=["cache"]
+                        )
+                    family.add_metric([label], value)
+        return list(families.values())
+
+
+def register_cache_collector(registry, caches: dict) -> None:
+    """
+    Export the caches' stats on /metrics.
+    """
+    if prometheus_client is not None:
+        prometheus_client.REGISTRY.register(CacheStatsCollector(registry, caches))
+
+
+def render_metrics() -> tuple:
+    """
+    :return: (body, content type) of the Prometheus text exposition.
+    """
+    if prometheus_client is None:
+        raise ValueError("Metrics are disabled (METRICS_ENABLED=false).")
+    return prometheus_client.generate_latest(), prometheus_client.CONTENT_TYPE_LATEST
@@ -1,66 +1,58 @@
-import os
-import google.generativeai as genai
+from typing import AsyncIterator
+import httpx
 from config import MODEL_CONFIG
+from models.llm_providers import DeepSeekProvider, FakeProvider, GeminiProvider, build_http_client
+from models.metrics import EXTERNAL_CALL_SECONDS, span, timer
 
 class ModelHandler:
-    def __init__(self, model_name: str):
+    def __init__(self, model_name: str, http_client: httpx.AsyncClient = None):
         """
         Initialize the model handler based on the selected model.
-        Supported models: 'deepseek', 'gemini'.
+        Supported models: 'deepseek', 'gemini', 'fake' (offline backend for tests).
+        :param http_client: Optional shared HTTP client for HTTP-based providers.
         """
         self.model_name = model_name
         self.config = MODEL_CONFIG.get(model_name)
         if not self.config:
             raise ValueError(f"Model '{model_name}' is not supported or misconfigured.")
 
-        # Configure Gemini if selected
-        if self.model_name == "gemini":
-            genai.configure(api_key=self.config["api_key"])
-            self.model = genai.GenerativeModel(
-                model_name="gemini-2.0-flash-exp",
-                generation_config={
-                    "temperature": 1,
-                    "top_p": 0.95,
-                    "top_k": 40,
-                    "max_output_tokens": 8192,
-                },
-            )
-            # Initialize chat session with empty history
-            self.chat_session = self.model.start_chat(history=[])
+        if self.model_name == "deepseek":
+            self.provider = DeepSeekProvider(self.config, http_client or build_http_client())
+        elif self.model_name == "gemini":
+            self.provider = GeminiProvider(self.config)
+        elif self.model_name == "fake":
+            self.provider = FakeProvider(self.config)
+        else:
+            raise ValueError(f"Unsupported model: {self.model_name}")
 
-    def generate_response(self, prompt: str, history: list) -> dict:
+    async def agenerate_response(self, prompt: str, history: list) -> dict:
         """
         Generate a response from the selected model.
         :param prompt: The user's query.
         :param history: Conversation history.
         :return: Model's response.
         """
-        if self.model_name == "deepseek":
-            headers = {
-                "Authorization": f"Bearer {self.config['api_key']}",
-                "Content-Type": "application/json"
-            }
-            data = {
-                "prompt": prompt,
-                "history": history
-            }
-            try:
-                response = requests.post(self.config['endpoint'], headers=headers, data=json.dumps(data))
-                response.raise_for_status()
-                return response.json()
-            except requests.exceptions.RequestException as e:
-                raise Exception(f"DeepSeek API Error: {str(e)}")
-        elif self.model_name == "gemini":
-            try:
-                # Send the user's prompt to the chat session
-                response = self.chat_session.send_message(prompt)
-                # Update the history with the new interaction
-                self.chat_session.history.extend([
-                    {"role": "user", "parts": [prompt]},
-                    {"role": "model", "parts": [response.text]},
-                ])
-                return {"answer": response.text}
-            except Exception as e:
-                raise Exception(f"Gemini API Error: {str(e)}")
-        else:
-            raise ValueError(f"Unsupported model: {self.model_name}")
\ No newline at end of file
+        with span("model.generate", model=self.model_name), timer(EXTERNAL_CALL_SECONDS, service=self.model_name):
+            return {"answer": await self.provider.generate(prompt, history)}
+
+    def astream_response(self, prompt: str, history: list) -> AsyncIterator[str]:
+        """
+        Generate a response from the selected model, yielding text as it arrives.
+        :param prompt: The user's query.
+        :param history: Conversation history.
+        :return: Async iterator over pieces of the model's answer.
+        """
+        return self._timed_stream(self.provider.stream(prompt, history))
+
+    async def _timed_stream(self, pieces: AsyncIterator[str]) -> AsyncIterator[str]:
+        # Measured until the last piece arrives. No span: its context could not be detached
+        # safely across the yields of an async generator
+        with timer(EXTERNAL_CALL_SECONDS, service=self.model_name):
+            async for piece in pieces:
+                yield piece
+
+    def stats(self) -> dict:
+        """
+        Return the provider's circuit breaker state.
+        """
+        return self.provider.stats()
@@ -0,0 +1,158 @@
+# models/mysql_pool.py
+import threading
+import time
+from contextlib import contextmanager
+from mysql.connector import pooling
+
+
+class MySQLPool:
+    def __init__(
+        self,
+        config: dict,
+        pool_size: int = 5,
+        acquire_timeout: float = 10.0,
+        health_check_interval: float = 30.0,
+        pool_name: str = "omnisearch",
+    ):
+        """
+        MySQL connection pool with blocking checkout, health checks and metrics.
+        :param config: Connection settings (host, user, password, database).
+        :param pool_size: Number of pooled connections.
+        :param acquire_timeout: Seconds to wait for a free connection before failing.
+        :param health_check_interval: Connections idle for longer than this are pinged
+            (and reconnected if needed) before being handed out.
+        :param pool_name: Name of the underlying mysql.connector pool.
+        """
+        self.pool_size = pool_size
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self._pool = pooling.MySQLConnectionPool(
+            pool_name=pool_name,
+            pool_size=pool_size,
+            pool_reset_session=True,
+            host=config["host"],
+            user=config["user"],
+            password=config["password"],
+            database=config["database"],
+        )
+        # mysql.connector raises immediately when the pool is exhausted, so callers
+        # queue on this semaphore instead
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._closed = False
+        self._last_used = {}
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            "in_use": 0,
+            "checkouts": 0,
+            "acquire_wait_ms_total": 0.0,
+            "acquire_wait_ms_max": 0.0,
+            "acquire_timeouts": 0,
+            "health_checks": 0,
+            "health_check_failures": 0,
+        }
+
+    @contextmanager
+    def connection(self):
+        """
+        Check out a healthy connection and return it to the pool afterwards.
+        """
+        if self._closed:
+            raise Exception("MySQL Pool Error: the pool is closed")
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            with self._metrics_lock:
+                self._metrics["acquire_timeouts"] += 1
+            raise Exception(f"MySQL Pool Error: no connection available after {self.acquire_timeout}s")
+        connection = None
+        healthy = False
+        try:
+            connection = self._pool.get_connection()
+            self._check_health(connection)
+            healthy = True
+            wait_ms = (time.perf_counter() - start) * 1000
+            with self._metrics_lock:
+                self._metrics["in_use"] += 1
+                self._metrics["checkouts"] += 1
+                self._metrics["acquire_wait_ms_total"] += wait_ms
+                self._metrics["acquire_wait_ms_max"] = max(self._metrics["acquire_wait_ms_max"], wait_ms)
+            try:
+                yield connection
+            finally:
+                with self._metrics_lock:
+                    self._metrics["in_use"] -= 1
+        finally:
+            if connection is not None:
+                key = self._connection_key(connection)
+                if healthy:
+                    self._last_used[key] = time.monotonic()
+                else:
+                    # Force a ping on the next checkout of this connection
+                    self._last_used.pop(key, None)
+                connection.close()  # Returns the connection to the pool
+            self._slots.release()
+
+    @staticmethod
+    def _connection_key(connection) -> int:
+        # Pooled connections are new wrappers on every checkout around a reused connection
+        return id(getattr(connection, "_cnx", connection))
+
+    def _check_health(self, connection) -> None:
+        last_used = self._last_used.get(self._connection_key(connection))
+        if last_used is not None and time.monotonic() - last_used < self.health_check_interval:
+            return
+        with self._metrics_lock:
+            self._metrics["health_checks"] += 1
+        try:
+            connection.ping(reconnect=True, attempts=2, delay=0)
+        except Exception:
+            with self._metrics_lock:
+                self._metrics["health_check_failures"] += 1
+            raise
+
+    def health_check(self) -> bool:
+        """
+        Ping one pooled connection.
+        """
+        with self.connection() as connection:
+            connection.ping(reconnect=True, attempts=1, delay=0)
+        return True
+
+    def metrics(self) -> dict:
+        """
+        Return pool usage metrics.
+        """
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        metrics["pool_size"] = self.pool_size
+        metrics["acquire_wait_ms_avg"] = (
+            metrics["acquire_wait_ms_total"] / metrics["checkouts"] if metrics["checkouts"] else 0.0
+        )
+        return metrics
+
+    def close(self) -> None:
+        """
+        Close the pooled connections. Connections in use are waited for up to acquire_timeout;
+        one still in use after that is returned to the pool without being closed.
+        Checkouts fail once the pool is closed.
+        """
+        with self._metrics_lock:
+            if self._closed:
+                return
+            self._closed = True
+        # Holding every slot keeps other threads from checking out connections in the meantime
+        held = 0
+        deadline = time.monotonic() + self.acquire_timeout
+        while held < self.pool_size and self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            held += 1
+        # A connection that is checked out and never returned is not handed out again,
+        # so each idle connection is taken from the pool and disconnected once
+        for _ in range(held):
+            try:
+                connection = self._pool.get_connection()
+            except Exception:
+                break  # Pool exhausted: connections still in use past the timeout
+            try:
+                connection.disconnect()
+            except Exception:
+                pass
+        self._last_used.clear()
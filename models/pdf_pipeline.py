@@ -0,0 +1,113 @@
+# models/pdf_pipeline.py
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Dict, List, Optional
+import PyPDF2
+from config import PDF_PIPELINE_CONFIG
+from models.metrics import PDF_BYTES, PDF_PAGES, PDF_SECONDS, timer
+
+
+def _count_pages(data: bytes) -> int:
+    """
+    Return the number of pages of a PDF (runs in a worker process).
+    """
+    return len(PyPDF2.PdfReader(BytesIO(data)).pages)
+
+
+def _extract_page_range(data: bytes, start: int, stop: int) -> List[str]:
+    """
+    Extract the text of pages [start, stop) of a PDF (runs in a worker process).
+    """
+    reader = PyPDF2.PdfReader(BytesIO(data))
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+class PdfPipeline:
+    def __init__(
+        self,
+        bucket,
+        max_concurrent_downloads: int = PDF_PIPELINE_CONFIG["max_concurrent_downloads"],
+        max_files_in_flight: int = PDF_PIPELINE_CONFIG["max_files_in_flight"],
+        max_workers: Optional[int] = PDF_PIPELINE_CONFIG["max_workers"],
+        pages_per_task: int = PDF_PIPELINE_CONFIG["pages_per_task"],
+        file_timeout: float = PDF_PIPELINE_CONFIG["file_timeout"],
+    ):
+        """
+        Bounded-concurrency PDF fetch and extraction pipeline.
+        Downloads run in threads, page extraction is fanned out over a process pool.
+        :param bucket: GCSBucket or LocalBucket the files are read from.
+        :param max_concurrent_downloads: Maximum downloads running at once.
+        :param max_files_in_flight: Maximum files downloaded or being parsed at once. Bounds the
+            PDF bytes held in memory; further files wait for a slot (backpressure).
+        :param max_workers: Size of the process pool (defaults to the CPU count).
+        :param pages_per_task: Pages extracted per process pool task.
+        :param file_timeout: Seconds allowed to download and extract one file.
+        """
+        self.bucket = bucket
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.pages_per_task = pages_per_task
+        self.file_timeout = file_timeout
+        self._download_semaphore = asyncio.Semaphore(max_concurrent_downloads)
+        self._in_flight_semaphore = asyncio.Semaphore(max_files_in_flight)
+        self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    async def _extract_pages(self, data: bytes) -> List[str]:
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        page_count = await loop.run_in_executor(executor, _count_pages, data)
+        tasks = [
+            loop.run_in_executor(executor, _extract_page_range, data, start, min(start + self.pages_per_task, page_count))
+            for start in range(0, page_count, self.pages_per_task)
+        ]
+        pages = []
+        for page_range in await asyncio.gather(*tasks):
+            pages.extend(page_range)
+        return pages
+
+    async def _fetch_pages(self, file_name: str, generation: Optional[str]) -> List[str]:
+        async with self._download_semaphore:
+            with timer(PDF_SECONDS, phase="download"):
+                data = await asyncio.to_thread(self.bucket.download_bytes, file_name, generation)
+        PDF_BYTES.inc(len(data))
+        with timer(PDF_SECONDS, phase="extract"):
+            pages = await self._extract_pages(data)
+        PDF_PAGES.inc(len(pages))
+        return pages
+
+    async def fetch_pages(self, file_name: str, generation: Optional[str] = None) -> List[str]:
+        """
+        Download a PDF and extract the text of each page without blocking the event loop.
+        """
+        async with self._in_flight_semaphore:
+            try:
+                return await asyncio.wait_for(self._fetch_pages(file_name, generation), timeout=self.file_timeout)
+            except asyncio.TimeoutError:
+                raise Exception(f"PDF Pipeline Error: '{file_name}' timed out after {self.file_timeout}s")
+
+    async def fetch_many(self, files: Dict[str, Optional[str]]) -> Dict[str, object]:
+        """
+        Fetch several PDFs concurrently.
+        :param files: Mapping of file name to generation (or None for the latest).
+        :return: Mapping of file name to its page texts, or to the exception it failed with.
+        """
+        names = list(files)
+        results = await asyncio.gather(
+            *(self.fetch_pages(name, files[name]) for name in names),
+            return_exceptions=True,
+        )
+        return dict(zip(names, results))
+
+    def close(self) -> None:
+        """
+        Shut down the process pool: pending extractions are cancelled and running ones waited for.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
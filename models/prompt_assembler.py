@@ -0,0 +1,197 @@
+# models/prompt_assembler.py
+import threading
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional
+from config import PROMPT_CONFIG
+from models.text_chunker import estimate_tokens, select_chunks, truncate_tokens
+
+
+class AssembledPrompt(NamedTuple):
+    """
+    A prompt built within the section token budgets.
+    """
+    prompt: str
+    history: list  # Recent turns sent to the model verbatim, newest first
+    references: dict  # What the prompt was built from, returned instead of the full prompt
+    shared_prompt: str  # The prompt without the user's history summary, safe to store in shared caches
+
+
+def _row_key(row: dict) -> tuple:
+    return (str(row.get("timestamp")), row.get("query"))
+
+
+class PromptAssembler:
+    def __init__(
+        self,
+        context_tokens: int = PROMPT_CONFIG["context_tokens"],
+        documents_tokens: int = PROMPT_CONFIG["documents_tokens"],
+        search_tokens: int = PROMPT_CONFIG["search_tokens"],
+        history_tokens: int = PROMPT_CONFIG["history_tokens"],
+        recent_turns: int = PROMPT_CONFIG["recent_turns"],
+        turn_tokens: int = PROMPT_CONFIG["turn_tokens"],
+        summary_tokens: int = PROMPT_CONFIG["summary_tokens"],
+        summary_turn_tokens: int = PROMPT_CONFIG["summary_turn_tokens"],
+        summary_max_users: int = PROMPT_CONFIG["summary_max_users"],
+    ):
+        """
+        Token-aware prompt assembly. Each prompt section has its own token budget: document
+        chunks are added in retrieval rank order until their budget is used, other sections are
+        truncated. The newest history turns are sent verbatim and older ones are compacted
+        into a rolling extractive summary that is cached per user and extended incrementally.
+        :param context_tokens: Budget of the request context.
+        :param documents_tokens: Budget of the retrieved document chunks.
+        :param search_tokens: Budget of the web search results.
+        :param history_tokens: Budget of the recent turns sent verbatim.
+        :param recent_turns: Newest turns sent verbatim. Older fetched turns are summarized.
+        :param turn_tokens: Budget of the query and of the answer of each recent turn.
+        :param summary_tokens: Budget of the history summary. The oldest summary lines are dropped first.
+        :param summary_turn_tokens: Budget of each summarized turn.
+        :param summary_max_users: Users whose summary is cached before the least recently used one is evicted.
+        """
+        self.context_tokens = context_tokens
+        self.documents_tokens = documents_tokens
+        self.search_tokens = search_tokens
+        self.history_tokens = history_tokens
+        self.recent_turns = recent_turns
+        self.turn_tokens = turn_tokens
+        self.summary_tokens = summary_tokens
+        self.summary_turn_tokens = summary_turn_tokens
+        self.summary_max_users = summary_max_users
+        self._summaries = OrderedDict()  # user_id -> (key of the newest summarized row, summary lines)
+        self._lock = threading.Lock()
+        self._stats = {"summary_hits": 0, "summary_extends": 0, "summary_builds": 0, "summary_evictions": 0}
+
+    def assemble(
+        self,
+        query: str,
+        context: str = "",
+        chunks: Optional[List[dict]] = None,
+        search_results: str = "",
+        history: Optional[list] = None,
+        user_id: Optional[str] = None,
+        external: bool = False,
+    ) -> AssembledPrompt:
+        """
+        Build the prompt and the history sent to the model.
+        :param query: The user's question, always included in full.
+        :param context: Context supplied with the request.
+        :param chunks: Retrieved chunk metadata entries (file_name, page_start, page_end, text, score, token_count), best first.
+        :param search_results: Web search result summary.
+        :param history: Conversation history rows, newest first.
+        :param user_id: Owner of the history, used to cache its summary.
+        :param external: Whether the documents and web search sections are part of the prompt.
+        """
+        context = truncate_tokens(context, self.context_tokens)
+        recent, summary = self._compact_history(user_id, history or [])
+        references = {"documents": [], "web_search": False, "history_turns": len(recent), "history_summarized": bool(summary)}
+
+        sections = []
+        if context:
+            sections.append(context)
+        user_sections = []
+        if summary:
+            user_sections.append("Earlier conversation (summary):\n" + summary)
+        shared_sections = []
+        if external:
+            selected = select_chunks(chunks or [], self.documents_tokens)
+            search_results = truncate_tokens(search_results, self.search_tokens)
+            references["documents"] = [
+                {key: chunk.get(key) for key in ("file_name", "page_start", "page_end", "score")} for chunk in selected
+            ]
+            references["web_search"] = bool(search_results)
+            documents = "\n".join(
+                f"[{chunk['file_name']} p.{chunk['page_start']}-{chunk['page_end']}]\n{chunk['text']}" for chunk in selected
+            )
+            shared_sections.append("Relevant Documents:\n" + documents + "\n\nGoogle Search Results:\n" + search_results)
+
+        def build(sections: list) -> str:
+            return f"{query}\n\nContext:\n" + "\n".join(sections) if sections else query
+
+        prompt = build(sections + user_sections + shared_sections)
+        return AssembledPrompt(prompt, recent, references, build(sections + shared_sections))
+
+    def _compact_history(self, user_id: Optional[str], history: list) -> tuple:
+        """
+        Split newest-first history into recent turns kept verbatim (within the history budget)
+        and a summary of the older ones.
+        :return: (recent rows, newest first; summary text)
+        """
+        recent = []
+        used_tokens = 0
+        for row in history[:self.recent_turns]:
+            row = dict(
+                row,
+                query=truncate_tokens(row.get("query") or "", self.turn_tokens),
+                response=truncate_tokens(row.get("response") or "", self.turn_tokens),
+            )
+            tokens = estimate_tokens(row["query"]) + estimate_tokens(row["response"])
+            if recent and used_tokens + tokens > self.history_tokens:
+                break
+            recent.append(row)
+            used_tokens += tokens
+        older = history[len(recent):]
+        if not older or self.summary_tokens <= 0:
+            return recent, ""
+        return recent, self._summary(user_id, older)
+
+    def _summary(self, user_id: Optional[str], older: list) -> str:
+        newest_key = _row_key(older[0])
+        with self._lock:
+            cached = self._summaries.get(user_id) if user_id is not None else None
+        if cached is not None and cached[0] == newest_key:
+            lines = cached[1]
+            self._count("summary_hits")
+        else:
+            # Extend the cached summary with the turns that aged out since it was built
+            keys = [_row_key(row) for row in older]
+            if cached is not None and cached[0] in keys:
+                new_rows = older[:keys.index(cached[0])]
+                lines = list(cached[1])
+                self._count("summary_extends")
+            else:
+                new_rows = older
+                lines = []
+                self._count("summary_builds")
+            lines.extend(self._summarize_turn(row) for row in reversed(new_rows))
+            lines = self._fit_summary(lines)
+            if user_id is not None:
+                self._remember(user_id, (newest_key, lines))
+        return "\n".join(lines)
+
+    def _summarize_turn(self, row: dict) -> str:
+        query_tokens = max(1, self.summary_turn_tokens // 3)
+        query = truncate_tokens(" ".join((row.get("query") or "").split()), query_tokens)
+        response = truncate_tokens(
+            " ".join((row.get("response") or "").split()), max(1, self.summary_turn_tokens - query_tokens)
+        )
+        return f"- User asked: {query} / Answer: {response}"
+
+    def _fit_summary(self, lines: List[str]) -> List[str]:
+        # Keep the newest lines within the summary budget
+        kept = []
+        used_tokens = 0
+        for line in reversed(lines):
+            used_tokens += estimate_tokens(line)
+            if used_tokens > self.summary_tokens:
+                break
+            kept.append(line)
+        return kept[::-1]
+
+    def _remember(self, user_id: str, entry: tuple) -> None:
+        with self._lock:
+            self._summaries[user_id] = entry
+            self._summaries.move_to_end(user_id)
+            while len(self._summaries) > self.summary_max_users:
+                self._summaries.popitem(last=False)
+                self._stats["summary_evictions"] += 1
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self) -> dict:
+        """
+        Return summary cache counters and the number of cached summaries.
+        """
+        with self._lock:
+            return dict(self._stats, summaries=len(self._summaries))
@@ -0,0 +1,47 @@
+# models/reranker.py
+from config import RETRIEVAL_CONFIG
+
+
+class CrossEncoderReranker:
+    def __init__(
+        self,
+        model_name: str = RETRIEVAL_CONFIG["reranker_model"],
+        top_n: int = RETRIEVAL_CONFIG["reranker_top_n"],
+        batch_size: int = RETRIEVAL_CONFIG["reranker_batch_size"],
+    ):
+        """
+        CPU cross-encoder that re-scores the best fused candidates of a query.
+        :param model_name: Sentence-transformers CrossEncoder model.
+        :param top_n: Candidates re-scored per query. The rest keep their fused order behind them.
+        :param batch_size: (query, passage) pairs scored per forward pass.
+        """
+        from sentence_transformers import CrossEncoder
+
+        self.model = CrossEncoder(model_name, device="cpu")
+        self.top_n = top_n
+        self.batch_size = batch_size
+
+    def rerank(self, query: str, chunks: list) -> list:
+        """
+        Re-order the first top_n chunks by cross-encoder relevance.
+        :param chunks: Chunk metadata entries, best first.
+        :return: The chunks, with the re-scored ones first and their `score` set to the cross-encoder score.
+        """
+        return self.rerank_many([query], [chunks])[0]
+
+    def rerank_many(self, queries: list, chunk_lists: list) -> list:
+        """
+        Batched version of rerank: the candidates of all queries are scored together.
+        """
+        pairs = [
+            (query, chunk["text"]) for query, chunks in zip(queries, chunk_lists) for chunk in chunks[:self.top_n]
+        ]
+        if not pairs:
+            return [list(chunks) for chunks in chunk_lists]
+        scores = iter(self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False))
+        results = []
+        for chunks in chunk_lists:
+            head = [dict(chunk, score=float(next(scores))) for chunk in chunks[:self.top_n]]
+            head.sort(key=lambda chunk: chunk["score"], reverse=True)
+            results.append(head + list(chunks[self.top_n:]))
+        return results
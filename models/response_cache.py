@@ -0,0 +1,151 @@
+# models/response_cache.py
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Optional
+import faiss
+import numpy as np
+from sentence_transformers import SentenceTransformer
+from config import RESPONSE_CACHE_CONFIG
+from models.faiss_handler import check_faiss_version
+
+# Lookups restrict the search to one partition with an IDSelector, which needs faiss 1.8.0+
+check_faiss_version()
+
+
+def context_fingerprint(context: str, file_versions: dict, user_id: Optional[str] = None) -> str:
+    """
+    Fingerprint of everything besides the prompt that shapes an answer.
+    :param context: Context text supplied with the request.
+    :param file_versions: Mapping of referenced GCS file name to its indexed generation (or None).
+    :param user_id: User whose conversation history the answer was built from, if any. Answers
+        built from history are only reused for the same user.
+    """
+    payload = json.dumps(
+        {"context": context or "", "files": sorted(file_versions.items()), "user_id": user_id}, sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SemanticResponseCache:
+    def __init__(
+        self,
+        embedding_model: SentenceTransformer,
+        similarity_threshold: float = RESPONSE_CACHE_CONFIG["similarity_threshold"],
+        max_entries: int = RESPONSE_CACHE_CONFIG["max_entries"],
+        ttl: float = RESPONSE_CACHE_CONFIG["ttl"],
+    ):
+        """
+        Cache of model answers looked up by prompt similarity.
+        Entries only match requests with the same context fingerprint and model, and a
+        prompt whose cosine similarity to the cached prompt is at least the threshold.
+        :param embedding_model: Shared sentence transformer used for document retrieval.
+        :param similarity_threshold: Minimum cosine similarity for a hit.
+        :param max_entries: Entries kept before the least recently used one is evicted.
+        :param ttl: Seconds an entry stays valid.
+        """
+        self.model = embedding_model
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # Inner product over normalized embeddings is cosine similarity
+        self.index = faiss.IndexIDMap(faiss.IndexFlatIP(embedding_model.get_sentence_embedding_dimension()))
+        self._entries = OrderedDict()  # id -> entry, least recently used first
+        self._partitions = {}  # (fingerprint, model_name) -> set of ids
+        self._expiry = deque()  # (expires_at, id) in insertion order, which is also expiry order
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expirations": 0}
+
+    def _embed(self, prompts: list) -> np.ndarray:
+        return np.asarray(self.model.encode(prompts, normalize_embeddings=True), dtype="float32")
+
+    def lookup(self, prompt: str, fingerprint: str, model_name: str) -> Optional[dict]:
+        """
+        Return the cached entry (answer, context, similarity) for a similar prompt, or None.
+        """
+        return self.lookup_many([(prompt, fingerprint, model_name)])[0]
+
+    def lookup_many(self, lookups: list) -> list:
+        """
+        Batched version of lookup: all prompts are embedded in one encode call.
+        :param lookups: (prompt, fingerprint, model_name) tuples.
+        :return: One cached entry or None per lookup.
+        """
+        if not lookups:
+            return []
+        embeddings = self._embed([prompt for prompt, _, _ in lookups])
+        with self._lock:
+            self._purge_expired()
+            return [
+                self._lookup_embedding(embedding[None, :], (fingerprint, model_name))
+                for embedding, (_, fingerprint, model_name) in zip(embeddings, lookups)
+            ]
+
+    def _lookup_embedding(self, embedding: np.ndarray, key: tuple) -> Optional[dict]:
+        ids = self._partitions.get(key)
+        if not ids:
+            self._stats["misses"] += 1
+            return None
+        params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(np.fromiter(ids, dtype="int64")))
+        similarities, indices = self.index.search(embedding, 1, params=params)
+        entry_id, similarity = int(indices[0][0]), float(similarities[0][0])
+        if entry_id == -1 or similarity < self.similarity_threshold:
+            self._stats["misses"] += 1
+            return None
+        self._entries.move_to_end(entry_id)
+        self._stats["hits"] += 1
+        entry = self._entries[entry_id]
+        return {"answer": entry["answer"], "context": entry["context"], "similarity": similarity}
+
+    def store(self, prompt: str, fingerprint: str, model_name: str, answer: str, context: dict) -> None:
+        """
+        Add an answer to the cache.
+        :param context: The prompt the answer was generated from and its references.
+        """
+        embedding = self._embed([prompt])
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self.index.add_with_ids(embedding, np.array([entry_id], dtype="int64"))
+            key = (fingerprint, model_name)
+            self._entries[entry_id] = {
+                "key": key,
+                "answer": answer,
+                "context": context,
+                "expires_at": time.monotonic() + self.ttl,
+            }
+            self._partitions.setdefault(key, set()).add(entry_id)
+            self._expiry.append((self._entries[entry_id]["expires_at"], entry_id))
+            self._stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def _purge_expired(self) -> None:
+        now = time.monotonic()
+        while self._expiry and self._expiry[0][0] <= now:
+            _, entry_id = self._expiry.popleft()
+            if entry_id in self._entries:  # Not evicted already
+                self._remove(entry_id)
+                self._stats["expirations"] += 1
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        partition = self._partitions.get(entry["key"])
+        partition.discard(entry_id)
+        if not partition:
+            del self._partitions[entry["key"]]
+        self.index.remove_ids(np.array([entry_id], dtype="int64"))
+
+    def stats(self) -> dict:
+        """
+        Return hit/miss counters, the hit ratio and the number of cached entries.
+        """
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries))
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
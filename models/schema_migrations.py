@@ -0,0 +1,364 @@
+# models/schema_migrations.py
+"""
+Versioned schema migrations of the conversation history table.
+
+Applied versions are recorded in a `schema_migrations` table next to the history table.
+Every migration is idempotent, so a store created by hand from the files in SQL/ is brought
+to the current schema without errors. Run from the command line before deploying:
+
+    python -m models.schema_migrations mysql --dry-run
+    python -m models.schema_migrations mysql
+"""
+import datetime
+from contextlib import contextmanager
+from typing import Callable, List, NamedTuple
+from config import HISTORY_SCHEMA_CONFIG
+
+HISTORY_INDEX = "idx_history_user_timestamp"
+
+
+class Migration(NamedTuple):
+    """
+    One schema change. `apply` receives the backend of the store being migrated.
+    """
+    version: int
+    description: str
+    apply: Callable
+
+
+# MySQL
+
+def _mysql_create_table(backend) -> None:
+    backend.execute("""
+        CREATE TABLE IF NOT EXISTS conversation_history (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            user_id VARCHAR(128) NOT NULL,
+            query TEXT NOT NULL,
+            response TEXT NOT NULL,
+            timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_history_user_timestamp (user_id, timestamp)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+
+
+def _mysql_user_id_varchar(backend) -> None:
+    # Tables created from the original SQL file declare user_id as INT while the API uses strings.
+    # This rebuilds the table, which blocks writes while it runs.
+    rows = backend.query("""
+        SELECT data_type FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = 'conversation_history' AND column_name = 'user_id'
+    """)
+    data_type = rows[0][0] if rows else None
+    if isinstance(data_type, (bytes, bytearray)):
+        data_type = data_type.decode()
+    if data_type is not None and data_type.lower() != "varchar":
+        backend.execute("ALTER TABLE conversation_history MODIFY user_id VARCHAR(128) NOT NULL")
+
+
+def _mysql_history_index(backend) -> None:
+    # InnoDB appends the primary key to secondary indexes, so this also serves the (timestamp, id) keyset order
+    rows = backend.query(
+        """
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = 'conversation_history' AND index_name = %s
+        """,
+        (HISTORY_INDEX,),
+    )
+    if not rows:
+        backend.execute(
+            f"ALTER TABLE conversation_history ADD INDEX {HISTORY_INDEX} (user_id, timestamp), ALGORITHM=INPLACE, LOCK=NONE"
+        )
+
+
+MYSQL_MIGRATIONS = [
+    Migration(1, "create conversation_history", _mysql_create_table),
+    Migration(2, "store user_id as VARCHAR", _mysql_user_id_varchar),
+    Migration(3, f"add index {HISTORY_INDEX} (user_id, timestamp)", _mysql_history_index),
+]
+
+
+# BigQuery
+
+def _bigquery_partitioned_table(backend) -> None:
+    """
+    Create the history table partitioned by DATE(timestamp) and clustered by user_id.
+    Partitioning cannot be added to an existing table, so an unpartitioned table is copied
+    into a new one, which then takes its name; the original is kept as
+    conversation_history_unpartitioned. Stop writers and let the streaming buffer drain
+    before running this on an existing table.
+    """
+    from google.api_core.exceptions import NotFound
+
+    table_id = backend.table("conversation_history")
+    try:
+        table = backend.client.get_table(table_id)
+    except NotFound:
+        backend.execute(f"""
+            CREATE TABLE `{table_id}` (
+                id INT64,
+                user_id STRING NOT NULL,
+                query STRING NOT NULL,
+                response STRING NOT NULL,
+                timestamp TIMESTAMP NOT NULL
+            )
+            PARTITION BY DATE(timestamp)
+            CLUSTER BY user_id
+        """)
+        return
+    user_id_type = next(field.field_type for field in table.schema if field.name == "user_id")
+    if table.time_partitioning is not None and table.clustering_fields == ["user_id"] and user_id_type == "STRING":
+        return
+    migrated_id = backend.table("conversation_history_migrated")
+    backend.execute(f"""
+        CREATE TABLE `{migrated_id}`
+        PARTITION BY DATE(timestamp)
+        CLUSTER BY user_id
+        AS SELECT id, CAST(user_id AS STRING) AS user_id, query, response, timestamp FROM `{table_id}`
+    """)
+    backend.execute(f"ALTER TABLE `{table_id}` RENAME TO conversation_history_unpartitioned")
+    backend.execute(f"ALTER TABLE `{migrated_id}` RENAME TO conversation_history")
+
+
+def _bigquery_backfill_ids(backend) -> None:
+    """
+    Give rows written before inserts assigned ids a random id in the same non-negative INT64
+    range. History pages are ordered by (timestamp, id), and identical rows without one would
+    share a sort key and be skipped or repeated across pages. DML cannot change rows still in
+    the streaming buffer; rows without an id are older than it.
+    """
+    backend.execute(f"""
+        UPDATE `{backend.table("conversation_history")}`
+        SET id = FARM_FINGERPRINT(GENERATE_UUID()) & 0x7FFFFFFFFFFFFFFF
+        WHERE id IS NULL
+    """)
+
+
+BIGQUERY_MIGRATIONS = [
+    Migration(1, "partition conversation_history by DATE(timestamp), cluster by user_id", _bigquery_partitioned_table),
+    Migration(2, "backfill ids of conversation_history rows written without one", _bigquery_backfill_ids),
+]
+
+
+# SQLite
+
+def _sqlite_create_table(backend) -> None:
+    backend.execute("""
+        CREATE TABLE IF NOT EXISTS conversation_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            query TEXT NOT NULL,
+            response TEXT NOT NULL,
+            timestamp TEXT NOT NULL
+        )
+    """)
+
+
+def _sqlite_history_index(backend) -> None:
+    backend.execute(f"CREATE INDEX IF NOT EXISTS {HISTORY_INDEX} ON conversation_history (user_id, timestamp)")
+
+
+SQLITE_MIGRATIONS = [
+    Migration(1, "create conversation_history", _sqlite_create_table),
+    Migration(2, f"add index {HISTORY_INDEX} (user_id, timestamp)", _sqlite_history_index),
+]
+
+
+class _MySQLBackend:
+    def __init__(self, pool, lock_timeout: int):
+        self.pool = pool
+        self.lock_timeout = lock_timeout
+        self.connection = None
+        self.cursor = None
+
+    @contextmanager
+    def session(self):
+        # A named lock keeps concurrently starting processes from migrating at the same time
+        with self.pool.connection() as connection:
+            self.connection = connection
+            self.cursor = connection.cursor()
+            try:
+                self.cursor.execute("SELECT GET_LOCK('omnisearch_schema_migrations', %s)", (self.lock_timeout,))
+                if self.cursor.fetchone()[0] != 1:
+                    raise Exception("timed out waiting for the migration lock held by another process.")
+                try:
+                    self.execute("""
+                        CREATE TABLE IF NOT EXISTS schema_migrations (
+                            version INT PRIMARY KEY,
+                            description VARCHAR(255) NOT NULL,
+                            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+                        )
+                    """)
+                    yield self
+                finally:
+                    self.cursor.execute("SELECT RELEASE_LOCK('omnisearch_schema_migrations')")
+                    self.cursor.fetchall()
+            finally:
+                self.cursor.close()
+                self.connection = self.cursor = None
+
+    def execute(self, statement: str, params: tuple = ()) -> None:
+        self.cursor.execute(statement, params)
+
+    def query(self, statement: str, params: tuple = ()) -> list:
+        self.cursor.execute(statement, params)
+        return self.cursor.fetchall()
+
+    def applied_versions(self) -> set:
+        return {row[0] for row in self.query("SELECT version FROM schema_migrations")}
+
+    def record(self, migration: Migration) -> None:
+        self.execute(
+            "INSERT IGNORE INTO schema_migrations (version, description) VALUES (%s, %s)",
+            (migration.version, migration.description),
+        )
+        self.connection.commit()
+
+
+class _BigQueryBackend:
+    def __init__(self, client, project_id: str, dataset_id: str):
+        self.client = client
+        self.project_id = project_id
+        self.dataset_id = dataset_id
+
+    def table(self, name: str) -> str:
+        return f"{self.project_id}.{self.dataset_id}.{name}"
+
+    @contextmanager
+    def session(self):
+        self.execute(f"""
+            CREATE TABLE IF NOT EXISTS `{self.table("schema_migrations")}` (
+                version INT64 NOT NULL,
+                description STRING NOT NULL,
+                applied_at TIMESTAMP NOT NULL
+            )
+        """)
+        yield self
+
+    def execute(self, statement: str, params: list = None) -> None:
+        from google.cloud import bigquery
+
+        self.client.query(statement, job_config=bigquery.QueryJobConfig(query_parameters=params or [])).result()
+
+    def applied_versions(self) -> set:
+        rows = self.client.query(f"SELECT version FROM `{self.table('schema_migrations')}`").result()
+        return {row["version"] for row in rows}
+
+    def record(self, migration: Migration) -> None:
+        from google.cloud import bigquery
+
+        self.execute(
+            f"INSERT INTO `{self.table('schema_migrations')}` (version, description, applied_at) "
+            "VALUES (@version, @description, CURRENT_TIMESTAMP())",
+            [
+                bigquery.ScalarQueryParameter("version", "INT64", migration.version),
+                bigquery.ScalarQueryParameter("description", "STRING", migration.description),
+            ],
+        )
+
+
+class _SQLiteBackend:
+    def __init__(self, connect: Callable):
+        self.connect = connect
+        self.connection = None
+
+    @contextmanager
+    def session(self):
+        self.connection = self.connect()
+        try:
+            with self.connection:
+                self.execute("""
+                    CREATE TABLE IF NOT EXISTS schema_migrations (
+                        version INTEGER PRIMARY KEY,
+                        description TEXT NOT NULL,
+                        applied_at TEXT NOT NULL
+                    )
+                """)
+            yield self
+        finally:
+            self.connection.close()
+            self.connection = None
+
+    def execute(self, statement: str, params: tuple = ()) -> None:
+        self.connection.execute(statement, params)
+
+    def applied_versions(self) -> set:
+        return {row[0] for row in self.connection.execute("SELECT version FROM schema_migrations").fetchall()}
+
+    def record(self, migration: Migration) -> None:
+        self.execute(
+            "INSERT OR IGNORE INTO schema_migrations (version, description, applied_at) VALUES (?, ?, ?)",
+            (migration.version, migration.description, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")),
+        )
+        self.connection.commit()
+
+
+class SchemaMigrator:
+    def __init__(self, handler, lock_timeout: int = HISTORY_SCHEMA_CONFIG["migration_lock_timeout"]):
+        """
+        Apply the pending migrations of a database handler's history store.
+        :param handler: DatabaseHandler whose connection pool or client is used.
+        :param lock_timeout: Seconds to wait for a migration running in another process (MySQL).
+        """
+        if handler.db_type == "mysql":
+            self.backend = _MySQLBackend(handler.mysql_pool, lock_timeout)
+            self.migrations = MYSQL_MIGRATIONS
+        elif handler.db_type == "bigquery":
+            self.backend = _BigQueryBackend(
+                handler.bigquery_client, handler.config["project_id"], handler.config["dataset_id"]
+            )
+            self.migrations = BIGQUERY_MIGRATIONS
+        elif handler.db_type == "sqlite":
+            self.backend = _SQLiteBackend(handler._connect_sqlite)
+            self.migrations = SQLITE_MIGRATIONS
+        else:
+            raise ValueError(f"Unsupported database type: {handler.db_type}")
+
+    def pending(self) -> List[Migration]:
+        """
+        Return the migrations not applied yet, in order.
+        """
+        with self.backend.session() as backend:
+            return self._pending(backend)
+
+    def _pending(self, backend) -> List[Migration]:
+        applied = backend.applied_versions()
+        return [migration for migration in self.migrations if migration.version not in applied]
+
+    def migrate(self, dry_run: bool = False) -> List[Migration]:
+        """
+        Apply the pending migrations in order.
+        :param dry_run: Only report what would be applied.
+        :return: The migrations applied (or pending, for a dry run).
+        """
+        try:
+            with self.backend.session() as backend:
+                pending = self._pending(backend)
+                if dry_run:
+                    return pending
+                for migration in pending:
+                    migration.apply(backend)
+                    backend.record(migration)
+                return pending
+        except Exception as e:
+            raise Exception(f"Schema Migration Error: {str(e)}")
+
+
+if __name__ == "__main__":
+    import argparse
+    from models.database_handler import DatabaseHandler
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("db_type", choices=["mysql", "bigquery", "sqlite"])
+    parser.add_argument("--dry-run", action="store_true", help="List pending migrations without applying them")
+    args = parser.parse_args()
+
+    handler = DatabaseHandler(args.db_type, write_behind=False, auto_migrate=False)
+    try:
+        migrations = SchemaMigrator(handler).migrate(dry_run=args.dry_run)
+    finally:
+        handler.close()
+    verb = "pending" if args.dry_run else "applied"
+    for migration in migrations:
+        print(f"{verb}: {migration.version:03d} {migration.description}")
+    if not migrations:
+        print("schema is up to date")
@@ -0,0 +1,107 @@
+# models/search_cache.py
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable
+from config import GOOGLE_SEARCH_CONFIG
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a search query so trivially different spellings share a cache entry
+    (Unicode form, case and whitespace).
+    """
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", query)).strip().casefold()
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SearchResultCache:
+    def __init__(
+        self,
+        max_entries: int = GOOGLE_SEARCH_CONFIG["cache_max_entries"],
+        ttl: float = GOOGLE_SEARCH_CONFIG["cache_ttl"],
+    ):
+        """
+        LRU/TTL cache of web search results keyed on the normalized query.
+        Concurrent misses for the same key are coalesced into a single fetch (single-flight).
+        :param max_entries: Queries kept before the least recently used one is evicted.
+        :param ttl: Seconds a result stays valid.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, result), least recently used first
+        self._in_flight = {}  # key -> _Flight
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "api_calls": 0, "errors": 0, "evictions": 0}
+
+    def get_or_fetch(self, query: str, fetch: Callable[[str], str]) -> str:
+        """
+        Return the cached result for `query`, or call `fetch(query)` once and cache its result.
+        Failed fetches are not cached; their error is raised to every coalesced caller.
+        """
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return entry[1]
+                del self._entries[key]
+            flight = self._in_flight.get(key)
+            if flight is not None:
+                self._stats["coalesced"] += 1
+                leader = False
+            else:
+                flight = self._in_flight[key] = _Flight()
+                self._stats["misses"] += 1
+                self._stats["api_calls"] += 1
+                leader = True
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fetch(query)
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+        else:
+            with self._lock:
+                self._entries[key] = (time.monotonic() + self.ttl, flight.result)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self._stats["evictions"] += 1
+            return flight.result
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            flight.done.set()
+
+    def stats(self) -> dict:
+        """
+        Return hit/miss counters, the hit ratio and the number of API calls saved.
+        """
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries))
+        lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_ratio"] = (stats["hits"] + stats["coalesced"]) / lookups if lookups else 0.0
+        # Each hit or coalesced call is one paid Custom Search request not made
+        stats["quota_saved"] = stats["hits"] + stats["coalesced"]
+        return stats
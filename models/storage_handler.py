@@ -1,14 +1,19 @@
 # models/storage_handler.py
+from typing import Callable, Optional
 from google.cloud import storage
 from config import GCS_CONFIG
+from models.metrics import EXTERNAL_CALL_SECONDS, timer
 
 class StorageHandler:
-    def __init__(self):
+    def __init__(self, client: storage.Client = None, on_upload: Optional[Callable[[str], None]] = None):
         """
         Initialize the Google Cloud Storage handler.
+        :param client: Optional shared GCS client. A new one is created if not provided.
+        :param on_upload: Optional callback receiving the name of each uploaded file (e.g. to queue it for ingestion).
         """
         self.bucket_name = GCS_CONFIG["bucket_name"]
-        self.client = storage.Client.from_service_account_json(GCS_CONFIG["credentials_path"])
+        self.client = client or storage.Client.from_service_account_json(GCS_CONFIG["credentials_path"])
+        self.on_upload = on_upload
 
     def upload_file(self, file_path: str, destination_name: str) -> str:
         """
@@ -18,12 +23,15 @@ class StorageHandler:
         :return: Public URL of the uploaded file.
         """
         try:
-            bucket = self.client.bucket(self.bucket_name)
-            blob = bucket.blob(destination_name)
-            blob.upload_from_filename(file_path)
-            return blob.public_url
+            with timer(EXTERNAL_CALL_SECONDS, service="gcs_upload"):
+                bucket = self.client.bucket(self.bucket_name)
+                blob = bucket.blob(destination_name)
+                blob.upload_from_filename(file_path)
         except Exception as e:
             raise Exception(f"GCS Upload Error: {str(e)}")
+        if self.on_upload is not None:
+            self.on_upload(destination_name)
+        return blob.public_url
 
     def download_file(self, source_name: str, destination_path: str) -> str:
         """
@@ -33,9 +41,10 @@ class StorageHandler:
         :return: Path to the downloaded file.
         """
         try:
-            bucket = self.client.bucket(self.bucket_name)
-            blob = bucket.blob(source_name)
-            blob.download_to_filename(destination_path)
+            with timer(EXTERNAL_CALL_SECONDS, service="gcs_download"):
+                bucket = self.client.bucket(self.bucket_name)
+                blob = bucket.blob(source_name)
+                blob.download_to_filename(destination_path)
             return destination_path
         except Exception as e:
             raise Exception(f"GCS Download Error: {str(e)}")
\ No newline at end of file
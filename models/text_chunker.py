@@ -0,0 +1,129 @@
+# models/text_chunker.py
+import re
+from functools import lru_cache
+from typing import Callable, Iterable, Iterator, List, NamedTuple
+
+# Words and individual punctuation marks, a close approximation of word-piece token counts
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+class TextChunk(NamedTuple):
+    """
+    A token-bounded slice of a document.
+    """
+    text: str
+    page_start: int  # 1-based page the chunk starts on
+    page_end: int  # 1-based page the chunk ends on
+    token_count: int
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens in a text.
+    """
+    return len(_TOKEN_PATTERN.findall(text or ""))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cut a text after its first `max_tokens` estimated tokens. Truncated texts end with an ellipsis.
+    """
+    if max_tokens <= 0:
+        return ""
+    for count, match in enumerate(_TOKEN_PATTERN.finditer(text or ""), start=1):
+        if count == max_tokens:
+            end = match.end()
+            return text if not _TOKEN_PATTERN.search(text, end) else text[:end] + " …"
+    return text or ""
+
+
+def select_chunks(chunks: List[dict], token_budget: int) -> List[dict]:
+    """
+    Keep the chunks that fit within a token budget, in order.
+    Chunks arrive ranked best first by retrieval (a higher score is not always better:
+    flat_l2 scores are distances); chunks that no longer fit are dropped.
+    """
+    selected = []
+    used_tokens = 0
+    for chunk in chunks:
+        tokens = chunk.get("token_count") or estimate_tokens(chunk["text"])
+        if used_tokens + tokens > token_budget:
+            continue
+        selected.append(chunk)
+        used_tokens += tokens
+    return selected
+
+
+def tokenizer_counter(tokenizer) -> Callable[[str], int]:
+    """
+    Count the tokens of a word with a model's own tokenizer (e.g. MiniLM's WordPiece),
+    without special tokens. Counts are cached per word.
+    """
+    @lru_cache(maxsize=100_000)
+    def count_tokens(word: str) -> int:
+        return len(tokenizer.tokenize(word))
+
+    return count_tokens
+
+
+def chunk_pages(
+    pages: Iterable[str],
+    chunk_tokens: int = 200,
+    overlap_tokens: int = 40,
+    count_tokens: Callable[[str], int] = estimate_tokens,
+) -> Iterator[TextChunk]:
+    """
+    Split a stream of page texts into overlapping, token-bounded chunks.
+    Pages are consumed lazily, so a whole document never has to be held as one string.
+    Every chunk contains tokens beyond the overlap carried from the previous one.
+    :param pages: Page texts in order.
+    :param chunk_tokens: Maximum tokens per chunk (a single oversized word is kept whole).
+    :param overlap_tokens: Tokens repeated at the start of the next chunk.
+    :param count_tokens: Token count of one word; pass tokenizer_counter(model.tokenizer)
+        to bound chunks by the embedding model's own tokens.
+    """
+    if chunk_tokens <= 0:
+        raise ValueError("chunk_tokens must be positive.")
+    if not 0 <= overlap_tokens < chunk_tokens:
+        raise ValueError("overlap_tokens must be between 0 and chunk_tokens.")
+
+    window = []  # (word, page_number, tokens)
+    window_tokens = 0
+    new_tokens = 0  # Tokens not yet emitted in any chunk
+    for page_number, page_text in enumerate(pages, start=1):
+        for word in (page_text or "").split():
+            tokens = max(1, count_tokens(word))
+            if window and window_tokens + tokens > chunk_tokens:
+                if new_tokens:
+                    yield _make_chunk(window, window_tokens)
+                    window, window_tokens = _overlap_tail(window, overlap_tokens)
+                    new_tokens = 0
+                # Drop carried overlap the word does not fit next to, so no chunk is overlap only
+                while window and window_tokens + tokens > chunk_tokens:
+                    window_tokens -= window.pop(0)[2]
+            window.append((word, page_number, tokens))
+            window_tokens += tokens
+            new_tokens += tokens
+    if new_tokens:
+        yield _make_chunk(window, window_tokens)
+
+
+def _make_chunk(window: list, window_tokens: int) -> TextChunk:
+    return TextChunk(
+        text=" ".join(word for word, _, _ in window),
+        page_start=window[0][1],
+        page_end=window[-1][1],
+        token_count=window_tokens,
+    )
+
+
+def _overlap_tail(window: list, overlap_tokens: int) -> tuple:
+    tail = []
+    tail_tokens = 0
+    for item in reversed(window):
+        if tail_tokens + item[2] > overlap_tokens:
+            break
+        tail.append(item)
+        tail_tokens += item[2]
+    tail.reverse()
+    return tail, tail_tokens
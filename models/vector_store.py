@@ -0,0 +1,362 @@
+# models/vector_store.py
+import json
+import os
+import sqlite3
+import threading
+from typing import Callable, Iterable, Optional
+import numpy as np
+from sentence_transformers import SentenceTransformer
+from config import RETRIEVAL_CONFIG
+from models.bm25_index import BM25Index, reciprocal_rank_fusion
+from models.bucket_handler import BlobInfo
+from models.faiss_handler import FaissHandler
+from models.text_chunker import chunk_pages, estimate_tokens, tokenizer_counter
+
+# Bumped whenever the layout of the sidecar or the meaning of its vectors changes
+METADATA_VERSION = 3
+
+CHUNK_COLUMNS = ("file_name", "chunk", "page_start", "page_end", "token_count", "text")
+
+
+class DocumentVectorStore:
+    def __init__(
+        self,
+        store_dir: str,
+        embedding_model: SentenceTransformer = None,
+        chunk_tokens: int = RETRIEVAL_CONFIG["chunk_tokens"],
+        overlap_tokens: int = RETRIEVAL_CONFIG["chunk_overlap_tokens"],
+        embed_batch_size: int = RETRIEVAL_CONFIG["embed_batch_size"],
+        mode: str = RETRIEVAL_CONFIG["mode"],
+        fusion_candidates: int = RETRIEVAL_CONFIG["fusion_candidates"],
+        rrf_k: int = RETRIEVAL_CONFIG["rrf_k"],
+        reranker=None,
+    ):
+        """
+        Persistent document vector store.
+        The FAISS index is kept in `index.faiss` and a SQLite sidecar `metadata.db` maps every
+        vector id to its file name, chunk number, page range and text, and every file to
+        the object generation/md5 its vectors were built from. Upserts only write the rows of
+        the file that changed, and chunk texts are read from the sidecar when a search needs
+        them instead of being held in memory. A BM25 index over the same chunks is kept in
+        `bm25.npz` for hybrid retrieval; it is saved on close and rebuilt from the sidecar
+        when it does not match it.
+        :param store_dir: Directory holding the index and sidecar files.
+        :param embedding_model: Optional shared sentence transformer.
+        :param chunk_tokens: Maximum tokens per chunk, counted with the embedding model's
+            tokenizer when it has one and capped at its maximum sequence length.
+        :param overlap_tokens: Tokens shared between consecutive chunks.
+        :param embed_batch_size: Number of chunks embedded at a time.
+        :param mode: 'hybrid' fuses BM25 and dense rankings by reciprocal rank; 'dense' uses FAISS only.
+        :param fusion_candidates: Candidates taken from each retriever before fusion.
+        :param rrf_k: Reciprocal rank fusion constant.
+        :param reranker: Optional CrossEncoderReranker applied to the fused candidates.
+        """
+        if mode not in ("hybrid", "dense"):
+            raise ValueError(f"Unsupported retrieval mode: {mode}")
+        self.store_dir = store_dir
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.embed_batch_size = embed_batch_size
+        self.mode = mode
+        self.fusion_candidates = fusion_candidates
+        self.rrf_k = rrf_k
+        self.reranker = reranker
+        os.makedirs(store_dir, exist_ok=True)
+        self.metadata_path = os.path.join(store_dir, "metadata.db")
+        self.faiss_handler = FaissHandler(model=embedding_model, index_path=os.path.join(store_dir, "index.faiss"))
+        self.bm25 = BM25Index(os.path.join(store_dir, "bm25.npz"))
+        # Chunks past the model's max_seq_length would be truncated silently when embedded
+        model = self.faiss_handler.model
+        tokenizer = getattr(model, "tokenizer", None)
+        self._count_tokens = tokenizer_counter(tokenizer) if tokenizer is not None else estimate_tokens
+        max_seq_length = getattr(model, "max_seq_length", None)
+        if tokenizer is not None and max_seq_length:
+            # Two positions are taken by the [CLS] and [SEP] special tokens
+            self.chunk_tokens = min(self.chunk_tokens, max_seq_length - 2)
+            self.overlap_tokens = min(self.overlap_tokens, self.chunk_tokens - 1)
+        self._lock = threading.RLock()
+        # One connection shared under the lock; every write goes through it
+        self._db = sqlite3.connect(self.metadata_path, check_same_thread=False)
+        self._load_metadata()
+
+    def _signature(self) -> dict:
+        return {
+            "version": METADATA_VERSION,
+            "chunk_tokens": self.chunk_tokens,
+            "overlap_tokens": self.overlap_tokens,
+            "token_counter": "tokenizer" if self._count_tokens is not estimate_tokens else "estimate",
+            "index": self.faiss_handler.signature(),
+        }
+
+    def stats(self) -> dict:
+        """
+        Return the chunking settings in effect, how chunk tokens are counted and the store size.
+        """
+        signature = self._signature()
+        with self._lock:
+            files = len(self.files)
+        return {
+            "chunk_tokens": signature["chunk_tokens"],
+            "overlap_tokens": signature["overlap_tokens"],
+            "token_counter": signature["token_counter"],
+            "files": files,
+            "vectors": self.faiss_handler.ntotal,
+        }
+
+    def _load_metadata(self) -> None:
+        """
+        Open the sidecar. If it does not match the index (e.g. after a crash between
+        the two writes) or was built with other chunking settings, start from an empty store.
+        A BM25 index that does not cover exactly the sidecar's chunks is rebuilt from their texts.
+        """
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS files (file_name TEXT PRIMARY KEY, generation TEXT, md5 TEXT)"
+            )
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS chunks (
+                    id INTEGER PRIMARY KEY,
+                    file_name TEXT NOT NULL,
+                    chunk INTEGER NOT NULL,
+                    page_start INTEGER NOT NULL,
+                    page_end INTEGER NOT NULL,
+                    token_count INTEGER NOT NULL,
+                    text TEXT NOT NULL
+                )
+            """)
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_chunks_file ON chunks (file_name, chunk)")
+            row = self._db.execute("SELECT value FROM settings WHERE key = 'signature'").fetchone()
+            count = self._db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+            if row is None or json.loads(row[0]) != self._signature() or count != self.faiss_handler.ntotal:
+                self._db.execute("DELETE FROM chunks")
+                self._db.execute("DELETE FROM files")
+                self._db.execute(
+                    "INSERT OR REPLACE INTO settings (key, value) VALUES ('signature', ?)", (json.dumps(self._signature()),)
+                )
+                self._db.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('next_id', '0')")
+                self.faiss_handler.reset()
+
+        self.next_id = int(self._db.execute("SELECT value FROM settings WHERE key = 'next_id'").fetchone()[0])
+        self.files = {
+            file_name: {"generation": generation, "md5": md5, "ids": []}
+            for file_name, generation, md5 in self._db.execute("SELECT file_name, generation, md5 FROM files")
+        }
+        for vector_id, file_name in self._db.execute("SELECT id, file_name FROM chunks ORDER BY file_name, chunk"):
+            self.files[file_name]["ids"].append(vector_id)
+
+        chunk_ids = {vector_id for entry in self.files.values() for vector_id in entry["ids"]}
+        if self.bm25.document_ids() != chunk_ids:
+            self.bm25.reset()
+            cursor = self._db.execute("SELECT id, text FROM chunks")
+            while True:
+                rows = cursor.fetchmany(1000)
+                if not rows:
+                    break
+                self.bm25.add([row[0] for row in rows], [row[1] for row in rows])
+            self.bm25.save()
+
+    def _commit(self) -> None:
+        """
+        Persist the FAISS index, then commit the pending sidecar changes.
+        """
+        self._db.execute("UPDATE settings SET value = ? WHERE key = 'next_id'", (str(self.next_id),))
+        self.faiss_handler.save()
+        self._db.commit()
+
+    def close(self) -> None:
+        """
+        Save the BM25 index and close the sidecar.
+        """
+        with self._lock:
+            self.bm25.save()
+            self._db.close()
+
+    def is_current(self, blob_info: BlobInfo) -> bool:
+        """
+        Check whether a file is already indexed at the given generation.
+        """
+        with self._lock:
+            entry = self.files.get(blob_info.name)
+            return entry is not None and entry["generation"] == blob_info.generation
+
+    def file_versions(self, file_names: list) -> dict:
+        """
+        Return the indexed generation of each file, or None if it is not indexed.
+        """
+        with self._lock:
+            return {file_name: self.files.get(file_name, {}).get("generation") for file_name in file_names}
+
+    def upsert_file(
+        self, blob_info: BlobInfo, pages: Iterable[str], progress: Optional[Callable[[int], None]] = None
+    ) -> list:
+        """
+        Replace all vectors of a file with the embeddings of its chunks.
+        Pages are chunked as they stream in and embedded embed_batch_size chunks at a time,
+        without holding the store lock, so searches and other files' ingestion are not blocked.
+        The lock is only taken to swap the file's old vectors for the new ones. If reading or
+        embedding fails, the previously indexed version of the file is kept.
+        :param blob_info: Object version the pages were read from.
+        :param pages: Page texts of the file, in order.
+        :param progress: Optional callback receiving the number of chunks embedded so far.
+        :return: The ids of the new vectors.
+        """
+        chunks = []
+        embeddings = []
+        batch = []
+        for chunk in chunk_pages(pages, self.chunk_tokens, self.overlap_tokens, self._count_tokens):
+            batch.append(chunk)
+            if len(batch) >= self.embed_batch_size:
+                embeddings.append(self._embed_chunks(batch))
+                chunks.extend(batch)
+                batch = []
+                if progress is not None:
+                    progress(len(chunks))
+        if batch:
+            embeddings.append(self._embed_chunks(batch))
+            chunks.extend(batch)
+            if progress is not None:
+                progress(len(chunks))
+
+        with self._lock:
+            self._remove_file_vectors(blob_info.name)
+            ids = list(range(self.next_id, self.next_id + len(chunks)))
+            try:
+                self._add_chunks(blob_info.name, chunks, embeddings, ids)
+            except Exception:
+                # Drop the chunks added so far; the file stays unindexed until the next upsert
+                self.faiss_handler.remove_ids(ids)
+                self.bm25.remove(ids)
+                self._db.execute("DELETE FROM chunks WHERE file_name = ?", (blob_info.name,))
+                self._commit()
+                raise
+            self._db.execute(
+                "INSERT INTO files (file_name, generation, md5) VALUES (?, ?, ?)",
+                (blob_info.name, blob_info.generation, blob_info.md5),
+            )
+            self.files[blob_info.name] = {"generation": blob_info.generation, "md5": blob_info.md5, "ids": ids}
+            self._commit()
+            return ids
+
+    def _embed_chunks(self, chunks: list) -> np.ndarray:
+        return self.faiss_handler.encode([chunk.text for chunk in chunks], batch_size=self.embed_batch_size)
+
+    def _add_chunks(self, file_name: str, chunks: list, embeddings: list, ids: list) -> None:
+        if chunks:
+            self.faiss_handler.add_embeddings(np.concatenate(embeddings), ids)
+            self.bm25.add(ids, [chunk.text for chunk in chunks])
+        self._db.executemany(
+            "INSERT INTO chunks (id, file_name, chunk, page_start, page_end, token_count, text) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (vector_id, file_name, number, chunk.page_start, chunk.page_end, chunk.token_count, chunk.text)
+                for number, (vector_id, chunk) in enumerate(zip(ids, chunks))
+            ],
+        )
+        self.next_id += len(chunks)
+
+    def remove_file(self, file_name: str) -> None:
+        """
+        Remove a file and its vectors from the store.
+        """
+        with self._lock:
+            if self._remove_file_vectors(file_name):
+                self._commit()
+
+    def _remove_file_vectors(self, file_name: str) -> bool:
+        entry = self.files.pop(file_name, None)
+        if entry is None:
+            return False
+        self.faiss_handler.remove_ids(entry["ids"])
+        self.bm25.remove(entry["ids"])
+        self._db.execute("DELETE FROM chunks WHERE file_name = ?", (file_name,))
+        self._db.execute("DELETE FROM files WHERE file_name = ?", (file_name,))
+        return True
+
+    def chunks(self, vector_ids: list) -> dict:
+        """
+        Read chunk metadata entries (file_name, chunk, page_start, page_end, token_count, text) by vector id.
+        :return: Entries keyed by vector id. Unknown ids are left out.
+        """
+        entries = {}
+        with self._lock:
+            for start in range(0, len(vector_ids), 500):
+                batch = list(vector_ids[start:start + 500])
+                rows = self._db.execute(
+                    f"SELECT id, {', '.join(CHUNK_COLUMNS)} FROM chunks WHERE id IN ({', '.join('?' * len(batch))})",
+                    batch,
+                )
+                for row in rows:
+                    entries[row[0]] = dict(zip(CHUNK_COLUMNS, row[1:]))
+        return entries
+
+    def _allowed_ids(self, file_names: Iterable[str]) -> list:
+        return [
+            vector_id
+            for file_name in file_names
+            for vector_id in self.files.get(file_name, {}).get("ids", [])
+        ]
+
+    def _candidates(self, k: int) -> int:
+        # Dense hits fetched per query: enough to fuse with BM25 and to feed the reranker
+        if self.mode == "dense":
+            return k if self.reranker is None else max(k, self.reranker.top_n)
+        return max(k, self.fusion_candidates)
+
+    def _rank(self, query: str, dense: list, allowed_ids: list, k: int) -> list:
+        """
+        Fuse the dense hits of a query with its BM25 hits and look up their chunks.
+        :return: Chunk metadata entries, best first, enough for the reranker to re-score.
+        """
+        if self.mode == "hybrid":
+            lexical = self.bm25.search(query, self.fusion_candidates, allowed_ids=allowed_ids)
+            dense = reciprocal_rank_fusion([dense, lexical], k=self.rrf_k)
+        keep = k if self.reranker is None else max(k, self.reranker.top_n)
+        entries = self.chunks([i for i, _ in dense[:keep]])
+        return [dict(entries[i], score=score) for i, score in dense[:keep]]
+
+    def search(self, query: str, file_names: list, k: int = 3) -> list:
+        """
+        Search the chunks of the given files.
+        :return: Matching chunk metadata entries, best first. Their `score` is the fused
+            reciprocal rank score in hybrid mode, the cross-encoder score when reranked, and
+            the similarity (or L2 distance) in dense mode.
+        """
+        with self._lock:
+            allowed_ids = self._allowed_ids(file_names)
+            if not allowed_ids:
+                return []
+            dense = self.faiss_handler.search_with_scores(query, k=self._candidates(k), allowed_ids=allowed_ids)
+            results = self._rank(query, dense, allowed_ids, k)
+        # The cross-encoder runs outside the lock so it does not block ingestion
+        if self.reranker is not None:
+            results = self.reranker.rerank(query, results)
+        return results[:k]
+
+    def search_many(self, queries: list, file_names_per_query: list, k: int = 3) -> list:
+        """
+        Batched version of search: all queries are embedded in one encode call, queries
+        restricted to the same files share one matrix search, and all candidates are
+        reranked together.
+        :param file_names_per_query: File names each query is restricted to, one list per query.
+        :return: One list of matching chunk metadata entries per query, best first.
+        """
+        results = [[] for _ in queries]
+        if not queries:
+            return results
+        embeddings = self.faiss_handler.encode(queries, batch_size=self.embed_batch_size)
+        groups = {}
+        for position, file_names in enumerate(file_names_per_query):
+            groups.setdefault(tuple(sorted(set(file_names or []))), []).append(position)
+        with self._lock:
+            for file_names, positions in groups.items():
+                allowed_ids = self._allowed_ids(file_names)
+                if not allowed_ids:
+                    continue
+                matches = self.faiss_handler.search_embeddings(
+                    embeddings[positions], k=self._candidates(k), allowed_ids=allowed_ids
+                )
+                for position, dense in zip(positions, matches):
+                    results[position] = self._rank(queries[position], dense, allowed_ids, k)
+        if self.reranker is not None:
+            results = self.reranker.rerank_many(queries, results)
+        return [chunks[:k] for chunks in results]
@@ -1,18 +1,30 @@
 # schemas/request_models.py
 from pydantic import BaseModel
 from typing import List, Optional, Literal
+from config import MODEL_CONFIG
+
+# The offline 'fake' model is only accepted (and documented in the OpenAPI schema) when FAKE_MODEL_ENABLED
+ModelName = Literal["deepseek", "gemini", "fake"] if MODEL_CONFIG["fake"]["enabled"] else Literal["deepseek", "gemini"]
 
 class QueryRequest(BaseModel):
     """
     Request model for the /query endpoint.
     """
     query: str  # The user's query
-    model_name: Literal["deepseek", "gemini"]  # Selected model
-    storage_type: Literal["mysql", "bigquery", "gcs"]  # Selected storage
+    model_name: ModelName  # Selected model
+    storage_type: Literal["mysql", "bigquery", "sqlite", "gcs"]  # Selected storage
     user_id: str  # User ID for history tracking
     max_history: Optional[int] = 20  # Maximum history entries to retrieve
     gcs_file_names: Optional[List[str]] = None  # List of file names in GCS for external context
     context: str = ""
+    use_cache: bool = True  # Set to False to bypass the semantic response cache
+    include_context: Optional[bool] = None  # Echo the full prompt as context_used (defaults to PROMPT_INCLUDE_CONTEXT)
+class IngestRequest(BaseModel):
+    """
+    Request model for the /documents/ingest endpoint.
+    """
+    file_names: List[str]  # File names in GCS to ingest
+    force: bool = False  # Re-ingest files already indexed at their current generation
 class ExternalSourceRequest(BaseModel):
     """
     Request model for the /external-source endpoint.
@@ -0,0 +1,35 @@
+# tests/conftest.py
+import hashlib
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class HashEmbedder:
+    """
+    Deterministic bag-of-words stand-in for a SentenceTransformer, so tests do not download a model.
+    """
+
+    dimension = 64
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(self, texts, batch_size=32, normalize_embeddings=False, **kwargs):
+        embeddings = np.zeros((len(texts), self.dimension), dtype="float32")
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                embeddings[row, int(hashlib.md5(word.encode()).hexdigest(), 16) % self.dimension] += 1
+        if normalize_embeddings:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.where(norms == 0, 1, norms)
+        return embeddings
+
+
+@pytest.fixture
+def embedder():
+    return HashEmbedder()
@@ -0,0 +1,42 @@
+# tests/test_faiss_handler.py
+import os
+import re
+
+import numpy as np
+import pytest
+
+faiss = pytest.importorskip("faiss")
+pytest.importorskip("sentence_transformers")
+
+from models.faiss_handler import INDEX_TYPES, MIN_FAISS_VERSION, build_index, check_faiss_version, search_parameters
+
+REQUIREMENTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "requirements.txt")
+
+
+def test_requirements_pin_the_minimum_supported_faiss():
+    with open(REQUIREMENTS, encoding="utf-8") as f:
+        pin = re.search(r"^faiss-cpu==([\d.]+)$", f.read(), re.MULTILINE).group(1)
+    assert tuple(int(part) for part in pin.split(".")) == MIN_FAISS_VERSION
+
+
+def test_older_faiss_is_rejected():
+    with pytest.raises(ImportError, match="faiss-cpu>=1.8.0"):
+        check_faiss_version("1.7.4")
+    check_faiss_version("1.8.0")
+
+
+@pytest.mark.parametrize("index_type", INDEX_TYPES)
+def test_filtered_search_only_returns_allowed_ids(index_type):
+    rng = np.random.default_rng(0)
+    vectors = rng.random((512, 16), dtype="float32")
+    index = build_index(index_type, 16, nlist=4, pq_m=4, pq_nbits=4, hnsw_m=8)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add_with_ids(vectors, np.arange(512, dtype="int64"))
+
+    allowed = [3, 70, 300]
+    params = search_parameters(index, allowed, nprobe=4, ef_search=64)
+    _, ids = index.search(vectors[:2], 3, params=params)
+    # Approximate indexes may return fewer hits (-1), never ids outside the filter
+    assert set(ids.ravel()) - {-1} <= set(allowed)
+    assert (ids[:, 0] != -1).all()
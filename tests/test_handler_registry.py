@@ -0,0 +1,67 @@
+# tests/test_handler_registry.py
+import asyncio
+
+import pytest
+
+pytest.importorskip("sentence_transformers")
+pytest.importorskip("faiss")
+
+from models.handler_registry import HandlerRegistry, build_default_registry
+
+
+def test_warm_up_skips_components_registered_cold():
+    built = []
+    registry = HandlerRegistry()
+    registry.register("eager", lambda r: built.append("eager") or "eager")
+    registry.register("lazy", lambda r: built.append("lazy") or "lazy", warm=False)
+
+    registry.warm_up()
+    assert built == ["eager"]
+    assert registry.status()["lazy"]["state"] == "cold"
+    assert registry.get("lazy") == "lazy"
+    registry.warm_up(["lazy"])
+    assert built == ["eager", "lazy"]
+
+
+def test_default_warm_up_does_not_build_the_sqlite_database():
+    registry = build_default_registry()
+    assert registry._warm_by_default["database_sqlite"] is False
+
+
+class Component:
+    def __init__(self, name, closed):
+        self.name = name
+        self.closed = closed
+
+    def close(self):
+        self.closed.append(self.name)
+
+
+class AsyncComponent(Component):
+    async def aclose(self):
+        self.closed.append(self.name)
+
+
+def _dependent_registry(closed):
+    registry = HandlerRegistry()
+    registry.register("workers", lambda r: r.get("store") and AsyncComponent("workers", closed))
+    registry.register("store", lambda r: r.get("model") and Component("store", closed))
+    registry.register("model", lambda r: Component("model", closed))
+    return registry
+
+
+def test_close_closes_components_before_their_dependencies():
+    closed = []
+    registry = _dependent_registry(closed)
+    registry.warm_up()
+    registry.close()
+    assert closed == ["workers", "store", "model"]
+    assert {status["state"] for status in registry.status().values()} == {"cold"}
+
+
+def test_aclose_awaits_async_closers_in_dependency_order():
+    closed = []
+    registry = _dependent_registry(closed)
+    registry.warm_up()
+    asyncio.run(registry.aclose())
+    assert closed == ["workers", "store", "model"]
@@ -0,0 +1,157 @@
+# tests/test_history_pages.py
+import datetime
+import hashlib
+import re
+import sqlite3
+import uuid
+
+import pytest
+
+pytest.importorskip("google.cloud.bigquery")
+
+from config import DATABASE_CONFIG
+from models.database_handler import DatabaseHandler, _decode_cursor, _encode_cursor
+from models.history_cache import InMemoryHistoryCache
+from models.schema_migrations import BIGQUERY_MIGRATIONS, _BigQueryBackend
+
+
+@pytest.fixture
+def sqlite_path(tmp_path, monkeypatch):
+    monkeypatch.setitem(DATABASE_CONFIG["sqlite"], "path", str(tmp_path / "history.db"))
+
+
+def _rows(user_id: str, timestamps: list) -> list:
+    return [
+        {"user_id": user_id, "query": f"q{i}", "response": f"r{i}", "timestamp": timestamp}
+        for i, timestamp in enumerate(timestamps)
+    ]
+
+
+def _all_pages(handler: DatabaseHandler, user_id: str, limit: int) -> list:
+    pages = []
+    cursor = None
+    while True:
+        page = handler.get_history_page(user_id, limit=limit, cursor=cursor)
+        pages.append([row["query"] for row in page["history"]])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def test_pages_cover_every_row_once_across_equal_timestamps(sqlite_path):
+    handler = DatabaseHandler("sqlite", write_behind=False, history_cache=None, window_days=0)
+    now = datetime.datetime.now()
+    # Five rows share one timestamp, so pages must break ties by id
+    handler._insert_rows(_rows("u1", [now - datetime.timedelta(minutes=1)] * 2 + [now] * 5))
+    handler._insert_rows(_rows("u2", [now]))
+
+    pages = _all_pages(handler, "u1", limit=3)
+    assert pages == [["q6", "q5", "q4"], ["q3", "q2", "q1"], ["q0"]]
+    handler.close()
+
+
+def test_pages_only_cover_the_window(sqlite_path):
+    handler = DatabaseHandler("sqlite", write_behind=False, history_cache=None, window_days=1)
+    now = datetime.datetime.now()
+    handler._insert_rows(_rows("u1", [now - datetime.timedelta(days=3), now - datetime.timedelta(hours=1), now]))
+    # A full page always has a next cursor; the page after it is empty
+    assert _all_pages(handler, "u1", limit=2) == [["q2", "q1"], []]
+    handler.close()
+
+
+def test_invalid_cursor_is_rejected():
+    with pytest.raises(ValueError):
+        _decode_cursor("not-a-cursor")
+
+
+def test_cached_history_respects_the_window(sqlite_path):
+    handler = DatabaseHandler("sqlite", write_behind=False, history_cache=InMemoryHistoryCache(), window_days=1)
+    now = datetime.datetime.now()
+    handler._insert_rows(_rows("u1", [now - datetime.timedelta(days=3), now - datetime.timedelta(hours=1)]))
+    assert [row["query"] for row in handler.get_history("u1")] == ["q1"]
+
+    # Served from the cache: an older turn cached before the window moved is left out
+    handler.history_cache.fill(
+        "u1",
+        [{"query": "new", "response": "r", "timestamp": now}, {"query": "old", "response": "r", "timestamp": str(now - datetime.timedelta(days=2))}],
+        complete=True,
+        version=handler.history_cache.version("u1"),
+    )
+    assert [row["query"] for row in handler.get_history("u1")] == ["new"]
+    handler.close()
+
+
+def test_bigquery_pages_break_timestamp_ties_by_id(monkeypatch):
+    monkeypatch.setitem(DATABASE_CONFIG["bigquery"], "project_id", "project")
+    monkeypatch.setitem(DATABASE_CONFIG["bigquery"], "dataset_id", "dataset")
+    handler = DatabaseHandler("bigquery", bigquery_client=object(), write_behind=False, history_cache=None, auto_migrate=False)
+    query, params = handler._history_query_bigquery("u1", 20, ("2026-01-01 00:00:00.000001+00:00", 42))
+
+    assert "timestamp = @before AND" in query and "< @before_id" in query
+    assert "ORDER BY timestamp DESC, id DESC" in query
+    assert {param.name: param.value for param in params}["before_id"] == 42
+
+
+def _fingerprint(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "big", signed=True)
+
+
+class SQLiteBigQueryClient:
+    """
+    Runs the history queries and migrations written for BigQuery against an in-memory SQLite
+    table, with the BigQuery functions they use, so their paging can be checked without BigQuery.
+    """
+
+    def __init__(self):
+        self.connection = sqlite3.connect(":memory:")
+        self.connection.row_factory = sqlite3.Row
+        self.connection.create_function("CONCAT", -1, lambda *parts: "".join(parts))
+        self.connection.create_function("FARM_FINGERPRINT", 1, _fingerprint)
+        self.connection.create_function("GENERATE_UUID", 0, lambda: str(uuid.uuid4()))
+        self.connection.execute("CREATE TABLE conversation_history (id INTEGER, user_id TEXT, query TEXT, response TEXT, timestamp TEXT)")
+
+    def query(self, statement, job_config=None):
+        statement = re.sub(r"`[^`]*\.(\w+)`", r"\1", statement)
+        statement = re.sub(r"@(\w+)", r":\1", statement)
+        params = {
+            param.name: str(param.value) if isinstance(param.value, datetime.datetime) else param.value
+            for param in (job_config.query_parameters if job_config else [])
+        }
+        return _Job([dict(row) for row in self.connection.execute(statement, params)])
+
+
+class _Job(list):
+    def result(self):
+        return self
+
+
+def test_bigquery_pages_cover_identical_legacy_rows_once_after_the_id_backfill(monkeypatch):
+    monkeypatch.setitem(DATABASE_CONFIG["bigquery"], "project_id", "project")
+    monkeypatch.setitem(DATABASE_CONFIG["bigquery"], "dataset_id", "dataset")
+    client = SQLiteBigQueryClient()
+    handler = DatabaseHandler(
+        "bigquery", bigquery_client=client, write_behind=False, history_cache=None, window_days=0, auto_migrate=False
+    )
+    now = str(datetime.datetime.now(datetime.timezone.utc))
+    # Four identical rows written without an id, around a streamed one, over pages of two
+    client.connection.executemany(
+        "INSERT INTO conversation_history VALUES (?, 'u1', 'hi', 'hello', ?)",
+        [(None, now)] * 2 + [(7, now)] + [(None, now)] * 2,
+    )
+
+    def page_ids():
+        # Follows next_cursor the way get_history_page builds it, keeping each row's id
+        ids, before = [], None
+        while True:
+            rows = handler._get_history("u1", 2, before)
+            ids.extend(row["id"] for row in rows)
+            if len(rows) < 2:
+                return ids
+            before = _decode_cursor(_encode_cursor(rows[-1]))
+
+    # Keyed by their content, the identical rows collide and pages skip them
+    assert len(page_ids()) < 5
+    BIGQUERY_MIGRATIONS[1].apply(_BigQueryBackend(client, "project", "dataset"))
+    ids = page_ids()
+    assert len(ids) == 5 and len(set(ids)) == 5 and all(row_id >= 0 for row_id in ids)
+
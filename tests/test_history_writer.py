@@ -0,0 +1,79 @@
+# tests/test_history_writer.py
+import pytest
+
+pytest.importorskip("google.cloud.bigquery")
+
+from config import DATABASE_CONFIG
+from models.database_handler import DatabaseHandler
+
+
+@pytest.fixture
+def handler(tmp_path, monkeypatch):
+    monkeypatch.setitem(DATABASE_CONFIG["sqlite"], "path", str(tmp_path / "history.db"))
+    handler = DatabaseHandler("sqlite", write_behind=True, history_cache=None, window_days=0)
+    # Only flush when a test asks for it
+    handler.history_writer.flush_interval = 3600
+    handler.history_writer.max_batch_size = 1000
+    yield handler
+    handler.close()
+
+
+def _flush_during_query(handler, monkeypatch, flush_first: bool):
+    query = handler._get_history
+    calls = []
+
+    def racing_query(user_id, limit, before=None):
+        calls.append(user_id)
+        if len(calls) > 1:
+            return query(user_id, limit, before)
+        if flush_first:
+            handler.history_writer.flush()
+            return query(user_id, limit, before)
+        rows = query(user_id, limit, before)
+        handler.history_writer.flush()
+        return rows
+
+    monkeypatch.setattr(handler, "_get_history", racing_query)
+    return calls
+
+
+def test_pending_rows_are_merged_newest_first(handler):
+    handler.insert_history("u1", "q1", "r1")
+    handler.history_writer.flush()
+    handler.insert_history("u1", "q2", "r2")
+    handler.insert_history("u2", "other", "other")
+    assert [row["query"] for row in handler.get_history("u1")] == ["q2", "q1"]
+    assert [row["query"] for row in handler.get_history("u1", limit=1)] == ["q2"]
+
+
+@pytest.mark.parametrize("flush_first", [True, False])
+def test_flush_during_query_counts_each_row_once(handler, monkeypatch, flush_first):
+    handler.insert_history("u1", "q1", "r1")
+    handler.insert_history("u1", "q2", "r2")
+    calls = _flush_during_query(handler, monkeypatch, flush_first)
+    assert [row["query"] for row in handler.get_history("u1")] == ["q2", "q1"]
+    # The flush was detected and the query repeated
+    assert len(calls) == 2
+
+
+def test_query_is_not_repeated_without_a_flush(handler, monkeypatch):
+    handler.insert_history("u1", "q1", "r1")
+    query = handler._get_history
+    calls = []
+    monkeypatch.setattr(handler, "_get_history", lambda *args: calls.append(args) or query(*args))
+    assert [row["query"] for row in handler.get_history("u1")] == ["q1"]
+    assert len(calls) == 1
+
+
+def test_close_drains_the_buffer(tmp_path, monkeypatch):
+    monkeypatch.setitem(DATABASE_CONFIG["sqlite"], "path", str(tmp_path / "history.db"))
+    handler = DatabaseHandler("sqlite", write_behind=True, history_cache=None, window_days=0)
+    handler.history_writer.flush_interval = 3600
+    for i in range(5):
+        handler.insert_history("u1", f"q{i}", f"r{i}")
+    handler.close()
+
+    reader = DatabaseHandler("sqlite", write_behind=False, history_cache=None, window_days=0)
+    assert [row["query"] for row in reader.get_history("u1")] == ["q4", "q3", "q2", "q1", "q0"]
+    assert handler.history_writer.stats()["written"] == 5
+    reader.close()
@@ -0,0 +1,250 @@
+# tests/test_ingestion_service.py
+import asyncio
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("sentence_transformers")
+
+from models.bucket_handler import BlobInfo
+from models.external_source_handler import ExternalSourceHandler, IndexingIncomplete
+from models.ingestion_service import FAILED, INDEXED, REJECTED, IngestionService
+
+
+class FakeBucket:
+    def __init__(self, files: dict):
+        self.files = files  # name -> generation
+        self.lookups = []
+
+    def get_blob_info(self, name: str) -> BlobInfo:
+        self.lookups.append(name)
+        if name not in self.files:
+            raise FileNotFoundError(f"Object '{name}' not found.")
+        return BlobInfo(name, self.files[name])
+
+
+class FakePipeline:
+    def __init__(self, failures: dict = None):
+        self.failures = dict(failures or {})  # name -> failed attempts before success
+        self.fetches = []
+
+    async def fetch_pages(self, name: str, generation: str = None) -> list:
+        self.fetches.append(name)
+        if self.failures.get(name, 0) > 0:
+            self.failures[name] -= 1
+            raise RuntimeError(f"download of {name} interrupted")
+        return [f"text of {name} at {generation}"]
+
+
+class FakeStore:
+    def __init__(self):
+        self.generations = {}
+
+    def is_current(self, blob_info: BlobInfo) -> bool:
+        return self.generations.get(blob_info.name) == blob_info.generation
+
+    def file_versions(self, file_names: list) -> dict:
+        return {name: self.generations.get(name) for name in file_names}
+
+    def upsert_file(self, blob_info: BlobInfo, pages: list, progress=None) -> list:
+        if progress is not None:
+            progress(len(pages))
+        self.generations[blob_info.name] = blob_info.generation
+        return list(range(len(pages)))
+
+    def search(self, query: str, file_names: list, k: int = 3) -> list:
+        return [
+            {"file_name": name, "text": f"text of {name}", "token_count": 3}
+            for name in file_names if name in self.generations
+        ][:k]
+
+
+def _service(files: dict, failures: dict = None, **kwargs) -> IngestionService:
+    return IngestionService(FakeBucket(files), FakeStore(), FakePipeline(failures), retry_backoff=0, **kwargs)
+
+
+async def _drain(service: IngestionService) -> None:
+    await service._queue.join()
+    await service.aclose()
+
+
+def test_job_goes_from_queued_to_indexed():
+    service = _service({"a.pdf": "1"})
+
+    async def run():
+        job = await service.submit("a.pdf")
+        assert job["state"] == "queued"
+        await _drain(service)
+
+    asyncio.run(run())
+    job = service.status("a.pdf")
+    assert job["state"] == INDEXED and job["attempts"] == 1 and job["chunks_embedded"] == 1
+
+
+def test_current_file_is_skipped_and_queued_file_is_not_requeued():
+    service = _service({"a.pdf": "1", "b.pdf": "1"})
+    service.vector_store.generations["a.pdf"] = "1"
+
+    async def run():
+        skipped = await service.submit("a.pdf")
+        first = await service.submit("b.pdf")
+        second = await service.submit("b.pdf")
+        await _drain(service)
+        return skipped, first, second
+
+    skipped, first, second = asyncio.run(run())
+    assert skipped["state"] == INDEXED and skipped["skipped"]
+    assert first["submitted_at"] == second["submitted_at"]
+    assert service.pdf_pipeline.fetches == ["b.pdf"]
+
+
+def test_missing_file_and_exhausted_retries_fail():
+    service = _service({"flaky.pdf": "1", "broken.pdf": "1"}, failures={"flaky.pdf": 1, "broken.pdf": 5}, max_attempts=2)
+
+    async def run():
+        jobs = await service.submit_many(["flaky.pdf", "broken.pdf", "missing.pdf"])
+        await _drain(service)
+        return jobs
+
+    jobs = asyncio.run(run())
+    assert jobs["missing.pdf"]["state"] == FAILED and "not found" in jobs["missing.pdf"]["error"]
+    assert service.status("flaky.pdf")["state"] == INDEXED
+    broken = service.status("broken.pdf")
+    assert broken["state"] == FAILED and broken["attempts"] == 2 and "interrupted" in broken["error"]
+
+
+def test_finished_jobs_are_evicted_beyond_the_limit():
+    files = {f"{i}.pdf": "1" for i in range(5)}
+    service = _service(files, max_finished_jobs=2)
+
+    async def run():
+        await service.submit_many(list(files))
+        await _drain(service)
+
+    asyncio.run(run())
+    assert len(service._jobs) == 2
+    assert sum(service.stats()["jobs"].values()) == 2
+    # Evicted files are reported from the vector store
+    assert service.status("0.pdf") == {"file_name": "0.pdf", "generation": "1", "state": INDEXED}
+
+
+def _source(service: IngestionService) -> ExternalSourceHandler:
+    return ExternalSourceHandler(
+        bucket=service.bucket, vector_store=service.vector_store, pdf_pipeline=service.pdf_pipeline, ingestion=service
+    )
+
+
+def test_query_over_files_still_ingesting_is_pending():
+    service = _service({"a.pdf": "1", "b.pdf": "1"})
+    service.vector_store.generations["a.pdf"] = "1"
+    source = _source(service)
+
+    async def run():
+        with pytest.raises(IndexingIncomplete) as raised:
+            await source.aget_relevant_chunks("question", ["a.pdf", "b.pdf"])
+        await _drain(service)
+        return raised.value
+
+    incomplete = asyncio.run(run())
+    assert incomplete.status == "pending" and incomplete.files == {"b.pdf": "queued"}
+    # The workers may index b.pdf before the search runs
+    assert "a.pdf" in [chunk["file_name"] for chunk in incomplete.result]
+
+
+def test_query_over_missing_file_is_an_error():
+    service = _service({"a.pdf": "1"})
+    service.vector_store.generations["a.pdf"] = "1"
+    source = _source(service)
+
+    async def run():
+        with pytest.raises(IndexingIncomplete) as raised:
+            await source.aget_relevant_chunks("question", ["a.pdf", "missing.pdf"])
+        chunks = await source.aget_relevant_chunks("question", ["a.pdf"])
+        await _drain(service)
+        return raised.value, chunks
+
+    incomplete, chunks = asyncio.run(run())
+    assert incomplete.status == "error" and incomplete.files == {"missing.pdf": FAILED}
+    assert [chunk["file_name"] for chunk in chunks] == ["a.pdf"]
+
+
+def test_failed_file_is_not_requeued_by_later_queries():
+    service = _service({"a.pdf": "1", "broken.pdf": "1"}, failures={"broken.pdf": 5}, max_attempts=1)
+    service.vector_store.generations["a.pdf"] = "1"
+    source = _source(service)
+
+    async def run():
+        await service.submit("broken.pdf")
+        await service._queue.join()
+        raised = []
+        for _ in range(2):
+            with pytest.raises(IndexingIncomplete) as incomplete:
+                await source.aget_relevant_chunks("question", ["a.pdf", "broken.pdf"])
+            raised.append(incomplete.value)
+        forced = await service.submit("broken.pdf", force=True)
+        await _drain(service)
+        return raised, forced
+
+    raised, forced = asyncio.run(run())
+    assert [incomplete.status for incomplete in raised] == ["error", "error"]
+    assert all(incomplete.files == {"broken.pdf": FAILED} for incomplete in raised)
+    assert forced["state"] == "queued"
+    assert service.pdf_pipeline.fetches == ["broken.pdf", "broken.pdf"]
+
+
+def test_queries_reuse_recent_generation_lookups():
+    service = _service({"a.pdf": "1"})
+    service.vector_store.generations["a.pdf"] = "1"
+
+    async def run():
+        for _ in range(3):
+            await service.submit_many(["a.pdf"], max_age=60)
+        await service.submit_many(["a.pdf"])
+        await _drain(service)
+
+    asyncio.run(run())
+    # Only the first lookup and the one without a max_age reach the bucket
+    assert service.bucket.lookups == ["a.pdf", "a.pdf"]
+
+
+def test_full_queue_rejects_instead_of_failing():
+    # Without workers nothing leaves the queue
+    service = _service({"a.pdf": "1", "b.pdf": "1"}, workers=0, max_queue=1)
+    source = _source(service)
+
+    async def run():
+        jobs = await service.submit_many(["a.pdf", "b.pdf"])
+        rejected = [name for name, job in jobs.items() if job["state"] == REJECTED]
+        with pytest.raises(IndexingIncomplete) as raised:
+            await source.aget_relevant_chunks("question", rejected)
+        await service.aclose()
+        return jobs, rejected, raised.value
+
+    jobs, rejected, incomplete = asyncio.run(run())
+    assert sorted(job["state"] for job in jobs.values()) == ["queued", REJECTED]
+    assert "queue is full" in jobs[rejected[0]]["error"]
+    assert incomplete.status == "pending" and incomplete.files == {rejected[0]: REJECTED}
+
+
+def test_aclose_waits_for_the_vector_store_write_in_progress():
+    service = _service({"a.pdf": "1"})
+    started = threading.Event()
+    upsert_file = service.vector_store.upsert_file
+
+    def slow_upsert(blob_info, pages, progress=None):
+        started.set()
+        time.sleep(0.2)
+        return upsert_file(blob_info, pages, progress)
+
+    service.vector_store.upsert_file = slow_upsert
+
+    async def run():
+        await service.submit("a.pdf")
+        await asyncio.to_thread(started.wait, 5)
+        await service.aclose()
+        # The store may be closed now: the write finished before aclose() returned
+        return dict(service.vector_store.generations)
+
+    assert asyncio.run(run()) == {"a.pdf": "1"}
@@ -0,0 +1,95 @@
+# tests/test_llm_providers.py
+import asyncio
+
+import pytest
+
+from models.llm_providers import BaseProvider, CircuitBreaker, _RetryableError
+from models.model_handler import ModelHandler
+
+
+async def _collect(pieces) -> list:
+    return [piece async for piece in pieces]
+
+
+def test_fake_provider_streams_the_same_answer_it_generates():
+    handler = ModelHandler("fake")
+    pieces = asyncio.run(_collect(handler.astream_response("what is RAG?", [])))
+    answer = asyncio.run(handler.agenerate_response("what is RAG?", []))["answer"]
+
+    assert len(pieces) > 1
+    assert "".join(pieces) == answer == "Fake answer to: what is RAG?"
+
+
+def _open(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.failure_threshold):
+        assert breaker.allow()
+        breaker.record_failure()
+
+
+def _expire(breaker: CircuitBreaker) -> None:
+    breaker.opened_at -= breaker.reset_timeout
+
+
+def test_breaker_opens_after_threshold_and_closes_after_successful_trial():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    _open(breaker)
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    _expire(breaker)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    # Only one trial call at a time
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+def test_failed_trial_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    _open(breaker)
+    _expire(breaker)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+
+class FlakyProvider(BaseProvider):
+    label = "Flaky"
+
+    def __init__(self):
+        super().__init__({"timeout": 5})
+        self.max_retries = 0
+
+
+def test_cancelled_trial_releases_the_breaker():
+    provider = FlakyProvider()
+    _open(provider.breaker)
+    _expire(provider.breaker)
+
+    async def cancel_trial():
+        task = asyncio.create_task(provider._with_resilience(lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_trial())
+    assert provider.breaker.state == "half_open"
+    assert provider.breaker.allow()
+
+
+def test_retryable_failures_open_the_breaker_and_fail_fast():
+    provider = FlakyProvider()
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        raise _RetryableError("HTTP 503")
+
+    for _ in range(provider.breaker.failure_threshold):
+        with pytest.raises(Exception, match="HTTP 503"):
+            asyncio.run(provider._with_resilience(failing))
+    with pytest.raises(Exception, match="circuit open"):
+        asyncio.run(provider._with_resilience(failing))
+    assert len(calls) == provider.breaker.failure_threshold
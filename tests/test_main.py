@@ -0,0 +1,36 @@
+# tests/test_main.py
+import asyncio
+
+import pytest
+
+pytest.importorskip("sentence_transformers")
+pytest.importorskip("faiss")
+
+import main
+
+
+def test_timed_records_the_outcome_of_the_stage():
+    timings = {}
+
+    async def fail():
+        raise RuntimeError("boom")
+
+    async def succeed():
+        return 42
+
+    assert asyncio.run(main._timed(timings, "generate", succeed())) == 42
+    with pytest.raises(RuntimeError):
+        asyncio.run(main._timed(timings, "cache_lookup", fail()))
+    assert timings["generate"]["status"] == "ok"
+    assert timings["cache_lookup"]["status"] == "error"
+
+
+def test_run_stage_keeps_error_messages_out_of_timings():
+    timings = {}
+
+    async def fail():
+        raise Exception("Google Search API Error: https://example.com/?key=SECRET")
+
+    assert asyncio.run(main._run_stage(timings, "web_search", fail(), 1.0, "")) == ""
+    assert timings["web_search"]["status"] == "error"
+    assert "SECRET" not in str(timings)
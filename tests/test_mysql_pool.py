@@ -0,0 +1,58 @@
+# tests/test_mysql_pool.py
+import pytest
+
+pytest.importorskip("mysql.connector")
+
+from models import mysql_pool
+from models.mysql_pool import MySQLPool
+
+
+class FakeConnection:
+    def __init__(self, pool):
+        self.pool = pool
+        self.connected = True
+
+    def ping(self, **kwargs):
+        pass
+
+    def disconnect(self):
+        self.connected = False
+
+    def close(self):
+        self.pool.idle.append(self)
+
+
+class FakeConnectionPool:
+    def __init__(self, pool_size, **kwargs):
+        self.connections = [FakeConnection(self) for _ in range(pool_size)]
+        self.idle = list(self.connections)
+
+    def get_connection(self):
+        if not self.idle:
+            raise Exception("pool exhausted")
+        return self.idle.pop()
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(mysql_pool.pooling, "MySQLConnectionPool", FakeConnectionPool)
+    return MySQLPool({"host": "h", "user": "u", "password": "p", "database": "d"}, pool_size=3, acquire_timeout=0.1)
+
+
+def test_close_disconnects_every_pooled_connection(pool):
+    with pool.connection():
+        pass
+    pool.close()
+
+    assert not any(connection.connected for connection in pool._pool.connections)
+    with pytest.raises(Exception, match="closed"):
+        with pool.connection():
+            pass
+    pool.close()  # Closing twice is a no-op
+
+
+def test_close_leaves_a_connection_still_in_use_open(pool):
+    with pool.connection() as in_use:
+        pool.close()
+        assert in_use.connected
+    assert [connection.connected for connection in pool._pool.connections].count(False) == 2
@@ -0,0 +1,40 @@
+# tests/test_prompt_assembler.py
+from models.prompt_assembler import PromptAssembler
+from models.text_chunker import select_chunks
+
+
+def _history(turns: int) -> list:
+    # Newest first
+    return [
+        {"query": f"question {i}", "response": f"private answer {i}", "timestamp": f"2026-01-01 00:00:{i:02d}"}
+        for i in reversed(range(turns))
+    ]
+
+
+def test_shared_prompt_leaves_out_the_history_summary():
+    assembler = PromptAssembler(recent_turns=1)
+    chunks = [{"file_name": "a.pdf", "page_start": 1, "page_end": 1, "text": "chunk text", "score": 0.9, "token_count": 2}]
+    assembled = assembler.assemble(
+        "what next?", context="ctx", chunks=chunks, search_results="results", history=_history(4), user_id="u1", external=True
+    )
+
+    assert "Earlier conversation (summary)" in assembled.prompt
+    assert "private answer 0" in assembled.prompt
+    assert "private answer" not in assembled.shared_prompt
+    assert "ctx" in assembled.shared_prompt and "chunk text" in assembled.shared_prompt
+    assert assembled.references["history_summarized"]
+
+
+def test_shared_prompt_equals_prompt_without_history():
+    assembled = PromptAssembler().assemble("hello", context="ctx")
+    assert assembled.shared_prompt == assembled.prompt
+
+
+def test_select_chunks_keeps_ranked_chunks_within_the_budget():
+    chunks = [
+        {"text": "a", "token_count": 6},
+        {"text": "b", "token_count": 5},
+        {"text": "c d e", "token_count": None},
+    ]
+    assert [chunk["text"] for chunk in select_chunks(chunks, 9)] == ["a", "c d e"]
+    assert select_chunks(chunks, 2) == []
@@ -0,0 +1,37 @@
+# tests/test_request_models.py
+import importlib
+
+import pytest
+from pydantic import ValidationError
+
+from config import MODEL_CONFIG
+import schemas.request_models
+
+
+@pytest.fixture
+def request_models(monkeypatch):
+    def load(fake_enabled: bool):
+        monkeypatch.setitem(MODEL_CONFIG["fake"], "enabled", fake_enabled)
+        return importlib.reload(schemas.request_models)
+
+    yield load
+    monkeypatch.undo()
+    importlib.reload(schemas.request_models)
+
+
+def _query(model_name: str) -> dict:
+    return {"query": "hi", "model_name": model_name, "storage_type": "sqlite", "user_id": "u1"}
+
+
+def test_fake_model_is_rejected_when_disabled(request_models):
+    models = request_models(False)
+    with pytest.raises(ValidationError):
+        models.QueryRequest(**_query("fake"))
+    assert "fake" not in models.QueryRequest.model_json_schema()["properties"]["model_name"]["enum"]
+    assert models.QueryRequest(**_query("gemini")).model_name == "gemini"
+
+
+def test_fake_model_is_accepted_when_enabled(request_models):
+    models = request_models(True)
+    assert models.QueryRequest(**_query("fake")).model_name == "fake"
+    assert "fake" in models.QueryRequest.model_json_schema()["properties"]["model_name"]["enum"]
@@ -0,0 +1,37 @@
+# tests/test_response_cache.py
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("sentence_transformers")
+
+from models.response_cache import SemanticResponseCache, context_fingerprint
+
+
+def test_answers_built_from_history_are_not_shared_across_users(embedder):
+    cache = SemanticResponseCache(embedder, similarity_threshold=0.95)
+    alice = context_fingerprint("", {}, user_id="alice")
+    bob = context_fingerprint("", {}, user_id="bob")
+    cache.store("what did I ask before", alice, "gemini", "You asked about your invoice.", {"references": {}})
+
+    assert cache.lookup("what did I ask before", bob, "gemini") is None
+    assert cache.lookup("what did I ask before", alice, "gemini")["answer"] == "You asked about your invoice."
+
+
+def test_answers_without_history_are_shared(embedder):
+    cache = SemanticResponseCache(embedder, similarity_threshold=0.95)
+    shared = context_fingerprint("", {"a.pdf": "1"})
+    cache.store("what is in a.pdf", shared, "gemini", "A report.", {"references": {}})
+
+    assert cache.lookup("what is in a.pdf", context_fingerprint("", {"a.pdf": "1"}), "gemini") is not None
+    assert cache.lookup("what is in a.pdf", context_fingerprint("", {"a.pdf": "2"}), "gemini") is None
+
+
+def test_lookup_only_searches_its_partition(embedder):
+    # Runs the IDSelector-filtered IndexIDMap search that needs faiss >= MIN_FAISS_VERSION
+    cache = SemanticResponseCache(embedder, similarity_threshold=0.95)
+    for i in range(50):
+        cache.store("same prompt", context_fingerprint("", {f"{i}.pdf": "1"}), "gemini", f"answer {i}", {"references": {}})
+
+    found = cache.lookup("same prompt", context_fingerprint("", {"17.pdf": "1"}), "gemini")
+    assert found["answer"] == "answer 17"
+    assert cache.lookup("same prompt", context_fingerprint("", {"17.pdf": "1"}), "deepseek") is None
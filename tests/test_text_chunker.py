@@ -0,0 +1,46 @@
+# tests/test_text_chunker.py
+import pytest
+
+from models.text_chunker import chunk_pages, estimate_tokens, tokenizer_counter
+
+
+class CharacterTokenizer:
+    """
+    Splits words into two-character pieces, like WordPiece does with rare words.
+    """
+
+    def tokenize(self, word):
+        return [word[i:i + 2] for i in range(0, len(word), 2)]
+
+
+def test_chunks_respect_the_budget_and_overlap():
+    pages = [" ".join(f"w{i}" for i in range(50)), " ".join(f"x{i}" for i in range(50))]
+    chunks = list(chunk_pages(pages, chunk_tokens=20, overlap_tokens=5))
+    assert all(chunk.token_count <= 20 for chunk in chunks)
+    assert chunks[0].page_start == 1 and chunks[-1].page_end == 2
+    for previous, current in zip(chunks, chunks[1:]):
+        assert previous.text.split()[-5:] == current.text.split()[:5]
+
+
+def test_no_chunk_is_overlap_only():
+    # The long word does not fit next to the carried overlap
+    pages = ["a b c d e f g h", "x" * 30]
+    chunks = list(chunk_pages(pages, chunk_tokens=8, overlap_tokens=4, count_tokens=len))
+    texts = [chunk.text for chunk in chunks]
+    assert texts == ["a b c d e f g h", "x" * 30]
+    for previous, current in zip(chunks, chunks[1:]):
+        assert set(current.text.split()) - set(previous.text.split())
+
+
+def test_tokenizer_counter_bounds_chunks_by_model_tokens():
+    count_tokens = tokenizer_counter(CharacterTokenizer())
+    pages = ["internationalization " * 40]
+    chunks = list(chunk_pages(pages, chunk_tokens=50, overlap_tokens=10, count_tokens=count_tokens))
+    assert all(sum(count_tokens(word) for word in chunk.text.split()) <= 50 for chunk in chunks)
+    # The regex estimate counts one token per word and would have packed 50 words per chunk
+    assert max(estimate_tokens(chunk.text) for chunk in chunks) < 50
+
+
+def test_rejects_invalid_budgets():
+    with pytest.raises(ValueError):
+        list(chunk_pages(["text"], chunk_tokens=10, overlap_tokens=10))
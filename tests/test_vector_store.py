@@ -0,0 +1,97 @@
+# tests/test_vector_store.py
+import sqlite3
+
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("sentence_transformers")
+
+from models.bucket_handler import BlobInfo
+from models.embedding_encoder import CachedEncoder
+from models.vector_store import DocumentVectorStore
+
+
+def _store(directory, embedder):
+    return DocumentVectorStore(str(directory), embedding_model=embedder, chunk_tokens=20, overlap_tokens=0)
+
+
+def _chunk_rows(directory):
+    with sqlite3.connect(str(directory / "metadata.db")) as connection:
+        return connection.execute("SELECT file_name, COUNT(*) FROM chunks GROUP BY file_name ORDER BY file_name").fetchall()
+
+
+def test_upsert_persists_chunks_and_reloads(tmp_path, embedder):
+    store = _store(tmp_path, embedder)
+    store.upsert_file(BlobInfo("a.pdf", "1"), ["apples grow on trees in the orchard"])
+    store.upsert_file(BlobInfo("b.pdf", "1"), ["routers forward packets between networks"])
+    store.close()
+
+    reopened = _store(tmp_path, embedder)
+    assert reopened.file_versions(["a.pdf", "b.pdf", "c.pdf"]) == {"a.pdf": "1", "b.pdf": "1", "c.pdf": None}
+    results = reopened.search("routers packets", ["a.pdf", "b.pdf"], k=1)
+    assert results[0]["file_name"] == "b.pdf"
+    assert "routers" in results[0]["text"]
+    reopened.close()
+
+
+def test_upsert_rewrites_only_the_changed_file(tmp_path, embedder):
+    store = _store(tmp_path, embedder)
+    store.upsert_file(BlobInfo("a.pdf", "1"), ["first version of a"])
+    store.upsert_file(BlobInfo("b.pdf", "1"), ["contents of b"])
+    store.upsert_file(BlobInfo("a.pdf", "2"), ["second version of a " * 6])
+
+    rows = dict(_chunk_rows(tmp_path))
+    assert rows["a.pdf"] > 1 and rows["b.pdf"] == 1
+    assert store.is_current(BlobInfo("a.pdf", "2"))
+    assert all(chunk["file_name"] == "a.pdf" for chunk in store.search("version", ["a.pdf"], k=5))
+    store.remove_file("b.pdf")
+    assert [file_name for file_name, _ in _chunk_rows(tmp_path)] == ["a.pdf"]
+    store.close()
+
+
+def test_failed_upsert_keeps_the_indexed_version(tmp_path, embedder):
+    store = _store(tmp_path, embedder)
+    store.upsert_file(BlobInfo("a.pdf", "1"), ["the first version"])
+
+    def pages():
+        yield "a page that is chunked and embedded before the failure " * 3
+        raise RuntimeError("download interrupted")
+
+    with pytest.raises(RuntimeError):
+        store.upsert_file(BlobInfo("a.pdf", "2"), pages())
+    assert store.file_versions(["a.pdf"]) == {"a.pdf": "1"}
+    assert store.faiss_handler.ntotal == 1
+    store.close()
+
+    reopened = _store(tmp_path, embedder)
+    assert reopened.search("first version", ["a.pdf"], k=1)[0]["text"] == "the first version"
+    reopened.close()
+
+
+def test_bm25_is_rebuilt_from_the_sidecar(tmp_path, embedder):
+    store = _store(tmp_path, embedder)
+    store.upsert_file(BlobInfo("a.pdf", "1"), ["the SKU-48213 charger"])
+    store.upsert_file(BlobInfo("b.pdf", "1"), ["the SKU-48231 adapter"])
+    # Simulate a crash: the BM25 index is only saved on close
+    store._db.close()
+
+    reopened = _store(tmp_path, embedder)
+    assert reopened.bm25.document_ids() == set(reopened._allowed_ids(["a.pdf", "b.pdf"]))
+    assert reopened.search("SKU-48231", ["a.pdf", "b.pdf"], k=1)[0]["file_name"] == "b.pdf"
+    reopened.close()
+
+
+class WordTokenizer:
+    def tokenize(self, word):
+        return [word[start:start + 3] for start in range(0, len(word), 3)]
+
+
+def test_cached_encoder_keeps_the_model_tokenizer_and_length_cap(tmp_path, embedder):
+    embedder.tokenizer = WordTokenizer()
+    embedder.max_seq_length = 16
+    store = DocumentVectorStore(str(tmp_path), embedding_model=CachedEncoder(embedder), chunk_tokens=200, overlap_tokens=40)
+
+    stats = store.stats()
+    assert stats["token_counter"] == "tokenizer"
+    assert stats["chunk_tokens"] == 14 and stats["overlap_tokens"] == 13
+    store.close()